@@ -0,0 +1,449 @@
+"""
+Json2RPGDesu - Combat Balance Simulator
+
+This module plays the combat encounters of a story many times over, with no
+rendering and no pauses, so designers can tune the health, attack and
+defense of a combat block without fighting it by hand. It implements the
+same rules as the engine's combat phase:
+
+- attack: hits on d20 >= 10 for attack + d6 - enemy defense
+- defend: +5 defense until the enemy has attacked
+- heal: restores 15 HP, up to max health
+- special: always deals attack + 10 - enemy defense
+- the enemy then attacks the acting player: hits on d20 >= 10 for
+  attack + d6 - defense, which take_damage reduces by defense once more
+- the turn passes to the next living player
+
+Only fights against a single enemy without a speed of its own follow these
+rules; encounters() skips fights against several enemies or with initiative
+turns.
+
+Fights are simulated in bulk. With NumPy installed, every dice roll of a
+turn is drawn for all running fights at once and finished fights are
+dropped from the batch, so millions of fights take seconds. Without NumPy
+the same rules run in a plain Python loop.
+
+Party behaviour is set by a Policy: the action every player takes, and the
+health below which they heal instead.
+
+Usage:
+    python balance.py                          # every encounter in story.json
+    python balance.py --fights 1000000 --policy special:40
+    python balance.py --encounter acceptance_scene --players 2
+
+Classes:
+    Policy: What the party does on its turns
+    Party: Stats of the party entering a fight
+    EncounterStats: Outcome distribution of one encounter
+
+Dependencies:
+    - story: Compiled story records (Enemy)
+    - numpy: Optional, for vectorized dice rolls
+    - argparse: For command line options
+    - random: For the pure-Python fallback
+    - time: For timing a story pass
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from story import CompiledStory, Enemy, load_story_file
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; fall back to plain Python
+    np = None
+
+COMBAT_ACTIONS = ('attack', 'defend', 'heal', 'special')
+
+DEFEND_BONUS = 5
+HEAL_AMOUNT = 15
+SPECIAL_BONUS = 10
+
+# Fights still running after this many player turns count as stalemates
+MAX_TURNS = 500
+
+PERCENTILES = (10, 50, 90)
+
+
+class Policy(NamedTuple):
+    """
+    What the party does on its turns.
+
+    Attributes:
+        action (str): Action taken every turn (attack, defend, heal or special)
+        heal_below (int): Heal instead when the acting player has less HP than this
+    """
+    action: str = 'attack'
+    heal_below: int = 0
+
+    @classmethod
+    def parse(cls, text: str) -> 'Policy':
+        """
+        Parse a policy written as ACTION or ACTION:HEAL_BELOW.
+
+        Args:
+            text: Policy text, e.g. 'special' or 'attack:40'
+
+        Returns:
+            Policy: The parsed policy
+
+        Raises:
+            ValueError: If the action or threshold is not valid
+        """
+        action, _, heal_below = text.partition(':')
+        if action not in COMBAT_ACTIONS:
+            raise ValueError(f"Unknown action '{action}', expected one of {', '.join(COMBAT_ACTIONS)}")
+        return cls(action, int(heal_below) if heal_below else 0)
+
+    def __str__(self) -> str:
+        return f"{self.action}:{self.heal_below}" if self.heal_below else self.action
+
+
+class Party(NamedTuple):
+    """
+    Stats of the party entering a fight; every member starts alike.
+
+    Attributes:
+        size (int): Number of players
+        health (int): Health (and max health) of each player
+        attack (int): Attack power of each player
+        defense (int): Defense power of each player
+    """
+    size: int = 4
+    health: int = 100
+    attack: int = 10
+    defense: int = 10
+
+
+class EncounterStats(NamedTuple):
+    """
+    Outcome distribution of one encounter.
+
+    Attributes:
+        fights (int): Fights simulated
+        wins (int): Fights the party won
+        losses (int): Fights where the whole party fell
+        stalemates (int): Fights still running after MAX_TURNS turns
+        turns (Dict[int, float]): Percentiles of player turns needed to win
+        hp_left (Dict[int, float]): Percentiles of total party HP left after a win
+        mean_turns (float): Average player turns needed to win
+        mean_hp_left (float): Average total party HP left after a win
+    """
+    fights: int
+    wins: int
+    losses: int
+    stalemates: int
+    turns: Dict[int, float]
+    hp_left: Dict[int, float]
+    mean_turns: float
+    mean_hp_left: float
+
+    @property
+    def win_rate(self) -> float:
+        """Fraction of fights the party won."""
+        return self.wins / self.fights if self.fights else 0.0
+
+
+def simulate(enemy: Enemy, party: Party = Party(), policy: Policy = Policy(),
+             fights: int = 10_000, seed: Optional[int] = None) -> EncounterStats:
+    """
+    Simulate many fights against one enemy.
+
+    Args:
+        enemy: Enemy stats from a story combat block
+        party: Party entering the fight
+        policy: What the party does on its turns
+        fights: Number of fights to simulate
+        seed: Seed for the dice, random if not given
+
+    Returns:
+        EncounterStats: Outcome distribution
+    """
+    if _stalemate(enemy, party, policy):
+        return _summarize(fights, [], [], 0)
+    if np is not None:
+        turns, hp_left, losses = _simulate_numpy(enemy, party, policy, fights, seed)
+    else:
+        turns, hp_left, losses = _simulate_python(enemy, party, policy, fights, seed)
+    return _summarize(fights, turns, hp_left, losses)
+
+
+def _stalemate(enemy: Enemy, party: Party, policy: Policy) -> bool:
+    """Whether neither side can ever damage the other, so no fight can end."""
+    if policy.action == 'attack':
+        best_hit = party.attack + 6 - enemy.defense
+    elif policy.action == 'special':
+        best_hit = party.attack + SPECIAL_BONUS - enemy.defense
+    else:
+        best_hit = 0
+    # Undamaged players never drop below heal_below unless it is above full health
+    guard = party.defense
+    if policy.action == 'defend' and policy.heal_below <= party.health:
+        guard += DEFEND_BONUS
+    worst_hit = max(0, enemy.attack + 6 - guard) - guard
+    return best_hit <= 0 and worst_hit <= 0
+
+
+def _summarize(fights: int, turns: Sequence[int], hp_left: Sequence[int], losses: int) -> EncounterStats:
+    wins = len(turns)
+    if np is not None:
+        turn_pcts = dict(zip(PERCENTILES, np.percentile(turns, PERCENTILES).tolist())) if wins else {}
+        hp_pcts = dict(zip(PERCENTILES, np.percentile(hp_left, PERCENTILES).tolist())) if wins else {}
+        total_turns, total_hp = float(np.sum(turns)), float(np.sum(hp_left))
+    else:
+        turn_pcts = _percentiles(sorted(turns))
+        hp_pcts = _percentiles(sorted(hp_left))
+        total_turns, total_hp = float(sum(turns)), float(sum(hp_left))
+    return EncounterStats(
+        fights=fights,
+        wins=wins,
+        losses=losses,
+        stalemates=fights - wins - losses,
+        turns=turn_pcts,
+        hp_left=hp_pcts,
+        mean_turns=total_turns / wins if wins else 0.0,
+        mean_hp_left=total_hp / wins if wins else 0.0,
+    )
+
+
+def _percentiles(values: List[int]) -> Dict[int, float]:
+    """Nearest-rank percentiles of sorted values."""
+    if not values:
+        return {}
+    return {p: float(values[min(len(values) - 1, len(values) * p // 100)]) for p in PERCENTILES}
+
+
+def _simulate_python(enemy: Enemy, party: Party, policy: Policy,
+                     fights: int, seed: Optional[int]) -> Tuple[List[int], List[int], int]:
+    rng = random.Random(seed)
+    randint = rng.randint
+    size, max_hp, attack, defense = party
+    action, heal_below = policy
+    attack_hit = attack - enemy.defense
+    special = max(0, attack + SPECIAL_BONUS - enemy.defense)
+
+    turns_to_win: List[int] = []
+    hp_left: List[int] = []
+    losses = 0
+    for _ in range(fights):
+        enemy_hp = enemy.health
+        hp = [max_hp] * size
+        current = 0
+        for turn in range(1, MAX_TURNS + 1):
+            act = 'heal' if hp[current] < heal_below else action
+            player_defense = defense
+            if act == 'attack':
+                if randint(1, 20) >= 10:
+                    enemy_hp -= max(0, attack_hit + randint(1, 6))
+            elif act == 'special':
+                enemy_hp -= special
+            elif act == 'heal':
+                hp[current] = min(max_hp, hp[current] + HEAL_AMOUNT)
+            else:
+                player_defense += DEFEND_BONUS
+
+            if enemy_hp <= 0:
+                turns_to_win.append(turn)
+                hp_left.append(sum(hp))
+                break
+
+            if randint(1, 20) >= 10:
+                damage = max(0, enemy.attack + randint(1, 6) - player_defense)
+                hp[current] = max(0, hp[current] - max(0, damage - player_defense))
+
+            for step in range(1, size + 1):
+                candidate = (current + step) % size
+                if hp[candidate] > 0:
+                    current = candidate
+                    break
+            else:
+                losses += 1
+                break
+    return turns_to_win, hp_left, losses
+
+
+def _roll_table(bonus: int, reduce) -> 'np.ndarray':
+    """
+    Damage of a "d20 >= 10 to hit, then bonus + d6" roll for each of 120
+    equally likely outcomes, so one integer draw covers both dice.
+
+    Outcomes 0-53 are misses (9 in 20); the 66 hits split evenly over the d6.
+    """
+    table = np.zeros(120, dtype=np.int32)
+    for outcome in range(54, 120):
+        table[outcome] = reduce(bonus + (outcome - 54) // 11 + 1)
+    return table
+
+
+def _next_player_table(size: int) -> 'np.ndarray':
+    """Next living player for every (alive bitmask, current player) pair."""
+    bits = np.arange(1 << size)[:, None]
+    current = np.arange(size)[None, :]
+    table = np.broadcast_to(current, (1 << size, size)).copy()
+    for step in range(size, 0, -1):
+        candidate = (current + step) % size
+        table = np.where((bits >> candidate) & 1, candidate, table)
+    return table.ravel()
+
+
+# Parties up to this size find the next living player with a lookup table
+_TABLE_PARTY_SIZE = 12
+
+
+def _simulate_numpy(enemy: Enemy, party: Party, policy: Policy,
+                    fights: int, seed: Optional[int]) -> Tuple['np.ndarray', 'np.ndarray', int]:
+    rng = np.random.default_rng(seed)
+    size, max_hp, attack, defense = party
+    action, heal_below = policy
+    heals = heal_below > 0 or action == 'heal'
+
+    player_damage = _roll_table(attack - enemy.defense, lambda d: max(0, d))
+    special = max(0, attack + SPECIAL_BONUS - enemy.defense)
+    # Enemy hits are reduced by defense twice: in the roll and in take_damage
+    enemy_damage = np.concatenate([
+        _roll_table(enemy.attack, lambda d, guard=guard: max(0, max(0, d - guard) - guard))
+        for guard in (defense, defense + DEFEND_BONUS)
+    ])
+    next_table = _next_player_table(size) if size <= _TABLE_PARTY_SIZE else None
+
+    enemy_hp = np.full(fights, enemy.health, dtype=np.int32)
+    hp = np.full(fights * size, max_hp, dtype=np.int32)
+    current = np.zeros(fights, dtype=np.intp)
+    alive_bits = np.full(fights, (1 << size) - 1 if next_table is not None else 0, dtype=np.intp)
+    alive_count = np.full(fights, size, dtype=np.int32)
+    # Finished fights stay in the batch until enough of them pile up to be worth dropping
+    done = np.zeros(fights, dtype=bool)
+    finished = 0
+    turns_to_win = []
+    hp_left = []
+    losses = 0
+
+    for turn in range(1, MAX_TURNS + 1):
+        running = len(enemy_hp)
+        if finished == running:
+            break
+        if finished * 4 > running:
+            keep = ~done
+            enemy_hp, current, alive_bits, alive_count = enemy_hp[keep], current[keep], alive_bits[keep], alive_count[keep]
+            hp = hp.reshape(running, size)[keep].ravel()
+            running -= finished
+            done = np.zeros(running, dtype=bool)
+            finished = 0
+
+        slot = np.arange(0, running * size, size) + current
+        acting_hp = hp[slot]
+        healing = acting_hp < heal_below if heals else None
+        if action == 'heal':
+            healing = np.ones(running, dtype=bool)
+
+        # Player's move
+        if action == 'attack':
+            damage = player_damage[rng.integers(0, 120, running, dtype=np.int16)]
+            enemy_hp -= damage if healing is None else np.where(healing, 0, damage)
+        elif action == 'special':
+            enemy_hp -= special if healing is None else np.where(healing, 0, special).astype(np.int32)
+        if healing is not None:
+            acting_hp = np.where(healing, np.minimum(max_hp, acting_hp + HEAL_AMOUNT), acting_hp)
+        won = enemy_hp <= 0
+
+        # Enemy's move against the acting player, unless it was defeated
+        outcome = rng.integers(0, 120, running, dtype=np.int16).astype(np.intp)
+        if action == 'defend':
+            outcome += 120 if healing is None else np.where(healing, 0, 120)
+        taken = np.where(won, 0, enemy_damage[outcome])
+        acting_hp = np.maximum(0, acting_hp - taken)
+        hp[slot] = acting_hp
+
+        fallen = acting_hp == 0
+        alive_count -= fallen
+        if next_table is not None:
+            alive_bits &= ~(fallen.astype(np.intp) << current)
+            current = next_table[alive_bits * size + current]
+        else:
+            alive = hp.reshape(running, size) > 0
+            rows = np.arange(running)
+            next_player = current.copy()
+            unassigned = np.ones(running, dtype=bool)
+            for step in range(1, size + 1):
+                candidate = (current + step) % size
+                take = unassigned & alive[rows, candidate]
+                next_player[take] = candidate[take]
+                unassigned &= ~take
+            current = next_player
+
+        wins = won & ~done
+        wiped = (alive_count == 0) & ~done
+        if wins.any():
+            turns_to_win.append(np.full(int(wins.sum()), turn, dtype=np.int32))
+            hp_left.append(hp.reshape(running, size)[wins].sum(axis=1))
+        losses += int(wiped.sum())
+        done |= wins | wiped
+        finished = int(done.sum())
+
+    turns = np.concatenate(turns_to_win) if turns_to_win else np.zeros(0, dtype=np.int32)
+    left = np.concatenate(hp_left) if hp_left else np.zeros(0, dtype=np.int32)
+    return turns, left, losses
+
+
+def encounters(story: CompiledStory) -> Iterator[Tuple[str, int, Enemy]]:
+    """
+    List the single-enemy combat encounters of a story.
+
+    Fights against several enemies, or an enemy taking its own initiative
+    turns, are left out since the simulators only model one enemy striking
+    back at whoever acts.
+
+    Args:
+        story: Compiled story
+
+    Yields:
+        Tuple[str, int, Enemy]: Scene ID, choice index and enemy of each combat choice
+    """
+    for scene in story.scenes:
+        for index, choice in enumerate(scene.choices):
+            if choice.combat is not None and len(choice.combat) == 1 and choice.combat[0].speed is None:
+                yield scene.id, index, choice.combat[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the combat encounters of a Json2RPGDesu story.")
+    parser.add_argument('--story', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'story.json'),
+                        help="story file to analyse")
+    parser.add_argument('--encounter', help="only simulate the fights in this scene")
+    parser.add_argument('--fights', type=int, default=100_000 if np is not None else 10_000,
+                        help="fights per encounter (default: 100000, 10000 without NumPy)")
+    parser.add_argument('--policy', type=Policy.parse, default=Policy(),
+                        help="ACTION[:HEAL_BELOW], e.g. 'special:40' (default: attack)")
+    defaults = Party()
+    parser.add_argument('--players', type=int, default=defaults.size, help="party size (default: 4)")
+    parser.add_argument('--health', type=int, default=defaults.health, help="health of each player")
+    parser.add_argument('--attack', type=int, default=defaults.attack, help="attack of each player")
+    parser.add_argument('--defense', type=int, default=defaults.defense, help="defense of each player")
+    parser.add_argument('--seed', type=int, help="seed for reproducible results")
+    args = parser.parse_args()
+
+    story = load_story_file(args.story)
+    party = Party(args.players, args.health, args.attack, args.defense)
+    backend = "NumPy" if np is not None else "pure Python (install numpy for faster runs)"
+    print(f"Policy {args.policy}, {party.size} players ({party.health} HP, ATK {party.attack}, "
+          f"DEF {party.defense}), {args.fights} fights per encounter, {backend}\n")
+    print(f"{'Encounter':<50} {'Win%':>7} {'Wipe%':>7} {'Turns p10/50/90':>17} {'HP left p10/50/90':>19}")
+
+    started = time.perf_counter()
+    for scene_id, index, enemy in encounters(story):
+        if args.encounter and scene_id != args.encounter:
+            continue
+        stats = simulate(enemy, party, args.policy, args.fights, args.seed)
+        turns = '/'.join(f"{stats.turns[p]:g}" for p in PERCENTILES) if stats.wins else '-'
+        hp_left = '/'.join(f"{stats.hp_left[p]:g}" for p in PERCENTILES) if stats.wins else '-'
+        label = f"{scene_id}#{index + 1} {enemy.name}"
+        print(f"{label:<50} {stats.win_rate:>7.2%} {stats.losses / stats.fights:>7.2%} {turns:>17} {hp_left:>19}")
+    print(f"\nDone in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Json2RPGDesu - Game Clock
+
+This module owns all pacing of the front ends. Attack animations, loading
+spinners and the pauses between combat beats wait on a Clock instead of
+calling time.sleep() or asyncio.sleep() directly, so one session can run
+in real time while another fast-forwards or skips every delay.
+
+A clock runs at a speed: 1 is real time, 4 makes every delay four times
+shorter, and an instant clock never waits. The same clock can pace a
+blocking front end (sleep) or an asyncio one (wait), where an instant
+clock only yields to other tasks.
+
+Key Features:
+- Real-time, scaled and instant pacing behind one interface
+- Blocking and asyncio waits
+- Parsing of command line speeds such as 'real', '4x' and 'instant'
+
+Classes:
+    Clock: Paces delays at a given speed
+
+Dependencies:
+    - asyncio: For non-blocking waits (imported on use, so the terminal front end
+      does not pay for it at startup)
+    - math: For the infinite speed of the instant clock
+    - time: For blocking waits
+"""
+
+import math
+import time
+
+
+class Clock:
+    """
+    Paces delays at a given speed.
+
+    Attributes:
+        speed (float): How many times faster than real time delays pass,
+            math.inf for an instant clock
+    """
+
+    __slots__ = ('speed',)
+
+    def __init__(self, speed: float = 1.0):
+        """
+        Initialize a clock.
+
+        Args:
+            speed: How many times faster than real time delays pass
+
+        Raises:
+            ValueError: If the speed is not positive
+        """
+        if not speed > 0:
+            raise ValueError(f"Clock speed must be positive, not {speed}")
+        self.speed = speed
+
+    @classmethod
+    def parse(cls, text: str) -> 'Clock':
+        """
+        Build a clock from a speed such as 'real', 'instant', '4x' or '0.5'.
+
+        Args:
+            text: Speed to parse
+
+        Returns:
+            Clock: The clock
+
+        Raises:
+            ValueError: If the speed is malformed
+        """
+        text = text.strip().lower()
+        if text == 'real':
+            return cls()
+        if text == 'instant':
+            return cls(math.inf)
+        return cls(float(text[:-1] if text.endswith('x') else text))
+
+    @property
+    def instant(self) -> bool:
+        """Whether the clock skips every delay."""
+        return self.speed == math.inf
+
+    def delay(self, seconds: float) -> float:
+        """
+        How long a delay lasts on this clock.
+
+        Args:
+            seconds: Delay in real time
+
+        Returns:
+            float: Delay at this clock's speed
+        """
+        return seconds / self.speed
+
+    def sleep(self, seconds: float):
+        """
+        Block for a delay.
+
+        Args:
+            seconds: Delay in real time
+        """
+        seconds = self.delay(seconds)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def wait(self, seconds: float):
+        """
+        Wait for a delay without blocking other tasks.
+
+        An instant clock still yields once, so a fast-forwarded session
+        cannot starve the others.
+
+        Args:
+            seconds: Delay in real time
+        """
+        import asyncio
+        await asyncio.sleep(self.delay(seconds))
+
+    def __str__(self):
+        if self.instant:
+            return 'instant'
+        return 'real' if self.speed == 1 else f'{self.speed:g}x'
+
+
+REAL_TIME = Clock()
+INSTANT = Clock(math.inf)
@@ -0,0 +1,299 @@
+"""
+Json2RPGDesu - Choice Conditions and Story Flags
+
+This module compiles the "requires" and "sets" fields of story choices.
+Flags are named markers that choices set or clear, such as "met_the_king"
+or "bridge_burned". Each flag name gets a bit number when the story is
+loaded, and a session keeps all its flags in one integer, so setting flags
+is one OR and one AND-NOT however many flags a story uses.
+
+A requirement is compiled once, at load time, into a predicate over the
+flag bits, the party and the player deciding. Conditions that only test
+flags, by far the most common kind, become a single mask comparison, so
+filtering the available choices of a scene on every redraw never walks a
+dict tree.
+
+Condition syntax in story.json:
+    "met_king"                          flag is set
+    "!met_king"                         flag is not set
+    ["met_king", "!bridge_burned"]      all of them hold
+    {"all": [...]} / {"any": [...]}     all / at least one of them holds
+    {"not": condition}                  condition does not hold
+    {"stat": "health", "min": 50}       the deciding player's stat is in range
+                                        ("max" works too)
+    {"item": "potion", "min": 2}        the deciding player carries at least 2
+                                        ("min" defaults to 1, "max" works too;
+                                        "party": true counts the whole party)
+
+New condition kinds are added with register_condition().
+
+Key Features:
+- Flag names interned to bit numbers at load time
+- Per-session flags stored as one integer bitset
+- Conditions compiled to predicates, flag-only ones to two masks
+- Item conditions resolved to catalog indices, answered from inventory counts
+- Registry for new condition kinds
+
+Classes:
+    FlagTable: Flag names and their bit numbers
+
+Functions:
+    register_condition: Add a condition kind
+    compile_condition: Turn a "requires" value into a predicate
+    compile_flag_changes: Turn a "sets" value into set and clear masks
+
+Dependencies:
+    - typing: For type hints
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# A compiled condition: predicate(flags, roster, player) -> bool, where
+# player is the index of the player deciding
+Condition = Callable[[int, Any, int], bool]
+
+# Stats a {"stat": ...} condition can test
+STATS = ('health', 'max_health', 'attack', 'defense')
+
+
+class FlagTable:
+    """
+    Flag names and their bit numbers.
+
+    Bits are handed out in the order flags are first seen, so compiling the
+    same story always numbers its flags the same way.
+
+    Attributes:
+        names (List[str]): Flag name of each bit
+        bits (Dict[str, int]): Bit number of each flag name
+    """
+
+    __slots__ = ('names', 'bits')
+
+    def __init__(self, names: Sequence[str] = ()):
+        """
+        Initialize a flag table.
+
+        Args:
+            names: Flag names already numbered, in bit order
+        """
+        self.names = list(names)
+        self.bits = {name: bit for bit, name in enumerate(self.names)}
+
+    def bit(self, name: str) -> int:
+        """
+        Bit number of a flag, numbering it if it is new.
+
+        Args:
+            name: Flag name
+
+        Returns:
+            int: Bit number
+        """
+        bit = self.bits.get(name)
+        if bit is None:
+            bit = self.bits[name] = len(self.names)
+            self.names.append(name)
+        return bit
+
+    def mask(self, names: Sequence[str]) -> int:
+        """
+        Bitset of flags, ignoring names the story never uses.
+
+        Args:
+            names: Flag names
+
+        Returns:
+            int: Bitset
+        """
+        bits = 0
+        for name in names:
+            if name in self.bits:
+                bits |= 1 << self.bits[name]
+        return bits
+
+    def flag_names(self, flags: int) -> List[str]:
+        """
+        Names of the flags set in a bitset.
+
+        Args:
+            flags: Bitset
+
+        Returns:
+            List[str]: Flag names in bit order
+        """
+        return [name for bit, name in enumerate(self.names) if flags >> bit & 1]
+
+
+# Condition compilers by key of a dict condition:
+# compiler(raw condition, bit of a flag name, catalog index of an item) -> Condition
+Compiler = Callable[[Dict, Callable[[str], int], Callable[[Any], int]], Condition]
+CONDITIONS: Dict[str, Compiler] = {}
+
+
+def register_condition(key: str, compiler: Compiler):
+    """
+    Add a condition kind.
+
+    Args:
+        key: Key identifying the kind in a dict condition, e.g. "stat"
+        compiler: Function compiling the dict into a predicate, given a
+            function numbering flag names and one resolving item IDs; it
+            raises ValueError if the condition is malformed
+    """
+    CONDITIONS[key] = compiler
+
+
+def compile_condition(raw: Any, bit: Callable[[str], int],
+                      item: Optional[Callable[[Any], int]] = None) -> Optional[Condition]:
+    """
+    Turn a "requires" value into a predicate.
+
+    Args:
+        raw: Condition from story.json, None for no requirement
+        bit: Bit number of a flag name (FlagTable.bit)
+        item: Catalog index of an item ID (ItemCatalog.resolve), None for a
+            story without items
+
+    Returns:
+        Condition: The predicate, None if there is no requirement
+
+    Raises:
+        ValueError: If the condition is malformed
+    """
+    if raw is None:
+        return None
+    return _compile(raw, bit, item or _no_items)
+
+
+def _no_items(item_id: Any) -> int:
+    raise ValueError(f"Unknown item {item_id!r}")
+
+
+def compile_flag_changes(raw: Any, bit: Callable[[str], int]) -> Tuple[int, int]:
+    """
+    Turn a "sets" value, a flag name or a list of them, into masks.
+
+    A name starting with "!" clears the flag instead.
+
+    Args:
+        raw: Flag names from story.json, None for no change
+        bit: Bit number of a flag name (FlagTable.bit)
+
+    Returns:
+        Tuple[int, int]: Bits to set and bits to clear
+
+    Raises:
+        ValueError: If the value is not a flag name or a list of them
+    """
+    if raw is None:
+        return 0, 0
+    names = [raw] if isinstance(raw, str) else raw
+    if not isinstance(names, list) or not all(isinstance(name, str) and name.lstrip('!') for name in names):
+        raise ValueError(f"'sets' takes a flag name or a list of them, not {raw!r}")
+    sets = clears = 0
+    for name in names:
+        if name.startswith('!'):
+            clears |= 1 << bit(name[1:])
+        else:
+            sets |= 1 << bit(name)
+    return sets, clears
+
+
+def _flag_literals(raw: Any) -> Optional[Tuple[List[str], List[str]]]:
+    """Flags that must be set and unset if raw only tests flags, else None."""
+    items = raw if isinstance(raw, list) else [raw]
+    if not all(isinstance(item, str) and item.lstrip('!') for item in items):
+        return None
+    return ([item for item in items if not item.startswith('!')],
+            [item[1:] for item in items if item.startswith('!')])
+
+
+def _compile(raw: Any, bit: Callable[[str], int], item: Callable[[Any], int]) -> Condition:
+    literals = _flag_literals(raw)
+    if literals is not None:
+        need = forbid = 0
+        for name in literals[0]:
+            need |= 1 << bit(name)
+        for name in literals[1]:
+            forbid |= 1 << bit(name)
+        return lambda flags, roster, player: flags & need == need and not flags & forbid
+
+    if isinstance(raw, list):
+        return _all([_compile(entry, bit, item) for entry in raw])
+    if isinstance(raw, dict):
+        for key, compiler in CONDITIONS.items():
+            if key in raw:
+                return compiler(raw, bit, item)
+    raise ValueError(f"Unknown condition: {raw!r}")
+
+
+def _all(conditions: List[Condition]) -> Condition:
+    return lambda flags, roster, player: all(condition(flags, roster, player) for condition in conditions)
+
+
+def _compile_all(raw: Dict, bit, item) -> Condition:
+    entries = raw['all']
+    if not isinstance(entries, list):
+        raise ValueError(f"'all' takes a list of conditions, not {entries!r}")
+    return _compile(entries, bit, item) if entries else (lambda flags, roster, player: True)
+
+
+def _compile_any(raw: Dict, bit, item) -> Condition:
+    entries = raw['any']
+    if not isinstance(entries, list):
+        raise ValueError(f"'any' takes a list of conditions, not {entries!r}")
+    conditions = [_compile(entry, bit, item) for entry in entries]
+    return lambda flags, roster, player: any(condition(flags, roster, player) for condition in conditions)
+
+
+def _compile_not(raw: Dict, bit, item) -> Condition:
+    condition = _compile(raw['not'], bit, item)
+    return lambda flags, roster, player: not condition(flags, roster, player)
+
+
+def _bounds(raw: Dict, kind: str, low: float) -> Tuple[float, float]:
+    """The "min" and "max" of a stat or item condition, open-ended where left out."""
+    bounds = []
+    for key, default in (('min', low), ('max', float('inf'))):
+        if key not in raw:
+            bounds.append(default)
+            continue
+        value = raw[key]
+        # bool is an int subclass, and null would only fail once the condition is checked
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"Invalid {kind} condition: '{key}' must be a whole number, not {value!r}")
+        bounds.append(value)
+    return bounds[0], bounds[1]
+
+
+def _compile_stat(raw: Dict, bit, item) -> Condition:
+    stat = raw['stat']
+    if stat not in STATS:
+        raise ValueError(f"Invalid stat condition: {raw!r}")
+    low, high = _bounds(raw, 'stat', float('-inf'))
+
+    def check(flags: int, roster, player: int) -> bool:
+        return low <= getattr(roster, stat)[player] <= high
+    return check
+
+
+def _compile_item(raw: Dict, bit, item) -> Condition:
+    low, high = _bounds(raw, 'item', 1)
+    index = item(raw['item'])
+
+    if raw.get('party'):
+        def check(flags: int, roster, player: int) -> bool:
+            return low <= roster.inventory.totals[index] <= high
+    else:
+        def check(flags: int, roster, player: int) -> bool:
+            inventory = roster.inventory
+            return low <= inventory.counts[player * inventory.size + index] <= high
+    return check
+
+
+register_condition('all', _compile_all)
+register_condition('any', _compile_any)
+register_condition('not', _compile_not)
+register_condition('stat', _compile_stat)
+register_condition('item', _compile_item)
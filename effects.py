@@ -0,0 +1,203 @@
+"""
+Json2RPGDesu - Effect Registry
+
+This module defines every effect a choice or vote option can have on the
+party (heal, buff_attack, buff_defense, damage, ...). Effects are compiled
+once when a story is loaded: the raw {"heal": 20, "damage": 5} dict becomes
+a tuple of (opcode, amount) pairs in a fixed order, so applying an effect
+during play is a single loop over a short tuple with no dict probing.
+
+The engine applies every effect through the same dispatch path, to one
+player or to the whole party. An effect works on a slice of the party's
+stat columns, so a party-wide effect is one batched update however large
+the party is. Applying effects never prints anything; the engine returns
+Events that front ends present with the messages registered here.
+
+Adding a new effect type takes one register() call: its name in story
+files, a function applying it to a row slice of the roster, and the
+messages shown for one player and for the whole party.
+
+Timed effects (poison, regen, fortify, rage) are registered with a default
+number of turns and put a status on the players instead of changing their
+stats once; the roster's StatusBoard (status.py) ticks and expires them.
+A story gives their amount alone, {"poison": 4}, or with a duration,
+{"poison": {"amount": 4, "turns": 5}}.
+
+Key Features:
+- Effects compiled to opcode tuples at load time
+- Row-slice implementations shared by single players and whole parties
+- Batched column updates on the array-backed roster
+- Messages registered alongside each effect
+- Timed effects backed by the status subsystem
+
+Classes:
+    EffectOp: One compiled effect step
+    EffectType: A registered effect
+
+Functions:
+    register: Add an effect type to the registry
+    compile_effect: Turn a story effect dict into opcodes
+
+Dependencies:
+    - array: For the roster's stat columns
+    - typing: For type hints
+"""
+
+from array import array
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class EffectOp(NamedTuple):
+    """One compiled effect step: an index into OPCODES, its amount and, for timed effects, its turns."""
+    code: int
+    amount: int
+    turns: int = 0
+
+
+class EffectType(NamedTuple):
+    """
+    A registered effect.
+
+    apply(roster, start, stop, amount, turns) updates rows start..stop of
+    the roster and returns the least and most any of those players was
+    affected, which the events report as the amount. turns is the default
+    duration of a timed effect, 0 for effects applied once.
+    """
+    name: str
+    apply: Callable[[Any, int, int, int, int], Tuple[int, int]]
+    message: str
+    party_message: str
+    turns: int = 0
+
+    def describe(self, data: Dict) -> str:
+        """Message for an 'effect' or 'party_effect' event of this type."""
+        return (self.message if 'player' in data else self.party_message).format(**data)
+
+
+# Registered effects by name, and by opcode. Compiled effects run in
+# opcode order, which is the order effects were registered in.
+EFFECTS: Dict[str, EffectType] = {}
+OPCODES: List[EffectType] = []
+_CODES: Dict[str, int] = {}
+
+
+def register(name: str, apply: Callable[[Any, int, int, int, int], Tuple[int, int]],
+             message: str, party_message: str, turns: int = 0):
+    """
+    Add an effect type to the registry.
+
+    Args:
+        name: Key of the effect in story files
+        apply: Function updating a row slice of a Roster, see EffectType
+        message: Message for one player, formatted with {player} and {amount}
+        party_message: Message for the whole party, formatted with {amount}
+            and {least}
+        turns: Default duration of a timed effect, 0 for effects applied once;
+            messages of timed effects can use {turns}
+    """
+    effect_type = EffectType(name, apply, message, party_message, turns)
+    _CODES[name] = len(OPCODES)
+    OPCODES.append(effect_type)
+    EFFECTS[name] = effect_type
+
+
+def compile_effect(effect: Optional[Dict]) -> Tuple[EffectOp, ...]:
+    """
+    Turn a story effect dict into opcodes.
+
+    Unknown effect names and non-numeric amounts are ignored, like the
+    rest of the story loader ignores keys it does not know. Timed effects
+    also take {"amount": ..., "turns": ...}.
+
+    Args:
+        effect: Effect dict from story.json, e.g. {"heal": 20}
+
+    Returns:
+        Tuple[EffectOp, ...]: Opcodes in registry order, empty for no effect
+    """
+    if not effect:
+        return ()
+    ops = []
+    for name, value in effect.items():
+        if name not in _CODES:
+            continue
+        effect_type = EFFECTS[name]
+        amount, turns = value, effect_type.turns
+        if isinstance(value, dict) and turns:
+            amount, turns = value.get('amount'), value.get('turns', turns)
+            if not _is_int(turns) or turns < 1:
+                continue
+        if _is_int(amount):
+            ops.append(EffectOp(_CODES[name], amount, turns))
+    ops.sort()
+    return tuple(ops)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _heal(roster, start: int, stop: int, amount: int, turns: int) -> Tuple[int, int]:
+    roster.health[start:stop] = array('l', map(min, roster.max_health[start:stop],
+                                               (h + amount for h in roster.health[start:stop])))
+    return amount, amount
+
+
+def _buff(stat: str):
+    def apply(roster, start: int, stop: int, amount: int, turns: int) -> Tuple[int, int]:
+        column = getattr(roster, stat)
+        column[start:stop] = array('l', (value + amount for value in column[start:stop]))
+        return amount, amount
+    return apply
+
+
+def _damage(roster, start: int, stop: int, amount: int, turns: int) -> Tuple[int, int]:
+    # Defense soaks up damage, as in Player.take_damage
+    dealt = [max(0, amount - d) for d in roster.defense[start:stop]]
+    health = array('l', (max(0, h - d) for h, d in zip(roster.health[start:stop], dealt)))
+    roster.health[start:stop] = health
+    roster.alive[start:stop] = bytearray(h > 0 for h in health)
+    return min(dealt, default=0), max(dealt, default=0)
+
+
+def _buff_max_health(roster, start: int, stop: int, amount: int, turns: int) -> Tuple[int, int]:
+    _buff('max_health')(roster, start, stop, amount, turns)
+    # Living players gain the new health right away
+    roster.health[start:stop] = array('l', (h + amount if h > 0 else h for h in roster.health[start:stop]))
+    return amount, amount
+
+
+def _timed(status: str):
+    def apply(roster, start: int, stop: int, amount: int, turns: int) -> Tuple[int, int]:
+        roster.statuses.add(roster, range(start, stop), status, amount, turns)
+        return amount, amount
+    return apply
+
+
+register('heal', _heal,
+         "{player} drinks a magical potion and heals for {amount} HP! (✿◠‿◠)",
+         "The whole party drinks a magical potion and heals for {amount} HP! (✿◠‿◠)")
+register('buff_attack', _buff('attack'),
+         "{player}'s attack increased by {amount}! (•̀ᴗ•́)و✧",
+         "The party's attack increased by {amount}! (•̀ᴗ•́)و✧")
+register('buff_defense', _buff('defense'),
+         "{player}'s defense increased by {amount}! ᕙ(⇀‸↼‶)ᕗ",
+         "The party's defense increased by {amount}! ᕙ(⇀‸↼‶)ᕗ")
+register('damage', _damage,
+         "{player} took {amount} damage! ( >﹏< )",
+         "The party took up to {amount} damage! ( >﹏< )")
+register('buff_max_health', _buff_max_health,
+         "{player}'s maximum health increased by {amount}! ٩(◕‿◕)۶",
+         "The party's maximum health increased by {amount}! ٩(◕‿◕)۶")
+register('poison', _timed('poison'),
+         "{player} was poisoned for {turns} turns! (×﹏×)",
+         "The whole party was poisoned for {turns} turns! (×﹏×)", turns=3)
+register('regen', _timed('regen'),
+         "{player} will regenerate {amount} HP for {turns} turns! (✿◠‿◠)",
+         "The party will regenerate {amount} HP for {turns} turns! (✿◠‿◠)", turns=3)
+register('fortify', _timed('fortified'),
+         "{player}'s defense rose by {amount} for {turns} turns! ᕙ(⇀‸↼‶)ᕗ",
+         "The party's defense rose by {amount} for {turns} turns! ᕙ(⇀‸↼‶)ᕗ", turns=3)
+register('rage', _timed('enraged'),
+         "{player} is enraged: attack +{amount} for {turns} turns! (╬ಠ益ಠ)",
+         "The party is enraged: attack +{amount} for {turns} turns! (╬ಠ益ಠ)", turns=3)
@@ -0,0 +1,1065 @@
+"""
+Json2RPGDesu - Headless Engine Core
+
+This module holds the game rules of Json2RPGDesu without any terminal I/O.
+Nothing in here calls input(), print(), clears the screen or sleeps, so a
+session can be advanced as fast as the CPU allows: from the kawaii CLI in
+test.py, from a server, or from a simulation harness running thousands of
+sessions in one process.
+
+A session is a GameState. It is advanced one Action at a time with
+advance(state, action), which returns the state together with a list of
+Events describing what happened (scene entered, attack landed, vote
+resolved, ...). Front ends decide how those events are presented.
+
+Key Features:
+- Step-function API: advance(state, action) -> (state, events)
+- Phase machine covering choices, group votes, agreement votes and combat
+- Choices gated on story flags kept as a per-session bitset
+- Ballots accepted in any order, with a running tally that closes a vote
+  as soon as its result is settled
+- Same rules as the original interactive game loop
+- Fights against any number of enemies, with turns taken from an
+  initiative queue that skips fallen units
+- Parties of any size, with stats stored as compact per-stat arrays so
+  party-wide effects are one batched update
+- Timed status effects (poison, regeneration, temporary buffs) ticked and
+  expired from a turn-keyed priority queue
+- Per-player inventories over the story's item catalog, with items given,
+  taken and used by choices and used as a combat action
+- Per-session seeded random stream, so a seed plus the Actions played
+  reproduce a session exactly
+
+Classes:
+    Roster: Stats of the whole party, stored column by column
+    Player: Represents a player character with stats and abilities
+    Event: Something that happened while advancing a session
+    Action: Input fed into a session by a player
+    EnemyState: One enemy in an ongoing fight
+    CombatState: Enemies and bookkeeping for an ongoing fight
+    GameState: Complete state of one game session
+
+Dependencies:
+    - story: Compiled story records
+    - effects: Effect registry and compiled effect opcodes
+    - status: Timed status effects
+    - items: Party inventories
+    - heapq: For the combat initiative queue
+    - random: For the per-session random streams
+    - array: For the roster's stat columns
+    - typing: For type hints
+"""
+
+import heapq
+import random
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from effects import OPCODES, EffectOp, compile_effect
+from items import Inventory
+from status import StatusBoard
+from story import (
+    CompiledStory, Choice, Enemy, RequiresVote, Scene, VotingSystem,
+    CHOICE_AGREE, CHOICE_COMBAT, CHOICE_VOTE, END,
+)
+
+# Phases a session can be in. The phase names double as the Action kinds
+# accepted while the session is in that phase.
+PHASE_CHOOSE = 'choose'
+PHASE_VOTE = 'vote'
+PHASE_AGREE = 'agree'
+PHASE_COMBAT = 'combat'
+PHASE_OVER = 'over'
+
+COMBAT_ACTIONS = ('attack', 'defend', 'heal', 'special')
+# Combat action using an item: ['item', catalog index]
+ITEM_ACTION = 'item'
+
+# Initiative: a unit with speed s acts every INITIATIVE // s time units.
+# Players all have HERO_SPEED, so on their own they keep turn order.
+INITIATIVE = 1000
+HERO_SPEED = 10
+HERO_INTERVAL = INITIATIVE // HERO_SPEED
+
+
+class Event(NamedTuple):
+    """
+    Something that happened while advancing a session.
+
+    Attributes:
+        kind (str): Event type, e.g. 'scene', 'player_attack', 'vote_result'
+        data (Dict): Event payload
+    """
+    kind: str
+    data: Dict[str, Any]
+
+
+class Action(NamedTuple):
+    """
+    Input fed into a session.
+
+    Attributes:
+        kind (str): One of 'choose', 'vote', 'agree' or 'combat'
+        value (Any): Choice index, option index, yes/no bool or combat action.
+            A ballot may also be a [player, vote] pair, so the party can vote
+            in any order; a bare vote counts for the first player who has
+            not voted yet. A vote of None abstains.
+    """
+    kind: str
+    value: Any
+
+
+class Roster:
+    """
+    Stats of the whole party, stored column by column.
+
+    Each stat is one compact array indexed by player, so a party of
+    hundreds costs a few bytes per player and stat, and party-wide effects
+    update a whole column at once instead of walking Player objects.
+    Indexing a roster gives a Player, a view onto one row.
+
+    Attributes:
+        names (List[str]): Player names in turn order
+        health (array): Current health points
+        max_health (array): Maximum health points
+        attack (array): Attack power
+        defense (array): Defense power
+        alive (bytearray): 1 for every player still standing
+        status_effects (List[List[Status]]): Active status effects
+        statuses (StatusBoard): Turn counter and schedule of the status effects
+        inventory (Inventory): Item counts of every player
+    """
+
+    __slots__ = ('names', 'health', 'max_health', 'attack', 'defense', 'alive', 'status_effects',
+                 'statuses', 'inventory')
+
+    def __init__(self, names: Sequence[str] = (), items: int = 0):
+        """
+        Initialize a roster of fresh players with empty inventories.
+
+        Args:
+            names: Player names in turn order
+            items: Number of items in the story's catalog
+        """
+        size = len(names)
+        self.names = list(names)
+        self.health = array('l', [100]) * size
+        self.max_health = array('l', [100]) * size
+        self.attack = array('l', [10]) * size
+        self.defense = array('l', [10]) * size
+        self.alive = bytearray(b'\x01') * size
+        self.status_effects = [[] for _ in range(size)]
+        self.statuses = StatusBoard()
+        self.inventory = Inventory(size, items)
+
+    @classmethod
+    def from_players(cls, players: Iterable['Player']) -> 'Roster':
+        """
+        Gather players into one roster, copying their stats.
+
+        Status effects and items are not carried over, since their schedule
+        and counts belong to the players' old rosters.
+
+        Args:
+            players: Players in turn order
+
+        Returns:
+            Roster: The party
+        """
+        players = list(players)
+        roster = cls([p.name for p in players])
+        roster.health = array('l', (p.health for p in players))
+        roster.max_health = array('l', (p.max_health for p in players))
+        roster.attack = array('l', (p.attack for p in players))
+        roster.defense = array('l', (p.defense for p in players))
+        roster.alive = bytearray(p.is_alive for p in players)
+        return roster
+
+    def copy(self) -> 'Roster':
+        """
+        Independent copy of the party, status effects and items included.
+
+        Returns:
+            Roster: The copy
+        """
+        roster = Roster.__new__(Roster)
+        roster.names = list(self.names)
+        roster.health = array('l', self.health)
+        roster.max_health = array('l', self.max_health)
+        roster.attack = array('l', self.attack)
+        roster.defense = array('l', self.defense)
+        roster.alive = bytearray(self.alive)
+        roster.status_effects = [[] for _ in self.names]
+        roster.statuses = StatusBoard()
+        roster.statuses.turn = self.statuses.turn
+        roster.statuses.restore(roster, self.statuses.snapshot(self))
+        roster.inventory = self.inventory.copy()
+        return roster
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> 'Player':
+        if not -len(self.names) <= index < len(self.names):
+            raise IndexError('player index out of range')
+        return Player._view(self, index % len(self.names))
+
+    def __iter__(self) -> Iterator['Player']:
+        return (Player._view(self, i) for i in range(len(self.names)))
+
+    @property
+    def any_alive(self) -> bool:
+        """Whether at least one player is still standing."""
+        return 1 in self.alive
+
+    def next_alive(self, index: int) -> int:
+        """
+        Index of the first standing player at or after index, wrapping around.
+
+        Args:
+            index: Where to start looking
+
+        Returns:
+            int: Index of a standing player, -1 if everyone has fallen
+        """
+        found = self.alive.find(1, index)
+        return found if found >= 0 else self.alive.find(1, 0, index)
+
+    def wipe(self):
+        """Knock out the whole party."""
+        size = len(self.names)
+        self.health = array('l', [0]) * size
+        self.alive = bytearray(size)
+
+    def apply_effect(self, effect: Union[Dict, Tuple[EffectOp, ...]]) -> List[Event]:
+        """
+        Apply an effect to the whole party at once.
+
+        Args:
+            effect: Compiled effect, or a raw effect dict from a story file
+
+        Returns:
+            List[Event]: One 'party_effect' event per applied effect
+        """
+        return _apply_effects(self, effect, None)
+
+
+def _column(name: str, doc: str) -> property:
+    """Property reading and writing one Roster column at the player's row."""
+    def get(self):
+        return getattr(self._roster, name)[self._index]
+
+    def set(self, value):
+        getattr(self._roster, name)[self._index] = value
+
+    return property(get, set, doc=doc)
+
+
+class Player:
+    """
+    Represents a player character in the game.
+
+    A player is a view onto one row of a Roster; its stats live in the
+    roster's columns. A player created on its own gets a roster of one.
+
+    Attributes:
+        name (str): Player's name
+        health (int): Current health points
+        max_health (int): Maximum health points
+        attack (int): Attack power
+        defense (int): Defense power
+        is_alive (bool): Whether the player is alive
+        status_effects (List[Status]): Active status effects
+    """
+
+    __slots__ = ('_roster', '_index')
+
+    def __init__(self, name: str):
+        """
+        Initialize a new player.
+
+        Args:
+            name: The player's name
+        """
+        self._roster = Roster((name,))
+        self._index = 0
+
+    @classmethod
+    def _view(cls, roster: Roster, index: int) -> 'Player':
+        player = cls.__new__(cls)
+        player._roster = roster
+        player._index = index
+        return player
+
+    name = _column('names', "Player's name")
+    health = _column('health', "Current health points")
+    max_health = _column('max_health', "Maximum health points")
+    attack = _column('attack', "Attack power")
+    defense = _column('defense', "Defense power")
+    status_effects = _column('status_effects', "Active status effects")
+
+    @property
+    def is_alive(self) -> bool:
+        """Whether the player is alive."""
+        return bool(self._roster.alive[self._index])
+
+    @is_alive.setter
+    def is_alive(self, value: bool):
+        self._roster.alive[self._index] = bool(value)
+
+    def roll_dice(self, sides: int = 20, rng: random.Random = random) -> int:
+        """
+        Roll a dice with specified number of sides.
+
+        Args:
+            sides: Number of sides on the dice
+            rng: Random stream to roll with, defaults to the global one
+
+        Returns:
+            int: Random number between 1 and sides
+        """
+        return rng.randint(1, sides)
+
+    def take_damage(self, damage: int):
+        """
+        Apply damage to the player, accounting for defense.
+
+        Args:
+            damage: Amount of damage to apply
+
+        Returns:
+            int: Actual damage dealt after defense
+        """
+        actual_damage = max(0, damage - self.defense)
+        self.health = max(0, self.health - actual_damage)
+        self.is_alive = self.health > 0
+        return actual_damage
+
+    def heal(self, amount: int):
+        """
+        Heal the player for a specified amount.
+
+        Args:
+            amount: Amount of health to restore
+        """
+        self.health = min(self.max_health, self.health + amount)
+
+    def apply_effect(self, effect: Union[Dict, Tuple[EffectOp, ...]]) -> List[Event]:
+        """
+        Apply various effects to the player.
+
+        Args:
+            effect: Compiled effect, or a raw effect dict from a story file
+
+        Returns:
+            List[Event]: One 'effect' event per applied effect
+        """
+        return _apply_effects(self._roster, effect, self._index)
+
+
+def _apply_effects(roster: Roster, effect: Union[Dict, Tuple[EffectOp, ...]],
+                   player: Optional[int]) -> List[Event]:
+    """Apply effects to one player, or the whole party if player is None."""
+    ops = compile_effect(effect) if isinstance(effect, dict) else effect
+    if player is None:
+        start, stop = 0, len(roster)
+    else:
+        start, stop = player, player + 1
+    events = []
+    for code, amount, turns in ops:
+        effect_type = OPCODES[code]
+        least, most = effect_type.apply(roster, start, stop, amount, turns)
+        if player is None:
+            data = {'effect': effect_type.name, 'amount': most, 'least': least, 'players': stop - start}
+        else:
+            data = {'player': roster.names[player], 'effect': effect_type.name, 'amount': most}
+        if turns:
+            data['turns'] = turns
+        events.append(Event('party_effect' if player is None else 'effect', data))
+    return events
+
+
+class EnemyState:
+    """
+    One enemy in an ongoing fight.
+
+    Attributes:
+        name (str): Enemy name
+        color (str): Story color name used to display the enemy
+        health (int): Current enemy health
+        max_health (int): Enemy health at the start of the fight
+        attack (int): Enemy attack power
+        defense (int): Enemy defense power
+        speed (int): Initiative speed, None for an enemy striking back at every player who acts
+    """
+
+    __slots__ = ('name', 'color', 'health', 'max_health', 'attack', 'defense', 'speed')
+
+    def __init__(self, enemy: Enemy):
+        self.name = enemy.name
+        self.color = enemy.color
+        self.health = enemy.health
+        self.max_health = enemy.health
+        self.attack = enemy.attack
+        self.defense = enemy.defense
+        self.speed = enemy.speed
+
+
+class CombatState:
+    """
+    Enemies and bookkeeping for an ongoing fight.
+
+    Turns are taken from an initiative queue of (time, rank, unit) entries.
+    Unit 0..n-1 are the players and n.. the enemies with a speed; a unit
+    acts again 1000 // speed time units after its last turn, and ties go
+    to the lower rank: players in turn order from whoever started the
+    fight, then enemies in story order. Every living unit has exactly one
+    entry, and fallen units are dropped when their entry comes up, so
+    finding the next turn costs O(log n) however many units have fallen.
+
+    Attributes:
+        enemies (List[EnemyState]): Every enemy of the fight, in story order
+        remaining (int): Enemies still standing
+        retaliators (List[EnemyState]): Enemies without a speed, which strike
+            back at every player who acts
+        queue (List[Tuple[int, int, int]]): Initiative queue
+        time (int): Time of the turn being played
+        choice (Choice): Choice that started the fight
+        chooser (int): Index of the player who picked the choice
+    """
+
+    __slots__ = ('enemies', 'remaining', 'retaliators', 'queue', 'time', 'choice', 'chooser', '_front')
+
+    def __init__(self, enemies: Sequence[Enemy], choice: Choice, chooser: int, party: Roster):
+        self.enemies = [EnemyState(enemy) for enemy in enemies]
+        self.remaining = sum(enemy.health > 0 for enemy in self.enemies)
+        self.retaliators = [enemy for enemy in self.enemies if enemy.speed is None]
+        self.choice = choice
+        self.chooser = chooser
+        self.time = 0
+        self._front = 0
+
+        size = len(party)
+        queue = [(HERO_INTERVAL, (i - chooser) % size, i) for i in range(size) if party.alive[i]]
+        queue.extend((_interval(enemy.speed), size + j, size + j) for j, enemy in enumerate(self.enemies)
+                     if enemy.speed is not None and enemy.health > 0)
+        heapq.heapify(queue)
+        self.queue = queue
+
+    @property
+    def name(self) -> str:
+        """Name of the encounter: the enemy's, or the first enemy's and how many more there are."""
+        if len(self.enemies) == 1:
+            return self.enemies[0].name
+        return f"{self.enemies[0].name} and {len(self.enemies) - 1} more"
+
+    @property
+    def color(self) -> str:
+        """Story color name of the first enemy."""
+        return self.enemies[0].color
+
+    def first_alive(self) -> int:
+        """Index of the first enemy still standing, -1 if they have all fallen."""
+        # Enemies never get back up, so the front only moves forward
+        enemies = self.enemies
+        while self._front < len(enemies) and enemies[self._front].health <= 0:
+            self._front += 1
+        return self._front if self._front < len(enemies) else -1
+
+
+def _interval(speed: int) -> int:
+    """Time between two turns of a unit with this speed."""
+    return max(1, INITIATIVE // speed)
+
+
+class GameState:
+    """
+    Complete state of one game session.
+
+    The state is owned by whoever drives the session; advance() updates it in
+    place and hands it back so callers can treat the engine as a step function.
+
+    Attributes:
+        story (CompiledStory): Compiled story being played
+        players (Roster): Party members in turn order
+        scene_index (int): Index of the current scene, END once the story is over
+        current_player_index (int): Index of the player whose turn it is
+        scenes_visited (set): Set of visited scene indices
+        phase (str): What kind of Action the session is waiting for
+        pending (VotingSystem | RequiresVote): Voting block being decided in the vote/agree phases
+        ballots (Dict[int, Any]): Ballots cast so far in the vote/agree phases, by player
+        combat (CombatState): Ongoing fight in the combat phase
+        flags (int): Story flags set so far, one bit per flag (story.flags numbers them)
+        seed (int): Seed the session's random stream started from
+        rng (random.Random): Random stream for every dice roll and tie breaker
+    """
+
+    __slots__ = ('story', 'players', 'scene_index', 'current_player_index', 'scenes_visited',
+                 'phase', 'pending', 'ballots', 'combat', 'flags', 'seed', 'rng')
+
+    def __init__(self, story: CompiledStory, players: Iterable[Player], seed: Optional[int] = None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.story = story
+        self.players = players if isinstance(players, Roster) else Roster.from_players(players)
+        self.scene_index = END
+        self.current_player_index = 0
+        self.scenes_visited = set()
+        self.phase = PHASE_CHOOSE
+        self.pending = None
+        self.ballots: Dict[int, Any] = {}
+        self.combat: Optional[CombatState] = None
+        self.flags = 0
+
+    @property
+    def current_scene(self) -> str:
+        """ID of the current scene."""
+        return self.story.scene_id(self.scene_index)
+
+    @property
+    def scene(self) -> Optional[Scene]:
+        """The current scene, None once the story is over."""
+        if self.scene_index == END:
+            return None
+        return self.story.scenes[self.scene_index]
+
+    @property
+    def party_alive(self) -> bool:
+        """Whether at least one player is still standing."""
+        return self.players.any_alive
+
+    @property
+    def actor(self) -> Optional[int]:
+        """Index of the player expected to send the next Action, if any."""
+        if self.phase in (PHASE_VOTE, PHASE_AGREE):
+            return next(i for i in range(len(self.players)) if i not in self.ballots)
+        if self.phase == PHASE_OVER:
+            return None
+        return self.current_player_index
+
+
+def new_game(story: CompiledStory, player_names: List[str],
+             seed: Optional[int] = None) -> Tuple[GameState, List[Event]]:
+    """
+    Start a new session at the 'start' scene.
+
+    Args:
+        story: Compiled story to play
+        player_names: Names of the party members in turn order
+        seed: Seed for the session's random stream, random if not given
+
+    Returns:
+        Tuple[GameState, List[Event]]: The new state and the events of entering the first scene
+    """
+    roster = Roster(player_names, len(story.items))
+    roster.inventory.stock(story.items)
+    state = GameState(story, roster, seed)
+    events = []
+    _enter_scene(state, story.index.get("start", END), events)
+    return state, events
+
+
+def advance(state: GameState, action: Action) -> Tuple[GameState, List[Event]]:
+    """
+    Advance a session by one Action.
+
+    Actions that do not fit the current phase, or carry an out-of-range value,
+    leave the state untouched and produce a single 'invalid' event.
+
+    Args:
+        state: Session to advance
+        action: Input from the acting player
+
+    Returns:
+        Tuple[GameState, List[Event]]: The updated state and what happened
+    """
+    events = []
+    handler = _PHASE_HANDLERS.get(state.phase)
+    if handler is None or action.kind != state.phase:
+        events.append(Event('invalid', {'phase': state.phase, 'action': action}))
+    else:
+        handler(state, action.value, events)
+    return state, events
+
+
+def default_ballots(state: GameState) -> List[Action]:
+    """
+    Ballots for every player who has not voted when a vote times out.
+
+    Silence counts as the voting block's default: an answer for agreement
+    votes, an option or an abstention for group votes. Feeding the ballots
+    to advance() settles the vote.
+
+    Args:
+        state: Session in the vote or agree phase
+
+    Returns:
+        List[Action]: One [player, vote] ballot per missing player, empty in other phases
+    """
+    if state.phase not in (PHASE_VOTE, PHASE_AGREE):
+        return []
+    vote = state.pending.default
+    return [Action(state.phase, (i, vote)) for i in range(len(state.players)) if i not in state.ballots]
+
+
+def _enter_scene(state: GameState, scene_index: int, events: List[Event]):
+    """Move the session to a scene and work out which phase it opens with."""
+    state.scene_index = scene_index
+    if scene_index == END or not state.party_alive:
+        _finish(state, events)
+        return
+
+    scene = state.story.scenes[scene_index]
+    state.scenes_visited.add(scene_index)
+    events.append(Event('scene', {'scene': scene.id, 'index': scene_index}))
+
+    # A scene whose choices are all locked away ends the story like one without choices
+    available = available_choices(state)
+    if not available:
+        state.scene_index = END
+        _finish(state, events)
+        return
+
+    # A scene led by a group decision is decided by the whole party at once
+    first = scene.choices[available[0]]
+    if first.kind == CHOICE_VOTE:
+        _pick(state, first, state.current_player_index, events)
+        _start_vote(state, available[0], first.voting, events)
+    elif first.kind == CHOICE_AGREE:
+        _pick(state, first, state.current_player_index, events)
+        _start_agree(state, first.requires_vote, events)
+    else:
+        state.phase = PHASE_CHOOSE
+
+
+def available_choices(state: GameState, scene_index: Optional[int] = None) -> List[int]:
+    """
+    Choices of a scene the current player is offered.
+
+    A choice is offered unless its requirement fails for the session's
+    flags and the current player. Requirements are compiled predicates, so
+    front ends can call this on every redraw.
+
+    Args:
+        state: Session to look at
+        scene_index: Scene to look at, defaults to the current scene
+
+    Returns:
+        List[int]: Indices of the offered choices, empty for the end of the story
+    """
+    if scene_index is None:
+        scene_index = state.scene_index
+    if scene_index == END:
+        return []
+    flags, roster, player = state.flags, state.players, state.current_player_index
+    return [i for i, choice in enumerate(state.story.scenes[scene_index].choices)
+            if choice.requires is None or choice.requires(flags, roster, player)]
+
+
+def _set_flags(state: GameState, sets: int, clears: int):
+    state.flags = (state.flags | sets) & ~clears
+
+
+def _pick(state: GameState, choice: Choice, chooser: int, events: List[Event]):
+    """Do what picking a choice does right away: set its flags, then use, take and give its items."""
+    _set_flags(state, choice.sets, choice.clears)
+    if choice.uses is not None:
+        _use_item(state, chooser, choice.uses, events)
+    inventory = state.players.inventory
+    name = state.players.names[chooser]
+    for item, count in choice.takes:
+        taken = inventory.remove(chooser, item, count)
+        if taken:
+            events.append(Event('item_lost', {'player': name, 'item': state.story.items[item].name, 'count': taken}))
+    for item, count in choice.gives:
+        given = inventory.add(chooser, item, count)
+        if given:
+            events.append(Event('item_gained', {'player': name, 'item': state.story.items[item].name, 'count': given}))
+
+
+def usable_items(state: GameState, player: Optional[int] = None) -> List[int]:
+    """
+    Items a player carries that can be used.
+
+    Args:
+        state: Session to look at
+        player: Index of the player, defaults to the current player
+
+    Returns:
+        List[int]: Catalog indices in catalog order
+    """
+    if player is None:
+        player = state.current_player_index
+    catalog = state.story.items
+    return [item for item, _ in state.players.inventory.held(player) if catalog[item].usable]
+
+
+def _use_item(state: GameState, player: int, item: int, events: List[Event]):
+    """Use up one of a player's items, if it is consumable, and apply its effect."""
+    entry = state.story.items[item]
+    if entry.consumable:
+        state.players.inventory.remove(player, item)
+    events.append(Event('item_used', {'player': state.players.names[player], 'item': entry.name,
+                                      'party': entry.party}))
+    if entry.party:
+        events.extend(state.players.apply_effect(entry.effect))
+    else:
+        events.extend(state.players[player].apply_effect(entry.effect))
+
+
+def _finish(state: GameState, events: List[Event]):
+    state.phase = PHASE_OVER
+    state.pending = None
+    state.combat = None
+    events.append(Event('game_over', {'victory': state.party_alive}))
+
+
+def _end_turn(state: GameState, events: List[Event]):
+    """Tick and expire the status effects due this turn."""
+    events.extend(Event(kind, data) for kind, data in state.players.statuses.end_turn(state.players))
+
+
+def _complete_choice(state: GameState, choice: Choice, chooser: int, next_scene: int, events: List[Event],
+                     end_turn: bool = True):
+    """Apply a choice's effect to whoever picked it, pass the turn and move on."""
+    if choice.effect:
+        events.extend(state.players[chooser].apply_effect(choice.effect))
+    if end_turn:
+        _end_turn(state, events)
+    state.current_player_index = (state.current_player_index + 1) % len(state.players)
+    _enter_scene(state, next_scene, events)
+
+
+def _handle_choose(state: GameState, choice_index: Any, events: List[Event]):
+    choices = state.scene.choices
+    if not isinstance(choice_index, int) or not (0 <= choice_index < len(choices)):
+        events.append(Event('invalid', {'phase': PHASE_CHOOSE, 'value': choice_index}))
+        return
+
+    choice = choices[choice_index]
+    chooser = state.current_player_index
+    if choice.requires is not None and not choice.requires(state.flags, state.players, chooser):
+        events.append(Event('invalid', {'phase': PHASE_CHOOSE, 'value': choice_index}))
+        return
+    events.append(Event('choice', {'player': chooser, 'choice': choice_index}))
+    _pick(state, choice, chooser, events)
+
+    if choice.kind == CHOICE_COMBAT:
+        _start_combat(state, choice, chooser, events)
+    elif choice.kind == CHOICE_VOTE:
+        _start_vote(state, choice_index, choice.voting, events)
+    elif choice.kind == CHOICE_AGREE:
+        _start_agree(state, choice.requires_vote, events)
+    else:
+        _complete_choice(state, choice, chooser, choice.next_scene, events)
+
+
+def _start_vote(state: GameState, choice_index: int, voting: VotingSystem, events: List[Event]):
+    if not voting.options:
+        _enter_scene(state, END, events)
+        return
+    state.phase = PHASE_VOTE
+    state.pending = voting
+    state.ballots = {}
+    events.append(Event('vote_started', {
+        'choice': choice_index,
+        'options': voting.options,
+        'timeout': voting.timeout,
+    }))
+
+
+def _cast(state: GameState, ballot: Any, valid, events: List[Event]) -> bool:
+    """
+    Record one ballot, keyed by player.
+
+    A ballot is either a bare vote for the first player who has not voted
+    yet or a [player, vote] pair. Invalid ballots and second ballots from
+    the same player produce an 'invalid' event and are not counted.
+    """
+    if isinstance(ballot, (list, tuple)) and len(ballot) == 2:
+        player, vote = ballot
+    else:
+        player, vote = state.actor, ballot
+    if (not isinstance(player, int) or not (0 <= player < len(state.players))
+            or player in state.ballots or not (vote is None or valid(vote))):
+        events.append(Event('invalid', {'phase': state.phase, 'value': ballot}))
+        return False
+    state.ballots[player] = vote
+    events.append(Event('ballot', {'player': player, 'vote': vote, 'cast': len(state.ballots)}))
+    return True
+
+
+def _handle_vote(state: GameState, ballot: Any, events: List[Event]):
+    options = state.pending.options
+    if not _cast(state, ballot, lambda vote: isinstance(vote, int) and 0 <= vote < len(options), events):
+        return
+
+    # Count in the order ballots arrived, which is also the order the
+    # non-random tie breaker prefers
+    vote_counts = {}
+    for vote in state.ballots.values():
+        if vote is not None:
+            vote_counts[vote] = vote_counts.get(vote, 0) + 1
+    outstanding = len(state.players) - len(state.ballots)
+
+    ranked = sorted(vote_counts.values(), reverse=True)
+    leader = ranked[0] if ranked else 0
+    runner_up = ranked[1] if len(ranked) > 1 else 0
+    if outstanding and leader <= runner_up + outstanding:
+        return
+
+    # Settled: either a strict lead nobody can catch, or every ballot is in
+    winners = [idx for idx, count in vote_counts.items() if count == leader]
+    if not winners:
+        # Everyone abstained, so every option is tied
+        winners = list(range(len(options)))
+
+    if len(winners) == 1:
+        winning_option_index = winners[0]
+    elif state.pending.tie_breaker == "random":
+        winning_option_index = state.rng.choice(winners)
+    else:
+        winning_option_index = winners[0]
+
+    winning_option = options[winning_option_index]
+    state.pending = None
+    state.ballots = {}
+    events.append(Event('vote_result', {
+        'option': winning_option_index,
+        'counts': vote_counts,
+        'uncast': outstanding,
+    }))
+
+    if winning_option.effect:
+        events.extend(state.players.apply_effect(winning_option.effect))
+    _set_flags(state, winning_option.sets, winning_option.clears)
+
+    _enter_scene(state, winning_option.scene, events)
+
+
+def _min_players(state: GameState, requires_vote: RequiresVote) -> int:
+    if requires_vote.min_players is None:
+        return len(state.players)
+    return requires_vote.min_players
+
+
+def _start_agree(state: GameState, requires_vote: RequiresVote, events: List[Event]):
+    state.phase = PHASE_AGREE
+    state.pending = requires_vote
+    state.ballots = {}
+    events.append(Event('agree_started', {
+        'min_players': _min_players(state, requires_vote),
+        'timeout': requires_vote.timeout,
+    }))
+
+
+def _handle_agree(state: GameState, ballot: Any, events: List[Event]):
+    if not _cast(state, ballot, lambda vote: isinstance(vote, bool), events):
+        return
+
+    requires_vote = state.pending
+    needed = _min_players(state, requires_vote)
+    agreed = sum(1 for vote in state.ballots.values() if vote)
+    outstanding = len(state.players) - len(state.ballots)
+    if agreed >= needed:
+        success = True
+    elif agreed + outstanding < needed:
+        success = False
+    else:
+        return
+
+    state.pending = None
+    state.ballots = {}
+    events.append(Event('agree_result', {'success': success, 'agreed': agreed, 'uncast': outstanding}))
+
+    if success:
+        _enter_scene(state, requires_vote.success_scene, events)
+    else:
+        _enter_scene(state, requires_vote.failure_scene, events)
+
+
+def _start_combat(state: GameState, choice: Choice, chooser: int, events: List[Event]):
+    combat = CombatState(choice.combat, choice, chooser, state.players)
+    state.phase = PHASE_COMBAT
+    state.combat = combat
+    events.append(Event('combat_started', {
+        'enemy': combat.name,
+        'color': combat.color,
+        'health': sum(enemy.health for enemy in combat.enemies),
+        'enemies': len(combat.enemies),
+    }))
+    if not combat.remaining:
+        # Every enemy starts out of the fight, so there is nobody to beat
+        _end_turn(state, events)
+        _end_combat(state, True, events)
+        return
+    _next_combatant(state, events)
+
+
+def _next_combatant(state: GameState, events: List[Event]):
+    """
+    Play enemy turns off the initiative queue until a living player is up.
+
+    Ends the fight if the whole party falls first.
+    """
+    combat = state.combat
+    players = state.players
+    size = len(players)
+    queue = combat.queue
+    while players.any_alive and queue:
+        time, rank, unit = heapq.heappop(queue)
+        if unit < size:
+            if players.alive[unit]:
+                players.statuses.remove(players, unit, 'defending')
+                combat.time = time
+                state.current_player_index = unit
+                return
+            continue  # Fallen players drop out of the queue
+        enemy = combat.enemies[unit - size]
+        if enemy.health <= 0:
+            continue
+        # An enemy with its own turn picks any standing player
+        _enemy_attack(state, enemy, players.next_alive(state.rng.randrange(size)), events)
+        heapq.heappush(queue, (time + _interval(enemy.speed), rank, unit))
+    _end_combat(state, False, events)
+
+
+def _enemy_attack(state: GameState, enemy: EnemyState, target: int, events: List[Event]):
+    player = state.players[target]
+    enemy_roll = state.rng.randint(1, 20)
+    if enemy_roll >= 10:
+        damage = max(0, enemy.attack + state.rng.randint(1, 6) - player.defense)
+        player.take_damage(damage)
+        events.append(Event('enemy_attack', {'player': player.name, 'enemy': enemy.name, 'hit': True, 'damage': damage}))
+        if not player.is_alive:
+            events.append(Event('fallen', {'player': player.name}))
+    else:
+        events.append(Event('enemy_attack', {'player': player.name, 'enemy': enemy.name, 'hit': False, 'damage': 0}))
+
+
+def _end_combat(state: GameState, victory: bool, events: List[Event]):
+    """End the fight and follow its outcome; the last combat action has already ended its turn."""
+    combat = state.combat
+    state.combat = None
+    choice = combat.choice
+    players = state.players
+    for player in range(len(players)):
+        if players.status_effects[player]:
+            players.statuses.remove(players, player, 'defending')
+    events.append(Event('combat_ended', {'enemy': combat.name, 'victory': victory}))
+    next_scene = choice.success if victory else choice.failure
+    _complete_choice(state, choice, combat.chooser, next_scene, events, end_turn=False)
+
+
+def resolve_combat(state: GameState, victory: bool) -> List[Event]:
+    """
+    Decide the ongoing fight without rolling any dice.
+
+    A victory counts as the current player landing the last blow; a defeat
+    means the whole party has fallen. Analysis tools use this to follow
+    both outcomes of a fight instead of sampling them.
+
+    Args:
+        state: Session in the combat phase
+        victory: Whether the party wins the fight
+
+    Returns:
+        List[Event]: What happened after the fight
+
+    Raises:
+        ValueError: If the session is not in a fight
+    """
+    if state.phase != PHASE_COMBAT:
+        raise ValueError(f"No fight to resolve in the {state.phase} phase")
+    if not victory:
+        state.players.wipe()
+    events = []
+    _end_combat(state, victory, events)
+    return events
+
+
+def _handle_combat(state: GameState, action: Any, events: List[Event]):
+    combat = state.combat
+    hero = state.current_player_index
+    front = combat.first_alive()
+    if front < 0:
+        # Fights with nobody standing end as they start; never strike enemies[-1]
+        _end_turn(state, events)
+        _end_combat(state, True, events)
+        return
+    # An action is 'attack' or, to pick the enemy, ['attack', enemy index];
+    # items are used with ['item', catalog index]
+    target = None
+    if isinstance(action, (list, tuple)) and len(action) == 2:
+        action, target = action
+    if action == ITEM_ACTION:
+        inventory = state.players.inventory
+        if not (isinstance(target, int) and 0 <= target < inventory.size
+                and inventory.count(hero, target) and state.story.items[target].usable):
+            events.append(Event('invalid', {'phase': PHASE_COMBAT, 'value': [action, target]}))
+            return
+    elif action not in COMBAT_ACTIONS:
+        events.append(Event('invalid', {'phase': PHASE_COMBAT, 'value': action}))
+        return
+    elif target is None:
+        target = front
+    elif not (isinstance(target, int) and 0 <= target < len(combat.enemies)
+              and combat.enemies[target].health > 0):
+        events.append(Event('invalid', {'phase': PHASE_COMBAT, 'value': [action, target]}))
+        return
+
+    player = state.players[hero]
+    enemy = combat.enemies[front if action == ITEM_ACTION else target]
+
+    if action == ITEM_ACTION:
+        _use_item(state, hero, target, events)
+    elif action == 'attack':
+        roll = player.roll_dice(20, state.rng)
+        if roll >= 10:
+            damage = max(0, player.attack + player.roll_dice(6, state.rng) - enemy.defense)
+            enemy.health = max(0, enemy.health - damage)
+            events.append(Event('player_attack', {'player': player.name, 'enemy': enemy.name, 'hit': True, 'damage': damage}))
+        else:
+            events.append(Event('player_attack', {'player': player.name, 'enemy': enemy.name, 'hit': False, 'damage': 0}))
+    elif action == 'defend':
+        # Raises defense until the player's next turn or the end of the fight; it
+        # never runs out on its own, however many turns the enemies take first
+        state.players.statuses.add(state.players, (hero,), 'defending', 5, None)
+        events.append(Event('defend', {'player': player.name, 'amount': 5}))
+    elif action == 'heal':
+        player.heal(15)
+        events.append(Event('heal', {'player': player.name, 'amount': 15}))
+    elif action == 'special':
+        damage = max(0, player.attack + 10 - enemy.defense)
+        enemy.health = max(0, enemy.health - damage)
+        events.append(Event('special', {'player': player.name, 'enemy': enemy.name, 'damage': damage}))
+
+    if enemy.health <= 0:
+        combat.remaining -= 1
+        events.append(Event('enemy_defeated', {'enemy': enemy.name, 'color': enemy.color}))
+        if not combat.remaining:
+            _end_turn(state, events)
+            _end_combat(state, True, events)
+            return
+
+    # Enemies without a speed of their own strike back at the current player
+    for enemy in combat.retaliators:
+        if not player.is_alive:
+            break
+        if enemy.health > 0:
+            _enemy_attack(state, enemy, hero, events)
+
+    _end_turn(state, events)
+    if player.is_alive:
+        heapq.heappush(combat.queue, (combat.time + HERO_INTERVAL, (hero - combat.chooser) % len(state.players), hero))
+    _next_combatant(state, events)
+
+
+_PHASE_HANDLERS = {
+    PHASE_CHOOSE: _handle_choose,
+    PHASE_VOTE: _handle_vote,
+    PHASE_AGREE: _handle_agree,
+    PHASE_COMBAT: _handle_combat,
+}
@@ -0,0 +1,431 @@
+"""
+Json2RPGDesu - Story Explorer
+
+This module walks every path through a story with the headless engine, so
+writers can see which endings are reachable, and with what party, without
+playing each branch by hand. Every choice is taken, every vote is won by
+each of its options in turn, agreement votes both pass and fail, and fights
+are both won (by each player who could land the last blow) and lost.
+
+Many paths lead to the same situation: the same scene, the same player to
+act, the same party stats and items and the same story flags. A transposition table keyed on that situation
+expands each one only once, which keeps the search tractable. The search
+runs breadth first, so the first path found to an ending is a shortest one,
+and large frontiers are expanded across a process pool.
+
+Fights are explored by outcome rather than by dice: a won fight leaves the
+party unhurt, since the enemy can always miss, so HP reported at an ending
+is the best case. solver.py gives the odds of each fight. A vote or fight
+whose outcome leads straight back into itself, with nothing changed, is
+reported as a stalemate.
+
+Usage:
+    python explorer.py                     # story.json with 4 players
+    python explorer.py --players 2 --workers 1
+    python explorer.py --links             # also list every link to a missing scene
+
+Classes:
+    Ending: How often and with which parties an ending was reached
+    Exploration: Result of exploring a story
+
+Dependencies:
+    - engine: Headless game rules
+    - story: Story loading
+    - concurrent.futures: For the process pool
+    - argparse: For command line options
+    - os: For the default story path and CPU count
+    - time: For timing the search
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from engine import (
+    Action, Event, GameState, Roster, advance, available_choices, new_game, resolve_combat,
+    PHASE_AGREE, PHASE_CHOOSE, PHASE_COMBAT, PHASE_OVER, PHASE_VOTE,
+)
+from story import CompiledStory, END_SCENE_ID, load_story_file
+
+# Pseudo-endings for games that stop without reaching a final scene
+DEFEAT = 'defeat'
+STALEMATE = 'stalemate'
+
+# Frontiers smaller than this are expanded in-process
+POOL_THRESHOLD = 64
+
+# (health, max_health, attack, defense, is_alive, statuses, items) of each player,
+# statuses being (kind, amount, turns left) of each active status effect and
+# items (catalog index, count) of each item carried
+PartyKey = Tuple[Tuple[int, int, int, int, bool, Tuple[Tuple[str, int, int], ...], Tuple[Tuple[int, int], ...]],
+                 ...]
+# (scene index, current player index, party, story flags) of a session waiting for a choice
+StateKey = Tuple[int, int, PartyKey, int]
+
+
+class Ending(NamedTuple):
+    """
+    How often and with which parties an ending was reached.
+
+    Attributes:
+        scene (str): Final scene ID, 'end', 'defeat' or 'stalemate'
+        path (Tuple[str]): A shortest sequence of decisions leading here
+        arrivals (int): Distinct (situation, decision) pairs leading here
+        parties (FrozenSet[PartyKey]): Every party seen arriving
+    """
+    scene: str
+    path: Tuple[str, ...]
+    arrivals: int
+    parties: frozenset
+
+
+class Exploration(NamedTuple):
+    """
+    Result of exploring a story.
+
+    Attributes:
+        states (int): Distinct situations expanded
+        transpositions (int): Paths that led to an already known situation
+        reached (FrozenSet[str]): Scene IDs entered on some path
+        unreachable (Tuple[str]): Scenes defined in the story that no path enters
+        dead_ends (Tuple[str]): Reached scenes the story links to but never defines
+        stuck (Tuple[str]): Reached scenes from which no ending can be reached
+        endings (Dict[str, Ending]): Endings by scene
+    """
+    states: int
+    transpositions: int
+    reached: frozenset
+    unreachable: Tuple[str, ...]
+    dead_ends: Tuple[str, ...]
+    stuck: Tuple[str, ...]
+    endings: Dict[str, Ending]
+
+
+def state_key(state: GameState) -> StateKey:
+    """
+    The situation a session waiting for a choice is in.
+
+    Two sessions with the same key play out identically from here on, so
+    the explorer only expands one of them.
+
+    Args:
+        state: Session in the choose phase
+
+    Returns:
+        StateKey: Scene, player to act, party stats, status effects and items, and story flags
+    """
+    roster = state.players
+    statuses = roster.statuses.snapshot(roster)
+    party = tuple((p.health, p.max_health, p.attack, p.defense, p.is_alive,
+                   tuple(tuple(status) for status in player_statuses),
+                   tuple(roster.inventory.held(i)))
+                  for i, (p, player_statuses) in enumerate(zip(roster, statuses)))
+    return state.scene_index, state.current_player_index, party, state.flags
+
+
+def _restore(story: CompiledStory, key: StateKey) -> GameState:
+    """Rebuild a session from its key."""
+    scene_index, current, party, flags = key
+    roster = Roster([f"Player {number}" for number in range(1, len(party) + 1)], len(story.items))
+    for i, (health, max_health, attack, defense, alive, *_) in enumerate(party):
+        roster.health[i] = health
+        roster.max_health[i] = max_health
+        roster.attack[i] = attack
+        roster.defense[i] = defense
+        roster.alive[i] = alive
+    roster.statuses.restore(roster, [player[5] for player in party])
+    roster.inventory.restore([player[6] for player in party])
+    state = GameState(story, roster, 0)
+    state.scene_index = scene_index
+    state.current_player_index = current
+    state.flags = flags
+    state.phase = PHASE_CHOOSE
+    return state
+
+
+def _clone(state: GameState) -> GameState:
+    """Copy a session in the middle of a vote or fight."""
+    clone = GameState(state.story, state.players.copy(), 0)
+    clone.scene_index = state.scene_index
+    clone.current_player_index = state.current_player_index
+    clone.phase = state.phase
+    clone.pending = state.pending
+    clone.ballots = dict(state.ballots)
+    clone.combat = state.combat
+    clone.flags = state.flags
+    return clone
+
+
+def _outcomes(state: GameState, events: List[Event], steps: Tuple[str, ...],
+              seen: FrozenSet[Tuple[str, StateKey]] = frozenset()
+              ) -> Iterator[Tuple[Tuple[str, ...], GameState, List[Event]]]:
+    """
+    Every way the votes and fights the session is waiting on can turn out.
+
+    seen holds the votes and fights already decided on the way here. An
+    outcome that leads straight back into one of them is yielded as is,
+    still waiting, and counts as a stalemate.
+    """
+    if state.phase in (PHASE_VOTE, PHASE_AGREE, PHASE_COMBAT):
+        key = (state.phase, state_key(state))
+        if key in seen:
+            yield steps + (f"back to {state.scene.id}",), state, events
+            return
+        seen = seen | {key}
+    if state.phase == PHASE_VOTE:
+        for option in range(len(state.pending.options)):
+            branch = _clone(state)
+            # A unanimous vote, so no tie breaker is ever rolled
+            branch_events = list(events)
+            for player in range(len(branch.players)):
+                branch, cast = advance(branch, Action(PHASE_VOTE, (player, option)))
+                branch_events.extend(cast)
+                if cast[-1].kind != 'ballot':
+                    break  # Settled before the last ballot
+            yield from _outcomes(branch, branch_events, steps + (f"vote {option + 1}",), seen)
+    elif state.phase == PHASE_AGREE:
+        for agree, step in ((True, "all agree"), (False, "all refuse")):
+            branch = _clone(state)
+            branch_events = list(events)
+            for player in range(len(branch.players)):
+                branch, cast = advance(branch, Action(PHASE_AGREE, (player, agree)))
+                branch_events.extend(cast)
+                if cast[-1].kind != 'ballot':
+                    break
+            yield from _outcomes(branch, branch_events, steps + (step,), seen)
+    elif state.phase == PHASE_COMBAT:
+        combat = state.combat
+        fighters = [i for i, p in enumerate(state.players) if p.is_alive]
+        enemies = [enemy for enemy in combat.enemies if enemy.health > 0]
+        # Only fighters who can hurt an enemy can land a blow, a fight is
+        # only won if every enemy can be hurt, and only a party that can be
+        # hurt to the last player can be wiped
+        strikers = [i for i in fighters if any(state.players[i].attack + 10 > enemy.defense for enemy in enemies)]
+        winnable = all(any(state.players[i].attack + 10 > enemy.defense for i in fighters) for enemy in enemies)
+        breakable = all(any(enemy.attack + 6 > 2 * state.players[i].defense for enemy in enemies)
+                        for i in fighters)
+        for striker in strikers if winnable else ():
+            branch = _clone(state)
+            branch.current_player_index = striker
+            branch_events = events + resolve_combat(branch, True)
+            yield from _outcomes(branch, branch_events,
+                                 steps + (f"Player {striker + 1} defeats {combat.name}",), seen)
+        if breakable:
+            branch = _clone(state)
+            branch_events = events + resolve_combat(branch, False)
+            yield from _outcomes(branch, branch_events, steps + (f"{combat.name} wipes the party",), seen)
+        if not (strikers and winnable) and not breakable:
+            yield steps + (f"{combat.name} never falls",), state, events
+    else:
+        yield steps, state, events
+
+
+def _ending(state: GameState, events: List[Event]) -> str:
+    """Which ending a finished session reached."""
+    if not state.party_alive:
+        return DEFEAT
+    if len(events) >= 2 and events[-2].kind == 'scene':
+        scene = state.story.scenes[events[-2].data['index']]
+        if not scene.choices:
+            return scene.id
+    return END_SCENE_ID
+
+
+# Story loaded once per worker process
+_story: Optional[CompiledStory] = None
+
+
+def _load_worker(path: str):
+    global _story
+    _story = load_story_file(path)
+
+
+def _expand(keys: List[StateKey]) -> List[Tuple[StateKey, str, Optional[StateKey], Optional[str],
+                                                 PartyKey, Tuple[str, ...]]]:
+    """
+    Take every decision from a batch of situations.
+
+    Returns:
+        List of (parent, decisions, child, ending, party, scenes entered), where
+        exactly one of child and ending is set
+    """
+    story = _story
+    results = []
+    for key in keys:
+        scene = story.scenes[key[0]]
+        for choice_index in available_choices(_restore(story, key)):
+            state, events = advance(_restore(story, key), Action(PHASE_CHOOSE, choice_index))
+            _settle(key, state, events, (f"{scene.id}: choice {choice_index + 1}",), results)
+    return results
+
+
+def _settle(parent: Optional[StateKey], state: GameState, events: List[Event],
+            steps: Tuple[str, ...], results: List):
+    """Add every outcome of a decision to results, in the format of _expand."""
+    for steps, outcome, outcome_events in _outcomes(state, events, steps):
+        entered = tuple(e.data['scene'] for e in outcome_events if e.kind == 'scene')
+        label = ' -> '.join(steps)
+        party = state_key(outcome)[2]
+        if outcome.phase == PHASE_CHOOSE:
+            results.append((parent, label, state_key(outcome), None, party, entered))
+        elif outcome.phase == PHASE_OVER:
+            results.append((parent, label, None, _ending(outcome, outcome_events), party, entered))
+        else:
+            results.append((parent, label, None, STALEMATE, party, entered))
+
+
+def explore(story_path: str, players: int = 4, workers: Optional[int] = None) -> Exploration:
+    """
+    Explore every path through a story.
+
+    Args:
+        story_path: Story file to explore
+        players: Party size
+        workers: Processes to expand large frontiers with, CPU count if None,
+            1 to stay in this process
+
+    Returns:
+        Exploration: Reachable scenes, endings and shortest paths
+    """
+    global _story
+    _story = story = load_story_file(story_path)
+    state, events = new_game(story, [f"Player {number}" for number in range(1, players + 1)], 0)
+    results: List = []
+    _settle(None, state, events, (), results)
+
+    # Transposition table: situation -> (parent situation, decisions leading here)
+    table: Dict[StateKey, Tuple[Optional[StateKey], str]] = {}
+    children: Dict[Optional[StateKey], List[StateKey]] = {}
+    finishes: Set[Optional[StateKey]] = set()
+    reached: Set[str] = set()
+    arrivals: Dict[str, List] = {}
+    transpositions = 0
+
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(workers, initializer=_load_worker, initargs=(story_path,)) if workers > 1 else None
+    try:
+        while results:
+            frontier = []
+            for parent, label, child, ending, party, entered in results:
+                reached.update(entered)
+                if ending is not None:
+                    finishes.add(parent)
+                    record = arrivals.get(ending)
+                    if record is None:
+                        arrivals[ending] = [parent, label, 0, set()]
+                        record = arrivals[ending]
+                    record[2] += 1
+                    record[3].add(party)
+                    continue
+                children.setdefault(parent, []).append(child)
+                if child in table:
+                    transpositions += 1
+                    continue
+                table[child] = (parent, label)
+                frontier.append(child)
+
+            if pool is not None and len(frontier) >= POOL_THRESHOLD:
+                size = -(-len(frontier) // (workers * 4))
+                batches = [frontier[i:i + size] for i in range(0, len(frontier), size)]
+                results = [r for batch in pool.map(_expand, batches) for r in batch]
+            else:
+                results = _expand(frontier)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    def path_to(key: StateKey, last: str) -> Tuple[str, ...]:
+        steps = [last]
+        while key is not None:
+            key, label = table[key]
+            if label:
+                steps.append(label)
+        return tuple(reversed(steps))
+
+    endings = {
+        scene: Ending(scene, path_to(parent, label), count, frozenset(parties))
+        for scene, (parent, label, count, parties) in arrivals.items()
+    }
+
+    # Situations that can still reach an ending, found backwards from the finishes
+    parents: Dict[StateKey, List[StateKey]] = {}
+    for parent, kids in children.items():
+        for child in kids:
+            parents.setdefault(child, []).append(parent)
+    can_finish = set(finishes)
+    pending = list(finishes)
+    while pending:
+        for parent in parents.get(pending.pop(), ()):
+            if parent not in can_finish:
+                can_finish.add(parent)
+                pending.append(parent)
+    stuck = sorted({story.scene_id(key[0]) for key in table} -
+                   {story.scene_id(key[0]) for key in can_finish if key is not None})
+
+    defined = [scene.id for scene in story.scenes[:story.scene_count]]
+    missing = {target for _, target in story.dangling}
+    return Exploration(
+        states=len(table),
+        transpositions=transpositions,
+        reached=frozenset(reached),
+        unreachable=tuple(scene_id for scene_id in defined if scene_id not in reached),
+        dead_ends=tuple(sorted(reached & missing)),
+        stuck=tuple(stuck),
+        endings=endings,
+    )
+
+
+def _party_range(parties: frozenset) -> str:
+    """Spread of the living players' stats over every party seen."""
+    stats = [p for party in parties for p in party if p[4]]
+    if not stats:
+        return "nobody standing"
+
+    def spread(field: int) -> str:
+        low, high = min(p[field] for p in stats), max(p[field] for p in stats)
+        return f"{low}" if low == high else f"{low}-{high}"
+
+    return f"HP {spread(0)}, ATK {spread(2)}, DEF {spread(3)}"
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explore every path through a Json2RPGDesu story.")
+    parser.add_argument('--story', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'story.json'),
+                        help="story file to explore")
+    parser.add_argument('--players', type=int, default=4, help="party size (default: 4)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count, 1 for none)")
+    parser.add_argument('--paths', action='store_true', help="print a shortest path to every ending")
+    parser.add_argument('--links', action='store_true', help="list every link to a missing scene")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = explore(args.story, args.players, args.workers)
+    elapsed = time.perf_counter() - started
+
+    print(f"Explored {result.states} situations ({result.transpositions} transpositions) in {elapsed:.2f}s\n")
+    print(f"Reachable scenes: {len(result.reached)}")
+    if result.unreachable:
+        print(f"Unreachable scenes: {', '.join(result.unreachable)}")
+    if result.dead_ends:
+        print(f"Dead ends (linked but not written): {', '.join(result.dead_ends)}")
+    if result.stuck:
+        print(f"Scenes with no way to an ending: {', '.join(result.stuck)}")
+    if args.links:
+        dangling = load_story_file(args.story).dangling
+        print(f"Links to missing scenes: {len(dangling)}")
+        for source, target in dangling:
+            print(f"    {source} -> {target}")
+
+    print(f"\n{'Ending':<30} {'Steps':>5} {'Arrivals':>8}  Party")
+    for ending in sorted(result.endings.values(), key=lambda e: (len(e.path), e.scene)):
+        print(f"{ending.scene:<30} {len(ending.path):>5} {ending.arrivals:>8}  {_party_range(ending.parties)}")
+        if args.paths:
+            for step in ending.path:
+                print(f"    {step}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Json2RPGDesu - Item Catalog and Inventories
+
+This module compiles the "items" section of a story into an item catalog
+and keeps track of what every player carries. Items are numbered once,
+when the story is loaded, and every reference to an item in the story's
+choices and requirements is resolved to that number at the same time, so
+play never looks items up by ID.
+
+An inventory stores the count of every catalog item for every player in
+one flat array of small unsigned integers, a row per player, alongside a
+column of party-wide totals kept in step with it. Checking what a player
+carries, or whether anyone in the party carries something, is a single
+array read however many items the catalog holds, and a player's items can
+be listed without walking the whole catalog.
+
+Item syntax in story.json:
+    "items": {
+        "potion": {
+            "name": "Healing Potion",
+            "description": "Tastes like strawberries.",
+            "effect": {"heal": 30},     effect of using the item
+            "party": false,             true to apply the effect to the whole party
+            "consumable": true,         false for items that are never used up
+            "start": 1                  how many every player starts with
+        }
+    }
+
+Key Features:
+- Item IDs numbered at load time, references resolved to catalog indices
+- Item effects compiled to opcodes like choice effects
+- Per-player counts in one compact array, with party-wide totals
+- Constant-time count and party queries at any catalog size
+
+Classes:
+    Item: One catalog entry
+    ItemCatalog: Every item of a story, by catalog index
+    Inventory: Item counts of a whole party
+
+Functions:
+    compile_items: Turn the "items" section of a story into a catalog
+    compile_item_counts: Turn a "gives" or "takes" value into (item, count) pairs
+
+Dependencies:
+    - effects: For compiling item effects to opcodes
+    - array: For the inventory's count arrays
+    - typing: For type hints
+"""
+
+from array import array
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from effects import EffectOp, compile_effect
+
+# Most of one item a player can carry, the range of the count array
+STACK_LIMIT = 0xFFFF
+
+
+class Item(NamedTuple):
+    """
+    One catalog entry.
+
+    effect is compiled, empty for items that cannot be used, such as keys.
+    party is True when using the item affects the whole party rather than
+    the player using it. start is the count every player begins with.
+    """
+    id: str
+    name: str
+    description: str
+    effect: Tuple[EffectOp, ...]
+    party: bool = False
+    consumable: bool = True
+    start: int = 0
+
+    @property
+    def usable(self) -> bool:
+        """Whether the item does anything when used."""
+        return bool(self.effect)
+
+
+class ItemCatalog:
+    """
+    Every item of a story, by catalog index.
+
+    Attributes:
+        items (Tuple[Item]): Items in the order the story lists them
+        index (Dict[str, int]): Item ID to catalog index
+        starting (Tuple[Tuple[int, int]]): (catalog index, count) of every
+            item players start with
+    """
+
+    __slots__ = ('items', 'index', 'starting')
+
+    def __init__(self, items: Sequence[Item] = ()):
+        """
+        Initialize a catalog.
+
+        Args:
+            items: Items in catalog order
+        """
+        self.items = tuple(items)
+        self.index = {item.id: i for i, item in enumerate(self.items)}
+        self.starting = tuple((i, item.start) for i, item in enumerate(self.items) if item.start > 0)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, item: int) -> Item:
+        return self.items[item]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def resolve(self, item_id: Any) -> int:
+        """
+        Catalog index of an item referenced by the story.
+
+        Args:
+            item_id: Item ID from story.json
+
+        Returns:
+            int: Catalog index
+
+        Raises:
+            ValueError: If the catalog has no such item
+        """
+        item = self.index.get(item_id) if isinstance(item_id, str) else None
+        if item is None:
+            raise ValueError(f"Unknown item {item_id!r}")
+        return item
+
+
+def compile_items(raw: Optional[Dict]) -> ItemCatalog:
+    """
+    Turn the "items" section of a story into a catalog.
+
+    Args:
+        raw: Item ID to item fields, None for a story without items
+
+    Returns:
+        ItemCatalog: The catalog
+
+    Raises:
+        ValueError: If the section or one of its items is malformed
+    """
+    if raw is None:
+        return ItemCatalog()
+    if not isinstance(raw, dict):
+        raise ValueError("'items' takes an object of items keyed by item ID")
+    items = []
+    for item_id, fields in raw.items():
+        if not isinstance(fields, dict):
+            raise ValueError(f"Item {item_id!r} is not a JSON object")
+        start = fields.get("start", 0)
+        if not (isinstance(start, int) and not isinstance(start, bool) and 0 <= start <= STACK_LIMIT):
+            raise ValueError(f"Item {item_id!r}: 'start' takes a count from 0 to {STACK_LIMIT}, not {start!r}")
+        items.append(Item(
+            item_id,
+            fields.get("name", item_id),
+            fields.get("description", ""),
+            compile_effect(fields.get("effect")),
+            bool(fields.get("party", False)),
+            bool(fields.get("consumable", True)),
+            start,
+        ))
+    return ItemCatalog(items)
+
+
+def compile_item_counts(raw: Any, catalog: ItemCatalog) -> Tuple[Tuple[int, int], ...]:
+    """
+    Turn a "gives" or "takes" value into (catalog index, count) pairs.
+
+    The value is an item ID, a list of item IDs (one of each, repeats
+    adding up) or an object of item IDs and counts.
+
+    Args:
+        raw: Items from story.json, None for none
+        catalog: The story's items
+
+    Returns:
+        Tuple[Tuple[int, int], ...]: Counts by catalog index, in catalog order
+
+    Raises:
+        ValueError: If the value is malformed or names an unknown item
+    """
+    if raw is None:
+        return ()
+    if isinstance(raw, str):
+        raw = [raw]
+    counts: Dict[int, int] = {}
+    if isinstance(raw, list):
+        for item_id in raw:
+            item = catalog.resolve(item_id)
+            counts[item] = counts.get(item, 0) + 1
+    elif isinstance(raw, dict):
+        for item_id, count in raw.items():
+            if not (isinstance(count, int) and not isinstance(count, bool) and count > 0):
+                raise ValueError(f"Item {item_id!r} needs a positive count, not {count!r}")
+            item = catalog.resolve(item_id)
+            counts[item] = counts.get(item, 0) + count
+    else:
+        raise ValueError(f"Expected an item ID, a list of them or an object of counts, not {raw!r}")
+    return tuple(sorted(counts.items()))
+
+
+class Inventory:
+    """
+    Item counts of a whole party.
+
+    counts holds one row of catalog size per player, so the count of item
+    i for player p is counts[p * size + i]. totals holds the party-wide
+    count of each item and every change goes through add() and remove(),
+    which keep both in step, so party queries never sum over players.
+
+    Attributes:
+        size (int): Number of items in the catalog
+        counts (array): Per-player counts, row by row
+        totals (array): Party-wide count of each item
+    """
+
+    __slots__ = ('size', 'counts', 'totals', '_held')
+
+    def __init__(self, players: int, size: int):
+        """
+        Initialize an empty inventory.
+
+        Args:
+            players: Number of players in the party
+            size: Number of items in the catalog
+        """
+        self.size = size
+        self.counts = array('H', [0]) * (players * size)
+        self.totals = array('L', [0]) * size
+        # Catalog indices each player holds at least one of, for listing
+        self._held = [set() for _ in range(players)]
+
+    def count(self, player: int, item: int) -> int:
+        """
+        How many of an item a player carries.
+
+        Args:
+            player: Index of the player
+            item: Catalog index of the item
+
+        Returns:
+            int: The count
+        """
+        return self.counts[player * self.size + item]
+
+    def total(self, item: int) -> int:
+        """
+        How many of an item the whole party carries.
+
+        Args:
+            item: Catalog index of the item
+
+        Returns:
+            int: The count
+        """
+        return self.totals[item]
+
+    def add(self, player: int, item: int, count: int = 1) -> int:
+        """
+        Give a player some of an item, up to STACK_LIMIT.
+
+        Args:
+            player: Index of the player
+            item: Catalog index of the item
+            count: How many to give
+
+        Returns:
+            int: How many the player actually received
+        """
+        slot = player * self.size + item
+        added = min(count, STACK_LIMIT - self.counts[slot])
+        if added > 0:
+            self.counts[slot] += added
+            self.totals[item] += added
+            self._held[player].add(item)
+        return max(0, added)
+
+    def remove(self, player: int, item: int, count: int = 1) -> int:
+        """
+        Take some of an item from a player, as many as they carry at most.
+
+        Args:
+            player: Index of the player
+            item: Catalog index of the item
+            count: How many to take
+
+        Returns:
+            int: How many were actually taken
+        """
+        slot = player * self.size + item
+        removed = min(count, self.counts[slot])
+        if removed > 0:
+            self.counts[slot] -= removed
+            self.totals[item] -= removed
+            if not self.counts[slot]:
+                self._held[player].discard(item)
+        return max(0, removed)
+
+    def stock(self, catalog: ItemCatalog):
+        """
+        Give every player the items the catalog says they start with.
+
+        Args:
+            catalog: The story's items
+        """
+        for player in range(len(self._held)):
+            for item, count in catalog.starting:
+                self.add(player, item, count)
+
+    def held(self, player: int) -> List[Tuple[int, int]]:
+        """
+        Items a player carries.
+
+        Args:
+            player: Index of the player
+
+        Returns:
+            List[Tuple[int, int]]: (catalog index, count) pairs in catalog order
+        """
+        row = player * self.size
+        return [(item, self.counts[row + item]) for item in sorted(self._held[player])]
+
+    def snapshot(self) -> List[List[List[int]]]:
+        """
+        Items of every player, for saves and state keys.
+
+        Returns:
+            List[List[List[int]]]: [catalog index, count] pairs per player
+        """
+        return [[list(pair) for pair in self.held(player)] for player in range(len(self._held))]
+
+    def restore(self, items: Sequence[Sequence[Sequence[int]]]):
+        """
+        Add the items of a snapshot() to an empty inventory.
+
+        Args:
+            items: [catalog index, count] pairs per player
+        """
+        for player, pairs in enumerate(items):
+            for item, count in pairs:
+                self.add(player, item, count)
+
+    def copy(self) -> 'Inventory':
+        """
+        Independent copy of the inventory.
+
+        Returns:
+            Inventory: The copy
+        """
+        inventory = Inventory.__new__(Inventory)
+        inventory.size = self.size
+        inventory.counts = array('H', self.counts)
+        inventory.totals = array('L', self.totals)
+        inventory._held = [set(held) for held in self._held]
+        return inventory
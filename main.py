@@ -1,7 +1,27 @@
+import time
+
+started = time.perf_counter()
+
+import argparse
+import sys
+
+from clock import Clock
 from test import Game
-import json
-import os
 
 if __name__ == "__main__":
-    game = Game()
+    imported = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Play Json2RPGDesu in the terminal.")
+    parser.add_argument('--speed', type=Clock.parse,
+                        help="'real', a speed-up such as '4x', or 'instant' "
+                             "(default: real on a terminal, instant otherwise)")
+    parser.add_argument('--players', type=int, default=4, help="heroes in a new game (default: 4)")
+    parser.add_argument('--startup-time', action='store_true', help="report import and init time on stderr")
+    args = parser.parse_args()
+    if args.players < 1:
+        parser.error("--players must be at least 1")
+    game = Game(args.speed, args.players)
+    if args.startup_time:
+        ready = time.perf_counter()
+        sys.stderr.write(f"startup: imports {(imported - started) * 1000:.1f}ms, "
+                         f"init {(ready - imported) * 1000:.1f}ms\n")
     game.run()
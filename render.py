@@ -0,0 +1,275 @@
+"""
+Json2RPGDesu - Frame-Buffered Terminal Renderer
+
+This module owns all terminal output of the kawaii CLI. Full screens (scenes,
+combat rounds, menus) are built as a list of lines and presented as one frame:
+the whole frame is assembled in a single buffer and written with one write
+call, using ANSI clear/home sequences instead of spawning a `clear` process.
+
+When the previous frame is still intact on screen, a new frame is diffed
+against it line by line and only the lines that changed are rewritten, so
+unchanged party-status boxes are not emitted again every combat round.
+Messages and prompts printed below a frame go through the same Screen, which
+keeps track of how far the cursor moved so it knows when diffing is safe.
+
+Text is measured in terminal cells rather than characters or bytes, so
+Arabic, emoji and kaomoji wrap where the terminal actually breaks them.
+
+Functions:
+    display_width: Number of terminal cells a string occupies
+    wrap_text: Word-wrap text to a width in terminal cells
+
+Classes:
+    Screen: Frame buffer bound to an output stream
+
+Dependencies:
+    - os: For writing frames straight to the terminal
+    - re: For stripping color codes when measuring text
+    - select: For timed prompts on POSIX terminals
+    - shutil: For terminal size detection
+    - sys: For the default output stream
+    - unicodedata: For terminal cell widths
+"""
+
+import os
+import re
+import shutil
+import sys
+import unicodedata
+from typing import Callable, List, Optional, Sequence, TextIO, Tuple
+
+CLEAR = '\x1b[H\x1b[2J\x1b[3J'
+RESET = '\x1b[0m'
+CLEAR_LINE = '\x1b[K'
+CLEAR_BELOW = '\x1b[J'
+
+_ANSI = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+# Emoji presentation selector: widens the preceding narrow symbol to two cells
+_EMOJI_PRESENTATION = '\ufe0f'
+
+
+def display_width(text: str) -> int:
+    """
+    Number of terminal cells a string occupies.
+
+    Color codes take no space, combining marks and format characters (such
+    as joiners) are zero width, wide (East Asian wide/fullwidth) characters
+    take two cells, and a narrow symbol followed by the emoji presentation
+    selector is drawn as a two-cell emoji.
+
+    Args:
+        text: Text to measure, may contain ANSI color codes
+
+    Returns:
+        int: Width in terminal cells
+    """
+    if '\x1b' in text:
+        text = _ANSI.sub('', text)
+    if text.isascii():
+        return len(text)
+    width = 0
+    previous = 0
+    for char in text:
+        if char == _EMOJI_PRESENTATION:
+            if previous == 1:
+                width += 1
+                previous = 2
+            continue
+        if unicodedata.category(char) in ('Mn', 'Me', 'Cf'):
+            continue
+        previous = 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+        width += previous
+    return width
+
+
+def wrap_text(text: str, width: int) -> Tuple[str, ...]:
+    """
+    Word-wrap text to a width in terminal cells, keeping its line breaks.
+
+    Blank paragraphs become empty lines. Words wider than the width are
+    kept whole on a line of their own.
+
+    Args:
+        text: Text to wrap, without color codes
+        width: Maximum line width in terminal cells
+
+    Returns:
+        Tuple[str]: The wrapped lines
+    """
+    lines = []
+    for paragraph in text.split('\n'):
+        words = paragraph.split()
+        if not words:
+            lines.append('')
+            continue
+
+        current_line = []
+        current_width = 0
+        for word in words:
+            word_width = display_width(word)
+            if current_line and current_width + 1 + word_width > width:
+                lines.append(' '.join(current_line))
+                current_line = []
+                current_width = 0
+            current_width += word_width + (1 if current_line else 0)
+            current_line.append(word)
+        lines.append(' '.join(current_line))
+    return tuple(lines)
+
+
+class Screen:
+    """
+    Frame buffer bound to an output stream.
+
+    Attributes:
+        stream (TextIO): Where output is written
+        frame (List[str]): Lines of the frame currently at the top of the screen
+        interactive (bool): Whether output goes to a terminal
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, setup: Optional[Callable[[], None]] = None):
+        """
+        Initialize a screen.
+
+        Args:
+            stream: Output stream, defaults to sys.stdout at write time
+            setup: Called once right before the first output, to defer
+                terminal initialization until something is shown
+        """
+        self._stream = stream
+        self._setup = setup
+        self.frame: List[str] = []
+        # Rows printed below the frame since it was presented, None when unknown
+        self._rows_below: Optional[int] = None
+
+    @property
+    def stream(self) -> TextIO:
+        return self._stream or sys.stdout
+
+    @property
+    def interactive(self) -> bool:
+        """Whether output goes to a terminal, where animations are worth playing."""
+        try:
+            return self.stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    def present(self, lines: Sequence[str]):
+        """
+        Show a full-screen frame.
+
+        Every line is drawn on its own with colors reset at both ends, so a
+        line must set any color it needs itself.
+
+        Args:
+            lines: Lines of the frame, top to bottom
+        """
+        lines = list(lines)
+        columns, rows = shutil.get_terminal_size()
+        fits = len(lines) < rows and all(display_width(line) < columns for line in lines)
+
+        if fits and self._rows_below is not None and len(self.frame) + self._rows_below < rows:
+            # The previous frame has not scrolled, so only rewrite what changed
+            out = []
+            previous = self.frame
+            for row, line in enumerate(lines):
+                if row >= len(previous) or previous[row] != line:
+                    out.append(f'\x1b[{row + 1};1H{RESET}{line}{RESET}{CLEAR_LINE}')
+            out.append(f'\x1b[{len(lines) + 1};1H{CLEAR_BELOW}')
+        else:
+            out = [CLEAR]
+            for line in lines:
+                out.append(f'{line}{RESET}\n')
+
+        self._emit(''.join(out))
+        self.frame = lines
+        self._rows_below = 0 if fits else None
+
+    def clear(self):
+        """Clear the terminal and forget the current frame."""
+        self._emit(CLEAR)
+        self.frame = []
+        self._rows_below = 0
+
+    def write(self, text: str = '', end: str = '\n'):
+        """
+        Print a message below the current frame.
+
+        Args:
+            text: Text to print
+            end: String appended after the text, like print()
+        """
+        text = f'{text}{end}'
+        self._emit(text)
+        self._advance(text)
+
+    def input(self, prompt: str = '', timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Prompt for a line of input below the current frame.
+
+        A timeout is only enforced when typing at a POSIX terminal; piped
+        input is read ahead in bulk, so waiting on the file descriptor
+        could miss lines that are already buffered, and Windows consoles
+        cannot be waited on with select().
+
+        Args:
+            prompt: Prompt shown before the cursor
+            timeout: Seconds to wait for the line, None to wait for ever
+
+        Returns:
+            str: The line entered, without the trailing newline, or None if
+            the timeout ran out first
+
+        Raises:
+            EOFError: If input ends before a line is entered
+        """
+        self._emit(prompt)
+        if timeout is not None and os.name != 'nt' and sys.stdin.isatty():
+            import select
+            ready, _, _ = select.select([sys.stdin], [], [], max(0.0, timeout))
+            if not ready:
+                self._emit('\n')
+                self._advance(f'{prompt}\n')
+                return None
+            answer = sys.stdin.readline()
+            if not answer:
+                raise EOFError
+            answer = answer.rstrip('\n')
+        else:
+            answer = input()
+        self._advance(f'{prompt}{answer}\n')
+        return answer
+
+    def _advance(self, text: str):
+        """Account for rows the cursor moved while printing text."""
+        if self._rows_below is None:
+            return
+        if '\r' in text or not text.endswith('\n'):
+            # Cursor left mid-line or rewound; stop trusting the frame position
+            self._rows_below = None
+            return
+        columns = shutil.get_terminal_size().columns
+        for line in text[:-1].split('\n'):
+            self._rows_below += max(1, -(-display_width(line) // columns))
+
+    def _emit(self, text: str):
+        """Write text to the stream with as few system calls as possible."""
+        if self._setup is not None:
+            setup, self._setup = self._setup, None
+            setup()
+        stream = self.stream
+        stream.flush()
+        try:
+            fd = stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            fd = None
+        if fd is None or os.name == 'nt':
+            # Let colorama translate ANSI sequences on Windows consoles
+            stream.write(text)
+            stream.flush()
+            return
+        data = text.encode(getattr(stream, 'encoding', None) or 'utf-8', errors='replace')
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
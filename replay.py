@@ -0,0 +1,135 @@
+"""
+Json2RPGDesu - Recorded Game Replay
+
+This module re-executes recorded games through the headless engine with no
+rendering and no pauses. A recording is a save file whose journal was never
+compacted: a snapshot of the starting state, including the session's random
+stream, followed by every Action the players sent. Because every dice roll
+comes from that stream, replaying a recording reproduces the original game
+exactly.
+
+The CLI writes the recording of the game being played to last_game.jsonl,
+so a bug report only needs that file attached. Replaying many recordings
+after a balance change shows which games now end differently, or diverge
+(an Action that is no longer valid at that point of the story).
+
+Usage:
+    python replay.py last_game.jsonl
+    python replay.py recordings/*.jsonl --story story.json
+    python replay.py last_game.jsonl --events
+
+Classes:
+    ReplayResult: Outcome of replaying one recording
+
+Dependencies:
+    - engine: Headless game rules
+    - savegame: Recording file format (SaveFile)
+    - story: Story loading
+    - argparse: For command line options
+    - os: For the default story path
+    - time: For measuring replay speed
+"""
+
+import argparse
+import os
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from engine import Event, advance, PHASE_OVER
+from savegame import SaveFile
+from story import CompiledStory, load_story_file
+
+OUTCOME_VICTORY = 'victory'
+OUTCOME_DEFEAT = 'defeat'
+OUTCOME_UNFINISHED = 'unfinished'
+OUTCOME_DIVERGED = 'diverged'
+
+
+class ReplayResult(NamedTuple):
+    """
+    Outcome of replaying one recording.
+
+    Attributes:
+        path (str): Recording file
+        outcome (str): victory, defeat, unfinished or diverged
+        actions (int): Actions replayed
+        scene (str): ID of the scene the replay stopped in
+        error (str): Why the replay diverged or failed, empty otherwise
+    """
+    path: str
+    outcome: str
+    actions: int
+    scene: str
+    error: str = ''
+
+
+def replay(story: CompiledStory, path: str,
+           on_events: Optional[Callable[[List[Event]], None]] = None) -> ReplayResult:
+    """
+    Re-execute a recorded game.
+
+    Args:
+        story: Compiled story to replay against
+        path: Recording file
+        on_events: Called with the events of every replayed Action
+
+    Returns:
+        ReplayResult: How the game ended
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a valid recording for this story
+    """
+    state, journal = SaveFile(path).read(story)
+    for count, action in enumerate(journal):
+        state, events = advance(state, action)
+        if events and events[0].kind == 'invalid':
+            return ReplayResult(path, OUTCOME_DIVERGED, count, state.current_scene,
+                                f"{action} rejected in the {state.phase} phase")
+        if on_events is not None:
+            on_events(events)
+
+    if state.phase != PHASE_OVER:
+        outcome = OUTCOME_UNFINISHED
+    elif state.party_alive:
+        outcome = OUTCOME_VICTORY
+    else:
+        outcome = OUTCOME_DEFEAT
+    return ReplayResult(path, outcome, len(journal), state.current_scene)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Json2RPGDesu games without rendering.")
+    parser.add_argument('recordings', nargs='+', help="recording files to replay")
+    parser.add_argument('--story', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'story.json'),
+                        help="story file to replay against")
+    parser.add_argument('--events', action='store_true', help="print every event (for a single bug report)")
+    args = parser.parse_args()
+
+    story = load_story_file(args.story)
+    on_events = None
+    if args.events:
+        def on_events(events):
+            for event in events:
+                print(f"  {event.kind}: {event.data}")
+
+    totals = {}
+    actions = 0
+    started = time.perf_counter()
+    for path in args.recordings:
+        try:
+            result = replay(story, path, on_events)
+        except (OSError, ValueError) as e:
+            result = ReplayResult(path, OUTCOME_DIVERGED, 0, '', str(e))
+        totals[result.outcome] = totals.get(result.outcome, 0) + 1
+        actions += result.actions
+        detail = f" ({result.error})" if result.error else ''
+        print(f"{result.path}: {result.outcome} at '{result.scene}' after {result.actions} actions{detail}")
+    elapsed = time.perf_counter() - started
+
+    summary = ', '.join(f"{count} {outcome}" for outcome, count in sorted(totals.items()))
+    print(f"\nReplayed {len(args.recordings)} games ({actions} actions) in {elapsed:.3f}s: {summary}")
+
+
+if __name__ == "__main__":
+    main()
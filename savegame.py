@@ -0,0 +1,283 @@
+"""
+Json2RPGDesu - Save Files
+
+This module persists game sessions as a compact snapshot followed by an
+append-only journal of the Actions played since that snapshot. Saving after
+a choice appends a few short lines instead of rewriting the whole file, and
+resuming restores the snapshot and replays the journal through the engine.
+
+The snapshot holds everything the rules depend on: the party's stats,
+status effects and items, the current scene and player, the visited scenes, the
+story flags set so far and the state of the session's random stream, so replaying the journal rolls the
+same dice as the original game did. Once the journal grows past a limit,
+the next save rewrites the file as a fresh snapshot, so resuming stays fast
+no matter how long a session runs.
+
+File format (one JSON document per line):
+    {"version": 2, "phase": "choose", "scene": "start", ...}   snapshot
+    ["choose", 0]                                            journal entries
+    ["combat", "attack"]
+
+Key Features:
+- Compact snapshot of players, items, scene, turn, visited scenes, flags and RNG state
+- Unbounded journals double as replayable recordings of a whole game
+- Append-only journal of Actions since the snapshot
+- Atomic snapshot rewrites; a torn final journal line is dropped on load
+
+Classes:
+    SaveFile: A save slot on disk
+
+Dependencies:
+    - engine: Game state, Actions and the step function
+    - story: Compiled story for resolving scene IDs
+    - json: For the file format
+    - os: For atomic file replacement
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from engine import Action, Event, GameState, Roster, advance, PHASE_CHOOSE, PHASE_OVER
+from story import CompiledStory
+
+SAVE_VERSION = 2
+
+# Journal entries allowed before the next save rewrites the snapshot
+JOURNAL_LIMIT = 256
+
+
+def snapshot(state: GameState) -> Dict:
+    """
+    Capture a session between decisions as a JSON-ready dict.
+
+    Args:
+        state: Session in the choose or over phase
+
+    Returns:
+        Dict: Snapshot including the state of the session's random stream
+
+    Raises:
+        ValueError: If the session is in the middle of a vote or fight
+    """
+    if state.phase not in (PHASE_CHOOSE, PHASE_OVER):
+        raise ValueError(f"Cannot snapshot a session in the {state.phase} phase")
+    version, internal, gauss_next = state.rng.getstate()
+    roster = state.players
+    statuses = roster.statuses.snapshot(roster)
+    items = state.story.items
+    inventory = roster.inventory
+    return {
+        "version": SAVE_VERSION,
+        "seed": state.seed,
+        "phase": state.phase,
+        "scene": state.current_scene,
+        "player": state.current_player_index,
+        "visited": sorted(state.story.scene_id(i) for i in state.scenes_visited),
+        "flags": state.story.flags.flag_names(state.flags),
+        # Status effects as [kind, amount, turns left]; stats include their bonuses.
+        # Items are keyed by ID, so saves survive items being added to the story
+        "players": [
+            [p.name, p.health, p.max_health, p.attack, p.defense, player_statuses,
+             {items[item].id: count for item, count in inventory.held(i)}]
+            for i, (p, player_statuses) in enumerate(zip(roster, statuses))
+        ],
+        "rng": [version, list(internal), gauss_next],
+    }
+
+
+def restore(story: CompiledStory, data: Dict) -> GameState:
+    """
+    Rebuild a session from a snapshot, random stream included.
+
+    Args:
+        story: Compiled story the session was played with
+        data: Snapshot from snapshot()
+
+    Returns:
+        GameState: The restored session
+
+    Raises:
+        ValueError: If the snapshot is from another version or story
+    """
+    if data.get("version") != SAVE_VERSION:
+        raise ValueError(f"Unsupported save version: {data.get('version')}")
+
+    rows = data["players"]
+    roster = Roster([row[0] for row in rows], len(story.items))
+    for i, (_, health, max_health, attack, defense) in enumerate(row[:5] for row in rows):
+        roster.health[i] = health
+        roster.max_health[i] = max_health
+        roster.attack[i] = attack
+        roster.defense[i] = defense
+        roster.alive[i] = health > 0
+    roster.statuses.restore(roster, [row[5] for row in rows])
+    # Saves from before items existed have none; items the story dropped are ignored
+    for i, row in enumerate(rows):
+        for item_id, count in (row[6] if len(row) > 6 else {}).items():
+            if item_id in story.items.index:
+                roster.inventory.add(i, story.items.index[item_id], count)
+
+    state = GameState(story, roster, data["seed"])
+    try:
+        state.scene_index = story.scene_index(data["scene"])
+        state.scenes_visited = {story.scene_index(scene_id) for scene_id in data["visited"]}
+    except KeyError as e:
+        raise ValueError(f"Save refers to scene {e} which is not in this story") from None
+    state.current_player_index = data["player"]
+    state.phase = data["phase"]
+    # Saves from before flags existed have none; flags the story dropped are ignored
+    state.flags = story.flags.mask(data.get("flags", []))
+
+    version, internal, gauss_next = data["rng"]
+    state.rng.setstate((version, tuple(internal), gauss_next))
+    return state
+
+
+class SaveFile:
+    """
+    A save slot on disk.
+
+    Attributes:
+        path (str): Location of the save file
+        journal_limit (int): Journal entries allowed before the snapshot is rewritten,
+            None to keep every entry
+        journal_length (int): Journal entries currently following the snapshot
+    """
+
+    def __init__(self, path: str, journal_limit: Optional[int] = JOURNAL_LIMIT):
+        """
+        Initialize a save slot.
+
+        Args:
+            path: Location of the save file
+            journal_limit: Journal entries allowed before the snapshot is rewritten,
+                None to keep every entry
+        """
+        self.path = path
+        self.journal_limit = journal_limit
+        self.journal_length = 0
+
+    def exists(self) -> bool:
+        """Whether there is a saved session to resume."""
+        return os.path.exists(self.path)
+
+    def write_snapshot(self, state: GameState):
+        """
+        Replace the save with a fresh snapshot and an empty journal.
+
+        Args:
+            state: Session in the choose or over phase
+        """
+        line = json.dumps(snapshot(state), separators=(',', ':'), ensure_ascii=False)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.journal_length = 0
+
+    def append(self, state: GameState, actions: Sequence[Action]):
+        """
+        Record the Actions that brought the session to its current state.
+
+        The Actions are appended to the journal, unless the journal is full
+        and the session sits between decisions, in which case the snapshot
+        is rewritten instead.
+
+        Args:
+            state: Session after the Actions were played
+            actions: Actions played since the last save
+        """
+        if not actions:
+            return
+        if (self.journal_limit is not None
+                and self.journal_length + len(actions) > self.journal_limit
+                and state.phase in (PHASE_CHOOSE, PHASE_OVER)):
+            self.write_snapshot(state)
+            return
+        lines = ''.join(json.dumps(list(action), separators=(',', ':')) + '\n' for action in actions)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+        self.journal_length += len(actions)
+
+    def read(self, story: CompiledStory) -> Tuple[GameState, List[Action]]:
+        """
+        Read the snapshot and journal without replaying anything.
+
+        The file is left as it is; a torn entry at the end of the journal is
+        skipped here and only cut from the file by load().
+
+        Args:
+            story: Compiled story the session was played with
+
+        Returns:
+            Tuple[GameState, List[Action]]: The session as of the snapshot and
+            the Actions played after it
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid save for this story
+        """
+        state, journal, _ = self._read(story)
+        return state, journal
+
+    def _read(self, story: CompiledStory) -> Tuple[GameState, List[Action], Optional[int]]:
+        """read(), plus the byte offset of a torn last journal entry, None if there is none."""
+        with open(self.path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        try:
+            state = restore(story, json.loads(lines[0]))
+        except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError) as e:
+            raise ValueError(f"Corrupt save snapshot: {e}") from None
+
+        journal: List[Action] = []
+        offset = len(lines[0]) + 1
+        for number, line in enumerate(lines[1:], 2):
+            if line:
+                try:
+                    kind, value = json.loads(line)
+                except (json.JSONDecodeError, TypeError, ValueError):
+                    if number == len(lines):
+                        return state, journal, offset
+                    raise ValueError(f"Corrupt save journal at line {number}") from None
+                journal.append(Action(kind, value))
+            offset += len(line) + 1
+        return state, journal, None
+
+    def load(self, story: CompiledStory) -> Tuple[GameState, List[Event]]:
+        """
+        Resume the saved session.
+
+        Args:
+            story: Compiled story the session was played with
+
+        Returns:
+            Tuple[GameState, List[Event]]: The session as of the last save and
+            the events of the last journal entry, so a front end can show
+            where the party left off
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid save for this story
+        """
+        state, journal, torn = self._read(story)
+        if torn is not None:
+            # Torn write at the end of the journal: cut the partial entry
+            # so the next append starts on a fresh line
+            os.truncate(self.path, torn)
+        events: List[Event] = []
+        for action in journal:
+            state, events = advance(state, action)
+            if events and events[0].kind == 'invalid':
+                raise ValueError(f"Save journal does not match this story: {action}")
+        self.journal_length = len(journal)
+        return state, events
+
+    def delete(self):
+        """Remove the save, if any."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,724 @@
+"""
+Json2RPGDesu - Multiplayer Game Server
+
+This module hosts Json2RPGDesu sessions over TCP with asyncio. Every player
+connects from their own client (telnet, netcat or any line-based client),
+picks a room code and a name, and plays in the same party as everyone else
+who joined that room. One process hosts as many rooms as needed; each room
+drives its own headless engine session, and all rooms share one compiled
+story.
+
+Sessions live in a SessionStore rather than in the rooms. When everyone
+leaves a room mid-adventure the room is closed but its session stays in the
+store, and whoever rejoins that room code with their name picks up where
+the party left off. The store holds a bounded number of sessions in memory
+and spills the least recently used ones to disk, so paused games do not
+add up in memory.
+
+Pauses between combat beats wait on each room's Clock without blocking,
+so a fight in one room never holds up any other room, and a server run
+with an instant clock plays batch sessions at CPU speed.
+
+Group votes are open to the whole party at once: every player who has not
+voted yet may send a ballot, the vote closes as soon as its result can no
+longer change, and a vote with a timeout is settled with default ballots
+for whoever has not answered when time runs out.
+
+Usage:
+    python server.py --port 8765 --players 4
+    python server.py --speed instant          # bots and tests
+    python server.py --vote-timeout 2         # close untimed votes after 2 minutes
+    python server.py --max-sessions 500       # keep at most 500 games in memory
+    python server.py --workers 4              # spread rooms over 4 processes (see shards.py)
+    nc 127.0.0.1 8765
+
+Classes:
+    Seat: One player's place in a room
+    Room: A hosted game session and the players in it
+    GameServer: Accepts connections and routes them to rooms
+
+Dependencies:
+    - clock: Pacing of combat beats
+    - effects: Effect messages
+    - status: Status effect messages
+    - engine: Headless game rules
+    - story: Compiled story and text templates
+    - sessions: Session store with spill to disk
+    - render: Text wrapping
+    - asyncio: For networking and non-blocking pauses
+    - time: For vote deadlines
+    - argparse: For command line options
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+from clock import Clock, REAL_TIME
+from effects import EFFECTS
+from engine import (
+    Action, Event, GameState, available_choices, default_ballots, usable_items,
+    ITEM_ACTION, PHASE_AGREE, PHASE_CHOOSE, PHASE_COMBAT, PHASE_OVER, PHASE_VOTE,
+)
+from render import wrap_text
+from sessions import DEFAULT_CAPACITY, SessionStore
+from status import STATUS_TYPES
+from story import CompiledStory, TextCache, open_story_file
+
+TEXT_WIDTH = 78
+HOTKEYS = {'a': 'attack', 'd': 'defend', 'h': 'heal', 's': 'special', 'i': ITEM_ACTION}
+
+GREETING = "(ﾉ◕ヮ◕)ﾉ*:･ﾟ✧ Welcome to Json2RPGDesu!\nRoom code: "
+ROOM_REFUSED = "(¬_¬) That room is full or the name is taken.\n"
+
+# Seconds to pause after combat beats so players can follow the fight
+COMBAT_PAUSE = 1.0
+
+# Seconds between checks whether a room should move to a less busy worker (shards.py)
+REBALANCE_INTERVAL = 30.0
+
+_VOTE_PHASES = (PHASE_VOTE, PHASE_AGREE)
+
+# Larger parties get a one-line summary instead of a line per player, and
+# ballots are not announced one by one
+PARTY_LIST_LIMIT = 8
+
+
+class Seat:
+    """
+    One player's place in a room.
+
+    Attributes:
+        name (str): Player name, also used to reconnect
+        writer (asyncio.StreamWriter): Connection to the player, None while disconnected
+    """
+
+    def __init__(self, name: str, writer: asyncio.StreamWriter):
+        self.name = name
+        self.writer: Optional[asyncio.StreamWriter] = writer
+
+    async def send(self, lines: List[str]):
+        """
+        Send lines of text to the player, if connected.
+
+        Args:
+            lines: Lines to send
+        """
+        if self.writer is None or self.writer.is_closing():
+            return
+        self.writer.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            self.writer = None
+
+
+class Room:
+    """
+    A hosted game session and the players in it.
+
+    Attributes:
+        code (str): Room code players join with
+        story (CompiledStory): Story shared by every room
+        party_size (int): Number of players needed to start
+        seats (List[Seat]): Players in turn order
+        sessions (SessionStore): Store holding the room's session, under the room code
+        started (bool): Whether the game has started
+        text_cache (TextCache): Rendered scene text for this room's roster
+        pause (float): Seconds to pause after combat beats
+        clock (Clock): Paces the pauses
+        vote_timeout (float): Minutes to wait for ballots when a vote sets no timeout,
+            None to wait for every player
+    """
+
+    def __init__(self, code: str, story: CompiledStory, party_size: int, pause: float = COMBAT_PAUSE,
+                 clock: Clock = REAL_TIME, vote_timeout: Optional[float] = None,
+                 sessions: Optional[SessionStore] = None):
+        self.code = code
+        self.story = story
+        self.party_size = party_size
+        self.seats: List[Seat] = []
+        self.sessions = SessionStore(story) if sessions is None else sessions
+        self.started = False
+        self._final: Optional[GameState] = None
+        self.text_cache = TextCache(story)
+        self.pause = pause
+        self.clock = clock
+        self.vote_timeout = vote_timeout
+        self.vote_options = ()
+        self._deadline: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def resume(cls, code: str, sessions: SessionStore, pause: float = COMBAT_PAUSE,
+               clock: Clock = REAL_TIME, vote_timeout: Optional[float] = None) -> 'Room':
+        """
+        Reopen a room around a session left in the store, with every seat empty.
+
+        Players rejoin their seats by name.
+
+        Args:
+            code: Room code, also the session's ID in the store
+            sessions: Store holding the session
+
+        Returns:
+            Room: The room, already started
+        """
+        names = sessions.get(code).players.names
+        room = cls(code, sessions.story, len(names), pause, clock, vote_timeout, sessions)
+        room.seats = [Seat(name, None) for name in names]
+        room.started = True
+        room.text_cache.set_roster(names)
+        return room
+
+    @property
+    def state(self) -> Optional[GameState]:
+        """The room's engine session, None until the game starts."""
+        if self._final is not None:
+            return self._final
+        return self.sessions.get(self.code) if self.started else None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the room's game has ended."""
+        return self.started and self.state.phase == PHASE_OVER
+
+    def detach(self):
+        """Keep a finished game in the room and drop it from the store, freeing the room code."""
+        self._final = self.state
+        self.sessions.discard(self.code)
+
+    @property
+    def connected(self) -> bool:
+        """Whether anyone is still connected to the room."""
+        return any(seat.writer is not None for seat in self.seats)
+
+    async def broadcast(self, lines: List[str]):
+        """Send lines to every connected player."""
+        await asyncio.gather(*(seat.send(lines) for seat in self.seats))
+
+    async def join(self, name: str, writer: asyncio.StreamWriter) -> Optional[Seat]:
+        """
+        Seat a player, or reconnect them to their seat.
+
+        Args:
+            name: Player name
+            writer: Connection to the player
+
+        Returns:
+            Seat: The player's seat, None if the room cannot take them
+        """
+        async with self._lock:
+            for seat in self.seats:
+                if seat.name == name:
+                    if seat.writer is not None:
+                        return None
+                    seat.writer = writer
+                    await self.broadcast([f"(ﾉ◕ヮ◕)ﾉ {name} is back!"])
+                    if self.started:
+                        if self._deadline is None and self.state.phase in _VOTE_PHASES:
+                            # A resumed room has no vote deadline running yet: keep the one
+                            # the vote was opened with, so reopening it adds no time
+                            self._arm(self.sessions.deadline(self.code))
+                        await self._prompt()
+                    return seat
+
+            if self.started or len(self.seats) >= self.party_size:
+                return None
+
+            seat = Seat(name, writer)
+            self.seats.append(seat)
+            await self.broadcast([f"Yay! {name} is ready for adventure! (★^O^★) "
+                                  f"[{len(self.seats)}/{self.party_size}]"])
+            if len(self.seats) == self.party_size:
+                await self._start()
+            else:
+                await seat.send(["(◕‿◕) Waiting for the party... type 'start' to begin early."])
+            return seat
+
+    async def leave(self, seat: Seat):
+        """Mark a player as disconnected; they can rejoin with the same name."""
+        async with self._lock:
+            seat.writer = None
+            await self.broadcast([f"(｡•́︿•̀｡) {seat.name} disconnected. Rejoin room {self.code} to continue."])
+
+    def close(self):
+        """Stop the room's vote deadline; its session stays in the store, deadline included."""
+        if self._deadline is not None:
+            self._deadline.cancel()
+            self._deadline = None
+
+    async def handle_line(self, seat: Seat, line: str):
+        """
+        Handle one line typed by a player.
+
+        Args:
+            seat: Seat of the player who typed it
+            line: The line, without its newline
+        """
+        async with self._lock:
+            line = line.strip().lower()
+            if not self.started:
+                if line == 'start' and self.seats:
+                    await self._start()
+                return
+            if self.state.phase == PHASE_OVER:
+                return
+
+            index = self.seats.index(seat)
+            voting = self.state.phase in _VOTE_PHASES
+            if voting and index in self.state.ballots:
+                await seat.send(["(・・;) You already voted. Waiting for the others..."])
+                return
+            if not voting and index != self.state.actor:
+                actor = self.seats[self.state.actor]
+                await seat.send([f"(・・;) Please wait for {actor.name}."])
+                return
+
+            action = self._parse(line)
+            if action is None:
+                await seat.send([self._hint()])
+                return
+            if voting:
+                action = Action(action.kind, (index, action.value))
+            phase = self.state.phase
+            events = self.sessions.advance(self.code, action)
+            if events and events[0].kind == 'invalid':
+                await seat.send(["(>_<) Invalid choice! Try again."])
+                return
+            if voting and len(self.seats) > PARTY_LIST_LIMIT:
+                await seat.send(["(•̀ᴗ•́) Vote recorded!"])
+            await self._settle(events, phase)
+
+    async def _start(self):
+        names = [seat.name for seat in self.seats]
+        self.text_cache.set_roster(names)
+        events = self.sessions.create(self.code, names)
+        self.started = True
+        await self._settle(events, PHASE_CHOOSE)
+
+    async def _settle(self, events: List[Event], phase: str):
+        """
+        Show what an Action did and prompt for the next one.
+
+        While a vote stays open only the ballot is announced, so players
+        who are still making up their minds are not prompted again.
+
+        Args:
+            events: Events of the Action
+            phase: Phase the session was in before the Action
+        """
+        await self._render(events)
+        if phase in _VOTE_PHASES and self.state.phase == phase and self.state.ballots:
+            return
+        self.close()
+        if self.state.phase in _VOTE_PHASES:
+            # A vote that just opened: its time starts now
+            self.sessions.set_deadline(self.code, None)
+            self._arm(None)
+        await self._prompt()
+
+    def _arm(self, deadline: Optional[float]):
+        """
+        Start the task closing the open vote at a wall-clock deadline.
+
+        The deadline is kept with the session, so a room reopened later, in
+        this process or another, closes the vote when it was due to close.
+
+        Args:
+            deadline: time.time() the vote closes at; None gives the vote its
+                whole timeout from now, if it has one
+        """
+        if deadline is None:
+            timeout = self._timeout()
+            if timeout is None:
+                return
+            deadline = time.time() + timeout * 60
+            self.sessions.set_deadline(self.code, deadline)
+        self._deadline = asyncio.create_task(self._expire(deadline))
+
+    def _timeout(self) -> Optional[float]:
+        """Minutes the open vote stays open, None if it waits for everyone."""
+        timeout = self.state.pending.timeout
+        return self.vote_timeout if timeout is None else timeout
+
+    async def _expire(self, deadline: float):
+        """Close the open vote with default ballots once its time is up."""
+        # Ballots wait in real time, whatever the clock does to the combat beats,
+        # and on the wall clock, which every worker and restart agrees on
+        await asyncio.sleep(max(0.0, deadline - time.time()))
+        async with self._lock:
+            self._deadline = None
+            phase = self.state.phase
+            if phase not in _VOTE_PHASES:
+                return
+            await self.broadcast(["(⌛ ˘ ᵕ ˘) Time's up! Missing ballots get the default."])
+            events = []
+            for action in default_ballots(self.state):
+                events.extend(self.sessions.advance(self.code, action))
+            await self._settle(events, phase)
+
+    def _parse(self, line: str) -> Optional[Action]:
+        """Turn a typed line into an Action for the current phase."""
+        phase = self.state.phase
+        if phase == PHASE_COMBAT:
+            # 'attack' strikes the first enemy standing, 'attack 2' the second enemy;
+            # 'item 2' uses the second item on the list
+            action, _, target = line.partition(' ')
+            action = HOTKEYS.get(action, action)
+            if action not in HOTKEYS.values():
+                return None
+            if action == ITEM_ACTION:
+                items = usable_items(self.state)
+                if not (target.isdigit() and 1 <= int(target) <= len(items)):
+                    return None
+                return Action(PHASE_COMBAT, [action, items[int(target) - 1]])
+            if not target:
+                return Action(PHASE_COMBAT, action)
+            return Action(PHASE_COMBAT, [action, int(target) - 1]) if target.isdigit() else None
+        if phase == PHASE_AGREE:
+            return Action(PHASE_AGREE, line == 'yes') if line in ('yes', 'no') else None
+        if not line.isdigit():
+            return None
+        if phase == PHASE_CHOOSE:
+            # Choices are numbered among the ones on offer
+            available = available_choices(self.state)
+            number = int(line)
+            return Action(phase, available[number - 1]) if 1 <= number <= len(available) else None
+        return Action(phase, int(line) - 1)
+
+    def _hint(self) -> str:
+        phase = self.state.phase
+        if phase == PHASE_COMBAT:
+            return ("(｡•́︿•̀｡) Use hotkeys (A/D/H/S) or type full command, optionally followed by an enemy number, "
+                    "or I and an item number.")
+        if phase == PHASE_AGREE:
+            return "(；￣Д￣) Please enter 'yes' or 'no'."
+        return "(>_<) Please enter a valid number!"
+
+    async def _prompt(self):
+        """Tell the acting player it is their turn and everyone else who they wait for."""
+        state = self.state
+        if state.phase == PHASE_OVER:
+            return
+        if state.phase in _VOTE_PHASES:
+            await self._prompt_voters()
+            return
+        actor = self.seats[state.actor]
+        if state.phase == PHASE_CHOOSE:
+            prompt = f"{actor.name}, make your choice (enter number):"
+        elif state.phase == PHASE_VOTE:
+            prompt = f"{actor.name}, please vote (enter number):"
+        elif state.phase == PHASE_AGREE:
+            prompt = f"{actor.name}, do you agree? (yes/no):"
+        else:
+            combat = state.combat
+            standing = [(i, enemy) for i, enemy in enumerate(combat.enemies) if enemy.health > 0]
+            if len(combat.enemies) == 1:
+                enemy = combat.enemies[0]
+                status = f"{enemy.name}: {enemy.health}/{enemy.max_health} HP. "
+            else:
+                status = ' '.join(f"{i + 1}. {enemy.name}: {enemy.health}/{enemy.max_health} HP."
+                                  for i, enemy in standing[:PARTY_LIST_LIMIT])
+                if len(standing) > PARTY_LIST_LIMIT:
+                    status += f" ...and {len(standing) - PARTY_LIST_LIMIT} more."
+                status += " Add a number to pick a target, e.g. 'a 2'. "
+            items = usable_items(state)
+            if items:
+                inventory = state.players.inventory
+                status += "Items: " + ' '.join(
+                    f"{i}. {self.story.items[item].name} x{inventory.count(state.actor, item)}."
+                    for i, item in enumerate(items[:PARTY_LIST_LIMIT], 1))
+                if len(items) > PARTY_LIST_LIMIT:
+                    status += f" ...and {len(items) - PARTY_LIST_LIMIT} more."
+                status += " "
+            actions = "(A)ttack (D)efend (H)eal (S)pecial" + (" (I)tem" if items else "")
+            prompt = f"{status}{actor.name}, what will you do? {actions}:"
+        await actor.send([prompt])
+        await asyncio.gather(*(seat.send([f"Waiting for {actor.name}..."])
+                               for seat in self.seats if seat is not actor))
+
+    async def _prompt_voters(self):
+        """Ask everyone who has not voted yet for their ballot, all at once."""
+        state = self.state
+        if state.phase == PHASE_VOTE:
+            question = "please vote (enter number):"
+        else:
+            question = "do you agree? (yes/no):"
+        await asyncio.gather(*(seat.send([f"{seat.name}, {question}"])
+                               for index, seat in enumerate(self.seats) if index not in state.ballots))
+
+    async def _render(self, events: List[Event]):
+        """Send events to every player, pausing after combat beats."""
+        for event in events:
+            lines = self._describe(event)
+            if lines:
+                await self.broadcast(lines)
+            if event.kind in ('player_attack', 'enemy_attack', 'defend', 'heal', 'special', 'item_used'):
+                await self.clock.wait(self.pause)
+
+    def _deadline_notice(self) -> List[str]:
+        timeout = self._timeout()
+        if timeout is None:
+            return []
+        return [f"(⌛) Voting closes in {timeout:g} minute{'' if timeout == 1 else 's'}."]
+
+    def _describe(self, event: Event) -> List[str]:
+        kind, data = event.kind, event.data
+        if kind == 'scene':
+            scene = self.story.scenes[data['index']]
+            rendered = self.text_cache.scene(data['index'], self.state.current_player_index)
+            lines = ["", f"{'=' * 15} {scene.title} {'=' * 15}", ""]
+            lines.extend(wrap_text(rendered.text, TEXT_WIDTH))
+            lines.append("")
+            lines.append("(✿ ♥‿♥) === Party Status === (♥‿♥ ✿)")
+            roster = self.state.players
+            if len(roster) > PARTY_LIST_LIMIT:
+                lines.append(f"  {len(roster)} heroes, {roster.alive.count(1)} standing: "
+                             f"{sum(roster.health)}/{sum(roster.max_health)} HP, "
+                             f"avg ATK {sum(roster.attack) / len(roster):.1f}, "
+                             f"avg DEF {sum(roster.defense) / len(roster):.1f}")
+            else:
+                for player in roster:
+                    lines.append(f"  {player.name}: {player.health}/{player.max_health} HP, "
+                                 f"ATK {player.attack}, DEF {player.defense}")
+            available = available_choices(self.state, data['index'])
+            if available:
+                lines.extend(["", "Available Choices:"])
+                lines.extend(f"{i}. {rendered.choices[choice]}" for i, choice in enumerate(available, 1))
+            return lines
+        if kind in ('effect', 'party_effect'):
+            return [EFFECTS[data['effect']].describe(data)]
+        if kind in ('status_tick', 'status_expired'):
+            return [STATUS_TYPES[data['status']].describe(data)]
+        if kind == 'vote_started':
+            rendered = self.text_cache.scene(self.state.scene_index, self.state.current_player_index)
+            self.vote_options = rendered.options[data['choice']]
+            lines = ["", "(„• ᴗ •„) A vote is required among players."]
+            lines.extend(f"{i}. {text}" for i, text in enumerate(self.vote_options, 1))
+            return lines + self._deadline_notice()
+        if kind == 'vote_result':
+            return [f"(✿◕‿◕) The group has decided to: {self.vote_options[data['option']]}"]
+        if kind == 'agree_started':
+            return ([f"(｡•̀ᴗ-)✧ A group decision is needed. At least {data['min_players']} players must agree."]
+                    + self._deadline_notice())
+        if kind == 'ballot' and len(self.seats) <= PARTY_LIST_LIMIT:
+            return [f"(•̀ᴗ•́) {self.seats[data['player']].name} has voted. "
+                    f"[{data['cast']}/{len(self.seats)}]"]
+        if kind == 'agree_result':
+            if data['success']:
+                return ["(｡•̀ᴗ-)✧ Decision successful! Moving on!"]
+            return ["(╯︵╰,) Not enough agreement. Alternate path chosen."]
+        if kind == 'combat_started':
+            if data['enemies'] > 1:
+                return ["", f"(ง •̀ω•́)ง⚔ Combat Started! {data['enemies']} enemies appear with {data['health']} HP "
+                            f"between them!"]
+            return ["", f"(ง •̀ω•́)ง⚔ Combat Started! {data['enemy']} appears with {data['health']} HP!"]
+        if kind == 'player_attack':
+            if data['hit']:
+                return [f"{data['player']} (ﾉ*ΦωΦ)ﾉ✧ {data['enemy']} - Nyah! {data['damage']} damage!"]
+            return [f"{data['player']} missed! UwU"]
+        if kind == 'enemy_attack':
+            if data['hit']:
+                return [f"{data['enemy']} hits {data['player']} for {data['damage']} damage! ~(>_<~)"]
+            return [f"{data['enemy']} missed! (✧ω✧)"]
+        if kind == 'defend':
+            return [f"{data['player']} is defending and gains +{data['amount']} defense until their next turn! (｀・ω・´)"]
+        if kind == 'heal':
+            return [EFFECTS['heal'].message.format(**data)]
+        if kind == 'special':
+            return [f"{data['player']} uses a special ability for {data['damage']} damage! ✨(=^･ω･^=)✨"]
+        if kind == 'item_used':
+            return [f"{data['player']} uses {data['item']}! (ﾉ◕ヮ◕)ﾉ*:･ﾟ✧"]
+        if kind in ('item_gained', 'item_lost'):
+            count = f" x{data['count']}" if data['count'] > 1 else ""
+            if kind == 'item_gained':
+                return [f"(☆▽☆) {data['player']} got {data['item']}{count}!"]
+            return [f"{data['player']} handed over {data['item']}{count}."]
+        if kind == 'fallen':
+            return [f"(╥﹏╥) {data['player']} has fallen!"]
+        if kind == 'enemy_defeated':
+            return [f"{data['enemy']} defeated! (❁´◡`❁)"]
+        if kind == 'game_over':
+            if data['victory']:
+                return ["", "(*^ω^*) Congratulations - You've completed the adventure!"]
+            return ["", "(╥﹏╥) Game Over - All players have fallen!"]
+        return []
+
+
+class GameServer:
+    """
+    Accepts connections and routes them to rooms.
+
+    Attributes:
+        story (CompiledStory): Story played in every room
+        party_size (int): Players per room
+        pause (float): Seconds to pause after combat beats
+        clock (Clock): Paces the pauses of every room
+        vote_timeout (float): Minutes to wait for ballots when a vote sets no timeout,
+            None to wait for every player
+        rooms (Dict[str, Room]): Open rooms by code
+        sessions (SessionStore): Sessions of every room, open or paused, by room code
+    """
+
+    def __init__(self, story: CompiledStory, party_size: int = 4, pause: float = COMBAT_PAUSE,
+                 clock: Clock = REAL_TIME, vote_timeout: Optional[float] = None,
+                 sessions: Optional[SessionStore] = None):
+        self.story = story
+        self.party_size = party_size
+        self.pause = pause
+        self.clock = clock
+        self.vote_timeout = vote_timeout
+        self.rooms: Dict[str, Room] = {}
+        self.sessions = SessionStore(story) if sessions is None else sessions
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one player connection from greeting to disconnect."""
+        room = seat = None
+        try:
+            writer.write(GREETING.encode('utf-8'))
+            code = (await reader.readline()).decode('utf-8', errors='replace').strip()
+            writer.write("Your name: ".encode('utf-8'))
+            name = (await reader.readline()).decode('utf-8', errors='replace').strip()
+            if not code or not name:
+                return
+
+            room = self.open_room(code)
+            seat = await room.join(name, writer)
+            if seat is None:
+                writer.write(ROOM_REFUSED.encode('utf-8'))
+                return
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await room.handle_line(seat, line.decode('utf-8', errors='replace'))
+        except ConnectionError:
+            pass
+        finally:
+            if seat is not None:
+                await self.leave_room(room, seat)
+            writer.close()
+
+    def open_room(self, code: str) -> Room:
+        """
+        The room players entering a code join: the open one, a paused game
+        reopened from the store, or a new room if the game there has ended.
+
+        Args:
+            code: Room code
+
+        Returns:
+            Room: The room
+        """
+        room = self.rooms.get(code)
+        if room is None and code in self.sessions:
+            # A game paused when everyone left: reopen it for its players
+            room = self.rooms[code] = Room.resume(code, self.sessions, self.pause, self.clock,
+                                                  self.vote_timeout)
+        if room is not None and room.finished:
+            room.detach()
+            room = None
+        if room is None:
+            room = self.rooms[code] = Room(code, self.story, self.party_size, self.pause, self.clock,
+                                           self.vote_timeout, self.sessions)
+        return room
+
+    async def leave_room(self, room: Room, seat: Seat):
+        """
+        Disconnect a player, closing the room once nobody is left in it.
+
+        The session of a closed room stays in the store unless its game has ended.
+
+        Args:
+            room: Room the player is in
+            seat: The player's seat
+        """
+        await room.leave(seat)
+        if not room.connected and self.rooms.get(room.code) is room:
+            del self.rooms[room.code]
+            room.close()
+            if room.finished:
+                self.sessions.discard(room.code)
+
+    async def serve(self, host: str, port: int):
+        """
+        Listen for players until cancelled.
+
+        Args:
+            host: Interface to bind
+            port: TCP port to bind
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # Games in memory are written out, so a restarted server can resume them
+            self.sessions.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Json2RPGDesu games over TCP.")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to bind (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument('--story', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'story.json'),
+                        help="story file to host")
+    parser.add_argument('--players', type=int, default=4, help="players per room (default: 4)")
+    parser.add_argument('--pause', type=float, default=COMBAT_PAUSE, help="seconds between combat beats")
+    parser.add_argument('--speed', type=Clock.parse, default=REAL_TIME,
+                        help="'real', a speed-up such as '4x', or 'instant'")
+    parser.add_argument('--vote-timeout', type=float, metavar='MINUTES',
+                        help="close votes that set no timeout of their own after this long "
+                             "(default: wait for every player)")
+    parser.add_argument('--session-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions'),
+                        help="where games that do not fit in memory are kept")
+    parser.add_argument('--max-sessions', type=int, default=DEFAULT_CAPACITY,
+                        help=f"games kept in memory, per worker (default: {DEFAULT_CAPACITY})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes to spread rooms over, 0 for one per CPU (default: 1)")
+    parser.add_argument('--rebalance', type=float, default=REBALANCE_INTERVAL, metavar='SECONDS',
+                        help="with several workers, how often rooms are moved to even out the load, "
+                             f"0 to never move them (default: {REBALANCE_INTERVAL:g})")
+    args = parser.parse_args()
+    if not 0 <= args.port <= 65535:
+        parser.error("--port must be between 0 and 65535")
+    if args.players < 1:
+        parser.error("--players must be at least 1")
+    if args.pause < 0:
+        parser.error("--pause cannot be negative")
+    if args.vote_timeout is not None and args.vote_timeout <= 0:
+        parser.error("--vote-timeout must be more than 0")
+    if args.max_sessions < 1:
+        parser.error("--max-sessions must be at least 1")
+    if args.workers < 0:
+        parser.error("--workers cannot be negative")
+    if args.rebalance < 0:
+        parser.error("--rebalance cannot be negative")
+
+    if args.workers != 1:
+        from shards import ShardedServer
+        server = ShardedServer(args.story, args.workers or None, args.players, args.pause, args.speed,
+                               args.vote_timeout, args.session_dir, args.max_sessions, args.rebalance or None)
+        print(f"(｡♥‿♥｡) Hosting {args.story} on {args.host}:{args.port} with {server.workers} workers")
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            print("\n(｡•́︿•̀｡) Server stopped. Mata ne!")
+        return
+
+    story = open_story_file(args.story)
+    sessions = SessionStore(story, args.session_dir, args.max_sessions)
+    print(f"(｡♥‿♥｡) Hosting {args.story} on {args.host}:{args.port}")
+    try:
+        asyncio.run(GameServer(story, args.players, args.pause, args.speed,
+                               args.vote_timeout, sessions).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n(｡•́︿•̀｡) Server stopped. Mata ne!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Json2RPGDesu - Session Store
+
+This module keeps many game sessions of one story within a fixed memory
+budget. Every session shares the store's compiled story, so a session costs
+only its GameState: the party's stat columns, the scene it is in and its
+random stream. At most `capacity` sessions are kept in memory. When one
+more is needed, the session used least recently is spilled to a file in
+the store's directory, and it is read back the next time anybody looks at
+it or sends it an Action. A host can therefore keep any number of games
+paused mid-adventure while its memory use stays flat.
+
+A spilled session is written in the same terms as a save file: a snapshot
+taken between decisions, followed by the Actions played since. Snapshots
+can only be taken between decisions, so while a session is in a vote or a
+fight the store keeps the snapshot from before the choice that started it,
+and journals the Actions since. Replaying them through the engine rolls the
+same dice again, so a session read back is exactly the session spilled. A
+session whose very first scene opens a vote is rebuilt from its players and
+seed instead.
+
+A session in a vote also keeps the wall-clock time its vote closes at, set
+by the host, and that deadline is spilled with it. A host reopening the
+session, in the same process or another, waits only for the time that was
+left rather than starting the vote's timeout over.
+
+Usage:
+    store = SessionStore(story, 'sessions', capacity=1000)
+    events = store.create('room-1', ['Ai', 'Bo'])
+    events = store.advance('room-1', Action('choose', 0))
+
+Key Features:
+- One shared, immutable story for every session
+- LRU bound on the sessions held in memory
+- Spill to disk and transparent read-back on the next lookup
+- Deterministic rebuild from a snapshot plus a short journal
+- Vote deadlines kept with their sessions across spills
+
+Classes:
+    SessionStore: Sessions of one story, bounded in memory
+
+Dependencies:
+    - engine: Headless game rules
+    - savegame: Session snapshots
+    - story: Compiled story
+    - json: For the spill file format
+    - os: For the spill directory and atomic file replacement
+    - urllib.parse: For turning session IDs into file names
+    - collections: For the LRU order
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from engine import Action, Event, GameState, advance, new_game, PHASE_CHOOSE, PHASE_OVER
+from savegame import restore, snapshot
+from story import CompiledStory, CHOICE_AGREE, CHOICE_NEXT, CHOICE_VOTE, END
+
+# Sessions kept in memory unless the store is told otherwise
+DEFAULT_CAPACITY = 1024
+SPILL_VERSION = 1
+
+# Phases a session can be snapshotted in
+_SETTLED = (PHASE_CHOOSE, PHASE_OVER)
+_GROUP_CHOICES = (CHOICE_VOTE, CHOICE_AGREE)
+
+
+def _may_unsettle(state: GameState, action: Action) -> bool:
+    """
+    Whether an Action could leave a settled session in a vote or a fight.
+
+    Only a choice that starts one, or one leading to a scene with a vote
+    or agreement that could open it, can; anything else needs no snapshot
+    from before it.
+    """
+    if state.phase != PHASE_CHOOSE or action.kind != PHASE_CHOOSE:
+        return False
+    choices = state.scene.choices
+    index = action.value
+    if not (isinstance(index, int) and 0 <= index < len(choices)):
+        return False
+    choice = choices[index]
+    if choice.kind != CHOICE_NEXT:
+        return True
+    if choice.next_scene == END:
+        return False
+    return any(c.kind in _GROUP_CHOICES for c in state.story.scenes[choice.next_scene].choices)
+
+
+class _Session:
+    """
+    One session held in memory.
+
+    base is None while the session sits between decisions, so a snapshot
+    of state can be taken at any time. Otherwise it is what the session is
+    rebuilt from, ("snapshot", snapshot) or ("start", {"players", "seed"}),
+    and journal holds the Actions played since. deadline is the wall-clock
+    time the open vote closes at, None without one.
+    """
+
+    __slots__ = ('state', 'base', 'journal', 'deadline')
+
+    def __init__(self, state: GameState, base: Optional[Tuple[str, Dict]] = None,
+                 journal: Sequence[Action] = (), deadline: Optional[float] = None):
+        self.state = state
+        self.base = base
+        self.journal = list(journal)
+        self.deadline = deadline
+
+
+class SessionStore:
+    """
+    Sessions of one story, bounded in memory.
+
+    Attributes:
+        story (CompiledStory): Story every session plays
+        directory (str): Where spilled sessions are written, None to keep every
+            session in memory
+        capacity (int): Most sessions kept in memory, None for no limit
+        spills (int): Sessions written to disk so far
+        reloads (int): Sessions read back from disk so far
+    """
+
+    def __init__(self, story: CompiledStory, directory: Optional[str] = None,
+                 capacity: Optional[int] = DEFAULT_CAPACITY):
+        """
+        Initialize a session store.
+
+        Args:
+            story: Story every session plays
+            directory: Where spilled sessions are written, created if missing;
+                None keeps every session in memory
+            capacity: Most sessions kept in memory, None for no limit
+        """
+        if directory is None:
+            capacity = None
+        elif capacity is not None and capacity < 1:
+            raise ValueError(f"A session store holds at least one session in memory, not {capacity}")
+        self.story = story
+        self.directory = directory
+        self.capacity = capacity
+        self.spills = 0
+        self.reloads = 0
+        self._resident: 'OrderedDict[str, _Session]' = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        """Number of sessions held in memory."""
+        return len(self._resident)
+
+    def __contains__(self, session_id: str) -> bool:
+        """Whether the store has a session, in memory or spilled."""
+        return session_id in self._resident or (self.directory is not None
+                                                 and os.path.exists(self._path(session_id)))
+
+    def create(self, session_id: str, player_names: List[str], seed: Optional[int] = None) -> List[Event]:
+        """
+        Start a new session, replacing any session with the same ID.
+
+        Args:
+            session_id: ID to look the session up by
+            player_names: Names of the party members in turn order
+            seed: Seed for the session's random stream, random if not given
+
+        Returns:
+            List[Event]: Events of entering the first scene
+        """
+        self.discard(session_id)
+        state, events = new_game(self.story, player_names, seed)
+        base = None
+        if state.phase not in _SETTLED:
+            base = ("start", {"players": list(player_names), "seed": state.seed})
+        self._admit(session_id, _Session(state, base))
+        return events
+
+    def get(self, session_id: str) -> GameState:
+        """
+        Look up a session, reading it back from disk if it was spilled.
+
+        The state returned is only valid until the next call to the store,
+        which may spill it; change it through advance() only.
+
+        Args:
+            session_id: ID of the session
+
+        Returns:
+            GameState: The session
+
+        Raises:
+            KeyError: If the store has no such session
+            ValueError: If the spilled session no longer matches the story
+        """
+        return self._session(session_id).state
+
+    def advance(self, session_id: str, action: Action) -> List[Event]:
+        """
+        Advance a session by one Action.
+
+        Args:
+            session_id: ID of the session
+            action: Input from the acting player
+
+        Returns:
+            List[Event]: What happened
+
+        Raises:
+            KeyError: If the store has no such session
+            ValueError: If the spilled session no longer matches the story
+        """
+        session = self._session(session_id)
+        state = session.state
+        # Most choices lead to another choice, so the snapshot is only taken when it may be needed
+        before = snapshot(state) if session.base is None and _may_unsettle(state, action) else None
+        state, events = advance(state, action)
+        if events and events[0].kind == 'invalid':
+            return events
+        if state.phase in _SETTLED:
+            session.base = None
+            session.journal = []
+            session.deadline = None
+        elif session.base is None:
+            session.base = ("snapshot", before)
+            session.journal = [action]
+        else:
+            session.journal.append(action)
+        return events
+
+    def deadline(self, session_id: str) -> Optional[float]:
+        """
+        When the open vote of a session closes.
+
+        Args:
+            session_id: ID of the session
+
+        Returns:
+            float: Wall-clock time (time.time()) set with set_deadline(), None if there is none
+
+        Raises:
+            KeyError: If the store has no such session
+        """
+        return self._session(session_id).deadline
+
+    def set_deadline(self, session_id: str, deadline: Optional[float]):
+        """
+        Keep the time a session's open vote closes at with the session.
+
+        The deadline is spilled and read back with the session, and dropped
+        once the session is between decisions again.
+
+        Args:
+            session_id: ID of the session
+            deadline: Wall-clock time (time.time()), None to clear it
+
+        Raises:
+            KeyError: If the store has no such session
+        """
+        self._session(session_id).deadline = deadline
+
+    def spill(self, session_id: str):
+        """
+        Write a session held in memory to disk and drop it from memory.
+
+        Args:
+            session_id: ID of the session
+
+        Raises:
+            KeyError: If the session is not held in memory
+            ValueError: If the store has no directory to spill to
+        """
+        if self.directory is None:
+            raise ValueError("This session store keeps every session in memory")
+        session = self._resident.pop(session_id)
+        if session.base is None:
+            data = {"version": SPILL_VERSION, "snapshot": snapshot(session.state), "journal": []}
+        else:
+            key, base = session.base
+            data = {"version": SPILL_VERSION, key: base, "journal": [list(a) for a in session.journal]}
+            if session.deadline is not None:
+                data["deadline"] = session.deadline
+        path = self._path(session_id)
+        temp_path = f"{path}.tmp"
+        # Spilled sessions are a cache of live games, not saves, so they are not fsynced
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.spills += 1
+
+    def flush(self):
+        """Spill every session held in memory, e.g. before shutting down; a store without a directory keeps them."""
+        if self.directory is None:
+            return
+        for session_id in list(self._resident):
+            self.spill(session_id)
+
+    def discard(self, session_id: str):
+        """
+        Forget a session, in memory and on disk. Unknown IDs are ignored.
+
+        Args:
+            session_id: ID of the session
+        """
+        self._resident.pop(session_id, None)
+        if self.directory is not None:
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{quote(session_id, safe='')}.json")
+
+    def _session(self, session_id: str) -> _Session:
+        """A session held in memory, read back from disk if needed, marked as just used."""
+        session = self._resident.get(session_id)
+        if session is not None:
+            self._resident.move_to_end(session_id)
+            return session
+        if self.directory is None:
+            raise KeyError(session_id)
+        path = self._path(session_id)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise KeyError(session_id) from None
+        session = self._rebuild(data)
+        os.remove(path)
+        self.reloads += 1
+        self._admit(session_id, session)
+        return session
+
+    def _rebuild(self, data: Dict) -> _Session:
+        """Replay a spilled session from its snapshot or start."""
+        if data.get("version") != SPILL_VERSION:
+            raise ValueError(f"Unsupported spilled session version: {data.get('version')}")
+        if "start" in data:
+            base = ("start", data["start"])
+            state, _ = new_game(self.story, data["start"]["players"], data["start"]["seed"])
+        else:
+            base = ("snapshot", data["snapshot"])
+            state = restore(self.story, data["snapshot"])
+        journal = [Action(kind, value) for kind, value in data["journal"]]
+        for action in journal:
+            state, events = advance(state, action)
+            if events and events[0].kind == 'invalid':
+                raise ValueError(f"Spilled session does not match this story: {action}")
+        if state.phase in _SETTLED:
+            return _Session(state)
+        return _Session(state, base, journal, data.get("deadline"))
+
+    def _admit(self, session_id: str, session: _Session):
+        """Hold a session in memory, spilling the least recently used ones past capacity."""
+        self._resident[session_id] = session
+        self._resident.move_to_end(session_id)
+        if self.capacity is not None:
+            while len(self._resident) > self.capacity:
+                self.spill(next(iter(self._resident)))
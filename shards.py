@@ -0,0 +1,483 @@
+"""
+Json2RPGDesu - Sharded Game Server
+
+This module spreads the rooms of a game server over several worker
+processes, so a host uses all of its CPU cores rather than one. The engine,
+combat and text rendering run in Python on a single thread, so one server
+process is limited to one core however many rooms it hosts.
+
+A front process accepts every connection and reads the room code and name,
+then hands the player to the worker that owns that room. Rooms are
+partitioned by a stable hash of their code, so every player of a room
+reaches the same worker and no room state is shared between processes.
+Each worker runs the rooms it owns with the same Room code as a
+single-process server, and keeps their sessions in its own SessionStore.
+The front only relays lines: player input goes to the owning worker, and
+the text the worker sends to a seat goes back to that player's connection.
+
+All workers spill to the same session directory, so a room can migrate
+from one worker to another. Its owner closes the room and spills its
+session, the front routes the room code to the new worker from then on,
+and the players in the room rejoin it there, picking up where they were.
+Input typed while a room migrates is held by the front until it has moved.
+While serving, the front checks every so often which workers have the
+most and fewest players connected, and moves a room between them when
+that evens out the load.
+
+Messages between the front and the workers travel over multiprocessing
+queues. Their feeder threads send in the background, so neither side's
+event loop ever blocks on the other, and a thread per process turns
+incoming messages into event loop callbacks.
+
+Usage:
+    python server.py --workers 4
+    server = ShardedServer('story.json', workers=4)
+    asyncio.run(server.serve('127.0.0.1', 8765))
+
+Key Features:
+- Rooms hash-partitioned over worker processes by room code
+- One compiled story and session store per worker
+- Room migration between workers through the shared session directory
+- Periodic rebalancing of connected players across workers
+- Same protocol and room behavior as the single-process server
+
+Classes:
+    ShardedServer: Accepts connections and relays them to worker processes
+
+Functions:
+    shard_of: The worker a room code belongs to by default
+
+Dependencies:
+    - server: Rooms and their room registry
+    - sessions: Session store with spill to disk
+    - story: Compiled story
+    - clock: Pacing of combat beats
+    - asyncio: For networking in the front and the workers
+    - multiprocessing: For the worker processes and their queues
+    - threading: For receiving messages without blocking the event loop
+    - zlib: For a room code hash that is the same in every process
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from clock import Clock, REAL_TIME
+from server import COMBAT_PAUSE, GREETING, REBALANCE_INTERVAL, ROOM_REFUSED, GameServer, Room, Seat
+from sessions import DEFAULT_CAPACITY, SessionStore
+from story import open_story_file
+
+# Messages from the front to a worker:
+#   ("join", conn, code, name)   seat a connection in a room
+#   ("line", conn, text)         a line typed by a connection
+#   ("leave", conn)              a connection closed
+#   ("release", code)            close a room and spill its session, for migration
+#   ("stop",)                    spill every session and exit
+# Messages from a worker to the front:
+#   ("send", conn, data)         bytes for a connection
+#   ("close", conn)              close a connection
+#   ("released", code, rejoin)   a room has been released; rejoin is False if its game had ended
+
+
+def shard_of(code: str, workers: int) -> int:
+    """
+    The worker a room code belongs to unless it was migrated.
+
+    Python's hash() of a string differs between processes, so rooms are
+    partitioned by CRC-32 instead.
+
+    Args:
+        code: Room code
+        workers: Number of workers
+
+    Returns:
+        int: Index of the worker
+    """
+    return zlib.crc32(code.encode('utf-8')) % workers
+
+
+def _listen(queue: multiprocessing.Queue, loop: asyncio.AbstractEventLoop, dispatch):
+    """Hand every message on a queue to the event loop until None arrives."""
+    while True:
+        message = queue.get()
+        if message is None:
+            return
+        loop.call_soon_threadsafe(dispatch, message)
+
+
+class _RemoteWriter:
+    """Stands in for a player's StreamWriter in a worker, sending their text to the front."""
+
+    __slots__ = ('conn', 'outbox')
+
+    def __init__(self, conn: int, outbox: multiprocessing.Queue):
+        self.conn = conn
+        self.outbox = outbox
+
+    def write(self, data: bytes):
+        self.outbox.put(("send", self.conn, data))
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+
+class _Worker:
+    """
+    Hosts the rooms of one shard.
+
+    Messages for one connection are handled in order, each after the
+    previous one finished, while different connections are handled side by
+    side, as they would be by a single-process server.
+    """
+
+    def __init__(self, outbox: multiprocessing.Queue, server: GameServer):
+        self.outbox = outbox
+        self.server = server
+        self.seats: Dict[int, Tuple[Room, Seat]] = {}
+        # Room code of every connection, from the moment its join arrives
+        self._codes: Dict[int, str] = {}
+        # Last task of each connection, which the next one waits for
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._done: Optional[asyncio.Future] = None
+
+    async def run(self, inbox: multiprocessing.Queue):
+        """Handle messages from the front until told to stop."""
+        loop = asyncio.get_running_loop()
+        self._done = loop.create_future()
+        threading.Thread(target=_listen, args=(inbox, loop, self._dispatch), daemon=True).start()
+        await self._done
+
+    def _dispatch(self, message: tuple):
+        kind = message[0]
+        if kind == "join":
+            _, conn, code, name = message
+            self._codes[conn] = code
+            self._chain(conn, self._join(conn, code, name))
+        elif kind == "line":
+            _, conn, text = message
+            self._chain(conn, self._line(conn, text))
+        elif kind == "leave":
+            self._chain(message[1], self._leave(message[1]))
+        elif kind == "release":
+            asyncio.ensure_future(self._release(message[1]))
+        elif kind == "stop":
+            asyncio.ensure_future(self._stop())
+
+    def _chain(self, conn: int, coro):
+        self._tails[conn] = asyncio.ensure_future(self._after(self._tails.get(conn), coro))
+
+    @staticmethod
+    async def _after(previous: Optional[asyncio.Task], coro):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await coro
+
+    async def _join(self, conn: int, code: str, name: str):
+        room = self.server.open_room(code)
+        seat = await room.join(name, _RemoteWriter(conn, self.outbox))
+        if seat is None:
+            self.outbox.put(("send", conn, ROOM_REFUSED.encode('utf-8')))
+            self.outbox.put(("close", conn))
+            return
+        self.seats[conn] = (room, seat)
+
+    async def _line(self, conn: int, text: str):
+        entry = self.seats.get(conn)
+        if entry is not None:
+            room, seat = entry
+            await room.handle_line(seat, text)
+
+    async def _leave(self, conn: int):
+        entry = self.seats.pop(conn, None)
+        if entry is not None:
+            await self.server.leave_room(*entry)
+        if self._tails.get(conn) is asyncio.current_task():
+            del self._tails[conn]
+            self._codes.pop(conn, None)
+
+    async def _release(self, code: str):
+        """Close a room once its pending input is handled, and spill its session for another worker."""
+        conns = [conn for conn, conn_code in self._codes.items() if conn_code == code]
+        pending = [self._tails[conn] for conn in conns if conn in self._tails]
+        if pending:
+            await asyncio.wait(pending)
+        for conn in conns:
+            self.seats.pop(conn, None)
+            self._tails.pop(conn, None)
+            del self._codes[conn]
+        room = self.server.rooms.pop(code, None)
+        if room is not None:
+            room.close()
+            if room.finished:
+                # Another worker would take the code as free and start a new game there
+                room.detach()
+                self.outbox.put(("released", code, False))
+                return
+        try:
+            self.server.sessions.spill(code)
+        except KeyError:
+            pass  # Never started, or already on disk
+        self.outbox.put(("released", code, True))
+
+    async def _stop(self):
+        tails = list(self._tails.values())
+        if tails:
+            await asyncio.wait(tails)
+        self.server.sessions.flush()
+        self._done.set_result(None)
+
+
+def _worker_main(story_path: str, options: Dict, inbox: multiprocessing.Queue, outbox: multiprocessing.Queue):
+    """Entry point of a worker process."""
+    story = open_story_file(story_path)
+    sessions = SessionStore(story, options["session_dir"], options["max_sessions"])
+    server = GameServer(story, options["party_size"], options["pause"], options["clock"],
+                        options["vote_timeout"], sessions)
+    try:
+        asyncio.run(_Worker(outbox, server).run(inbox))
+    except KeyboardInterrupt:
+        sessions.flush()
+
+
+class ShardedServer:
+    """
+    Accepts connections and relays them to worker processes.
+
+    Attributes:
+        story_path (str): Story file every worker hosts
+        workers (int): Number of worker processes
+        session_dir (str): Directory every worker spills sessions to
+        rebalance_interval (float): Seconds between load checks while serving,
+            None if rooms only move through migrate()
+        migrations (int): Rooms migrated so far
+    """
+
+    def __init__(self, story_path: str, workers: Optional[int] = None, party_size: int = 4,
+                 pause: float = COMBAT_PAUSE, clock: Clock = REAL_TIME,
+                 vote_timeout: Optional[float] = None, session_dir: str = 'sessions',
+                 max_sessions: Optional[int] = DEFAULT_CAPACITY,
+                 rebalance: Optional[float] = REBALANCE_INTERVAL):
+        """
+        Initialize a sharded server. Workers start with serve() or start().
+
+        Args:
+            story_path: Story file to host; every worker opens it itself
+            workers: Number of worker processes, CPU count if None
+            party_size: Players per room
+            pause: Seconds to pause after combat beats
+            clock: Paces the pauses of every room
+            vote_timeout: Minutes to wait for ballots when a vote sets no timeout,
+                None to wait for every player
+            session_dir: Directory every worker spills sessions to, shared so rooms can migrate
+            max_sessions: Games each worker keeps in memory
+            rebalance: Seconds between load checks while serving, None to never
+                move rooms on their own
+        """
+        self.story_path = story_path
+        self.workers = workers or os.cpu_count() or 1
+        self.session_dir = session_dir
+        self.rebalance_interval = rebalance
+        self.migrations = 0
+        self._options = {"party_size": party_size, "pause": pause, "clock": clock,
+                         "vote_timeout": vote_timeout, "session_dir": session_dir,
+                         "max_sessions": max_sessions}
+        self._processes: List[multiprocessing.Process] = []
+        self._inboxes: List[multiprocessing.Queue] = []
+        self._outbox: Optional[multiprocessing.Queue] = None
+        # Rooms migrated away from the worker shard_of() gives them
+        self._moved: Dict[str, int] = {}
+        # Rooms being migrated, set once they have moved
+        self._moving: Dict[str, asyncio.Event] = {}
+        self._releases: Dict[str, asyncio.Future] = {}
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._members: Dict[int, Tuple[str, str]] = {}
+        self._conns = itertools.count()
+
+    def owner(self, code: str) -> int:
+        """
+        The worker hosting a room code.
+
+        Args:
+            code: Room code
+
+        Returns:
+            int: Index of the worker
+        """
+        worker = self._moved.get(code)
+        return shard_of(code, self.workers) if worker is None else worker
+
+    def start(self):
+        """Start the worker processes, and relay their messages to the running event loop."""
+        context = multiprocessing.get_context('spawn')
+        os.makedirs(self.session_dir, exist_ok=True)
+        self._outbox = context.Queue()
+        for _ in range(self.workers):
+            inbox = context.Queue()
+            process = context.Process(target=_worker_main, daemon=True,
+                                      args=(self.story_path, self._options, inbox, self._outbox))
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        threading.Thread(target=_listen, args=(self._outbox, asyncio.get_running_loop(), self._dispatch),
+                         daemon=True).start()
+
+    async def stop(self):
+        """Have every worker spill its sessions, and wait for them to exit."""
+        loop = asyncio.get_running_loop()
+        for inbox in self._inboxes:
+            inbox.put(("stop",))
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+        if self._outbox is not None:
+            self._outbox.put(None)
+        self._processes, self._inboxes, self._outbox = [], [], None
+
+    def _dispatch(self, message: tuple):
+        kind = message[0]
+        if kind == "send":
+            writer = self._writers.get(message[1])
+            if writer is not None and not writer.is_closing():
+                writer.write(message[2])
+        elif kind == "close":
+            writer = self._writers.get(message[1])
+            if writer is not None:
+                writer.close()
+        elif kind == "released":
+            released = self._releases.pop(message[1], None)
+            if released is not None:
+                released.set_result(message[2])
+
+    async def _route(self, code: str, message: tuple):
+        """Send a message to the worker hosting a room, once any migration of the room is over."""
+        # Another migration of the room may begin before this one has woken up
+        while code in self._moving:
+            await self._moving[code].wait()
+        if self._inboxes:  # Otherwise the workers have stopped
+            self._inboxes[self.owner(code)].put(message)
+
+    async def migrate(self, code: str, worker: int):
+        """
+        Move a room to another worker, with the players connected to it.
+
+        Args:
+            code: Room code
+            worker: Index of the worker to move it to
+
+        Raises:
+            ValueError: If there is no such worker
+        """
+        if not 0 <= worker < self.workers:
+            raise ValueError(f"There is no worker {worker}, only {self.workers}")
+        while code in self._moving:
+            await self._moving[code].wait()
+        source = self.owner(code)
+        if source == worker:
+            return
+        moving = self._moving[code] = asyncio.Event()
+        try:
+            released = self._releases[code] = asyncio.get_running_loop().create_future()
+            self._inboxes[source].put(("release", code))
+            rejoin = await released
+            if worker == shard_of(code, self.workers):
+                self._moved.pop(code, None)
+            else:
+                self._moved[code] = worker
+            # Players of a finished game stay where they are, as they would in one process
+            for conn, (member_code, name) in self._members.items():
+                if rejoin and member_code == code:
+                    self._inboxes[worker].put(("join", conn, code, name))
+            self.migrations += 1
+        finally:
+            del self._moving[code]
+            moving.set()
+
+    async def rebalance(self) -> bool:
+        """
+        Move one room from the worker with the most players connected to the
+        one with the fewest, if that brings them closer together.
+
+        The largest room that narrows the gap is moved, so uneven loads even
+        out in few moves without rooms bouncing back and forth.
+
+        Returns:
+            bool: Whether a room was moved
+        """
+        rooms: Dict[str, int] = {}
+        for code, _ in self._members.values():
+            rooms[code] = rooms.get(code, 0) + 1
+        loads = [0] * self.workers
+        for code, players in rooms.items():
+            loads[self.owner(code)] += players
+        busiest = max(range(self.workers), key=loads.__getitem__)
+        idlest = min(range(self.workers), key=loads.__getitem__)
+        gap = loads[busiest] - loads[idlest]
+        movable = [(players, code) for code, players in rooms.items()
+                   if players < gap and code not in self._moving and self.owner(code) == busiest]
+        if not movable:
+            return False
+        await self.migrate(max(movable)[1], idlest)
+        return True
+
+    async def _balance(self, interval: float):
+        """Rebalance the workers every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.rebalance()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Greet one player connection, then relay it to the worker hosting its room."""
+        conn = code = None
+        try:
+            writer.write(GREETING.encode('utf-8'))
+            code = (await reader.readline()).decode('utf-8', errors='replace').strip()
+            writer.write("Your name: ".encode('utf-8'))
+            name = (await reader.readline()).decode('utf-8', errors='replace').strip()
+            if not code or not name:
+                return
+
+            conn = next(self._conns)
+            self._writers[conn] = writer
+            self._members[conn] = (code, name)
+            await self._route(code, ("join", conn, code, name))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self._route(code, ("line", conn, line.decode('utf-8', errors='replace')))
+        except ConnectionError:
+            pass
+        finally:
+            if conn is not None:
+                del self._members[conn]
+                await self._route(code, ("leave", conn))
+                del self._writers[conn]
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        """
+        Start the workers and listen for players until cancelled.
+
+        Args:
+            host: Interface to bind
+            port: TCP port to bind
+        """
+        self.start()
+        balancer = None
+        if self.rebalance_interval:
+            balancer = asyncio.ensure_future(self._balance(self.rebalance_interval))
+        try:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            async with server:
+                await server.serve_forever()
+        finally:
+            if balancer is not None:
+                balancer.cancel()
+            # Workers write out their games, so a restarted server can resume them
+            await self.stop()
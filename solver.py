@@ -0,0 +1,410 @@
+"""
+Json2RPGDesu - Exact Combat Solver
+
+This module computes the exact outcome odds of a fight instead of sampling
+them. Combat is a Markov chain over the enemy's health and the health of
+each living player, driven by the fixed dice distributions, so the odds can
+be pushed forward turn by turn rather than estimated from thousands of
+simulated fights.
+
+The full joint chain grows with the product of every player's health, so
+the solver factors it whenever the rules allow. Unless a player changes
+their move with their health, the enemy takes the same damage whoever
+strikes: the turn it falls follows from a chain over its health alone, and
+each player's health is an independent chain of its own. Turns go round
+the living players, so the turn the party is wiped is the sum of every
+player's lifetime, a convolution. Combining these few small distributions
+gives the exact odds in milliseconds.
+
+Strikers who heal when wounded couple the enemy to the party again; those
+fights fall back to propagating the joint chain with merged states and
+memoized per-player moves. Either way, probability mass below a pruning
+threshold is dropped and reported, so every answer comes with a bound on
+its error. Fights still running after MAX_TURNS turns count as stalemates,
+just like in the simulator.
+
+Usage:
+    python solver.py                              # every encounter in story.json
+    python solver.py --policy special:40 --players 2
+
+Classes:
+    CombatOdds: Exact outcome of one encounter
+
+Dependencies:
+    - balance: Party, Policy and the combat constants shared with the simulator
+    - story: Compiled story records (Enemy)
+    - argparse: For command line options
+    - time: For timing each encounter
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from balance import (
+    DEFEND_BONUS, HEAL_AMOUNT, MAX_TURNS, SPECIAL_BONUS,
+    Party, Policy, encounters,
+)
+from story import Enemy, load_story_file
+
+# States less likely than this are dropped; their mass is reported as pruned
+PRUNE = 1e-12
+
+_MISS = 9 / 20
+_HIT_FACE = 11 / 20 / 6
+
+
+class CombatOdds(NamedTuple):
+    """
+    Exact outcome of one encounter.
+
+    Attributes:
+        win (float): Probability the enemy is defeated
+        wipe (float): Probability the whole party falls
+        stalemate (float): Probability the fight is still running after MAX_TURNS turns
+        pruned (float): Probability mass dropped by pruning, an upper bound on the error
+        expected_turns (float): Expected player turns until the fight is decided
+        expected_damage (float): Expected total HP the party loses
+        expected_deaths (float): Expected number of players who fall
+        states (int): Most states alive at once during the solve
+    """
+    win: float
+    wipe: float
+    stalemate: float
+    pruned: float
+    expected_turns: float
+    expected_damage: float
+    expected_deaths: float
+    states: int
+
+
+def _roll(bonus: int) -> Dict[int, float]:
+    """Distribution of bonus + d6 after a d20 >= 10 to-hit roll, misses as 0."""
+    outcomes = {0: _MISS}
+    for face in range(1, 7):
+        damage = max(0, bonus + face)
+        outcomes[damage] = outcomes.get(damage, 0.0) + _HIT_FACE
+    return outcomes
+
+
+def solve(enemy: Enemy, party: Party = Party(), policy: Policy = Policy(),
+          prune: float = PRUNE) -> CombatOdds:
+    """
+    Compute the exact outcome odds of fighting one enemy.
+
+    Args:
+        enemy: Enemy stats from a story combat block
+        party: Party entering the fight
+        policy: What the party does on its turns
+        prune: Drop states less likely than this
+
+    Returns:
+        CombatOdds: Outcome probabilities and expectations
+    """
+    if policy.action == 'attack':
+        strikes = _roll(party.attack - enemy.defense)
+    elif policy.action == 'special':
+        strikes = {max(0, party.attack + SPECIAL_BONUS - enemy.defense): 1.0}
+    else:
+        strikes = {0: 1.0}
+
+    odds = _solve_factored(enemy, party, policy, strikes, prune)
+    if odds is None:
+        odds = _solve_joint(enemy, party, policy, strikes, prune)
+    return odds
+
+
+def _enemy_hits(enemy: Enemy, guard: int) -> Dict[int, float]:
+    """Distribution of the damage a player with this defense takes from one enemy attack."""
+    # Enemy hits are reduced by defense twice: in the roll and in take_damage
+    hits: Dict[int, float] = {}
+    for damage, p in _roll(enemy.attack - guard).items():
+        actual = max(0, damage - guard)
+        hits[actual] = hits.get(actual, 0.0) + p
+    return hits
+
+
+def _solve_factored(enemy: Enemy, party: Party, policy: Policy, strikes: Dict[int, float],
+                    prune: float) -> Optional[CombatOdds]:
+    """
+    Solve a fight whose enemy takes the same damage whoever strikes.
+
+    The turn T on which the enemy falls is then independent of the party, and
+    each player's health is a chain of its own. Turns go round the living
+    players, so the party is wiped on turn W = N_1 + ... + N_size, where N_i
+    is the number of turns player i survives while the enemy keeps attacking.
+    None of this needs the joint (enemy, party) state space.
+
+    Returns None when a striking player could drop below the heal threshold
+    before the fight is decided with probability prune or more, since healing
+    instead of striking ties the enemy to the party. Below that, the chance
+    is added to the pruned mass.
+    """
+    size, max_hp, _, defense = party
+    action, heal_below = policy
+    striking = action in ('attack', 'special')
+    plain_hits = _enemy_hits(enemy, defense)
+    turn_hits = _enemy_hits(enemy, defense + DEFEND_BONUS) if action == 'defend' else plain_hits
+
+    # Two small chains, advanced side by side: the enemy's health, giving
+    # the turn it falls, and one player's health, giving the number of own
+    # turns they survive and their expected damage on each. Nothing changes
+    # once the enemy has almost surely fallen or the whole party has surely
+    # fallen, which bounds the horizon.
+    enemy_falls = [0.0]
+    death_on = [0.0]
+    damage_on = [0.0]
+    enemy_health = {enemy.health: 1.0}
+    player_health = {max_hp: 1.0}
+    party_gone = MAX_TURNS
+    enemy_standing = 1.0
+    wounded = 0.0    # P(a striking player is below heal_below on their own turn)
+    deviation = 0.0  # Bound on P(some striker heals before the fight is decided)
+    for turn in range(1, MAX_TURNS + 1):
+        standing_before = enemy_standing
+        fallen = 0.0
+        following: Dict[int, float] = {}
+        for hp, p in enemy_health.items():
+            for dealt, q in strikes.items():
+                if dealt >= hp:
+                    fallen += p * q
+                else:
+                    following[hp - dealt] = following.get(hp - dealt, 0.0) + p * q
+        enemy_falls.append(fallen)
+        enemy_health = following
+        enemy_standing = sum(following.values())
+
+        if player_health:
+            died = dealt = 0.0
+            following = {}
+            if striking and heal_below:
+                # Strikers never heal, so their health only falls and the
+                # mass below the threshold only grows; what enters it on own
+                # turn k heals on global turn k or later, if the enemy stands
+                now_wounded = sum(p for hp, p in player_health.items() if hp < heal_below)
+                deviation += size * (now_wounded - wounded) * standing_before
+                wounded = now_wounded
+                if deviation >= prune:
+                    return None
+            for hp, p in player_health.items():
+                hits = turn_hits
+                if not striking and (action == 'heal' or hp < heal_below):
+                    hp = min(max_hp, hp + HEAL_AMOUNT)
+                    hits = plain_hits
+                for taken, q in hits.items():
+                    if taken >= hp:
+                        died += p * q
+                        dealt += p * q * hp
+                    else:
+                        dealt += p * q * taken
+                        following[hp - taken] = following.get(hp - taken, 0.0) + p * q
+            death_on.append(died)
+            damage_on.append(dealt)
+            player_health = following
+            if not player_health:
+                party_gone = size * turn
+        else:
+            death_on.append(0.0)
+            damage_on.append(0.0)
+
+        if enemy_standing < prune or turn >= party_gone:
+            break
+    horizon = turn
+
+    survives_more = [1.0] * (horizon + 2)  # P(N >= k)
+    for turn in range(1, horizon + 1):
+        survives_more[turn + 1] = survives_more[turn] - death_on[turn]
+
+    def capped(k: int) -> Dict[int, float]:
+        """Distribution of min(N, k)."""
+        dist = {n: death_on[n] for n in range(1, k) if death_on[n]}
+        dist[k] = dist.get(k, 0.0) + survives_more[k]
+        return dist
+
+    def powers(dist: Dict[int, float], limit: int) -> List[Dict[int, float]]:
+        """Sums of 0..size-1 independent copies of dist, up to limit."""
+        result = [{0: 1.0}]
+        for _ in range(size - 1):
+            result.append(_convolve(result[-1], dist, limit))
+        return result
+
+    # Global turn of each player's k-th own turn: k plus the turns the others
+    # took first, which for independent N is a convolution of capped lifetimes
+    turn_damage = [0.0] * (horizon + 1)
+    deaths_on_turn = [0.0] * (horizon + 1)
+    previous = [{0: 1.0}] * size  # min(N, 0) is always 0
+    for own in range(1, horizon + 1):
+        if survives_more[own] < prune * prune:
+            break
+        limit = horizon - own
+        current = powers(capped(own), limit)
+        for position in range(size):
+            offsets = _convolve(current[position], previous[size - 1 - position], limit)
+            for offset, p in offsets.items():
+                turn_damage[own + offset] += p * damage_on[own]
+                deaths_on_turn[own + offset] += p * death_on[own]
+        previous = current
+
+    # Wipe turn: sum of every player's lifetime
+    lifetime = {n: death_on[n] for n in range(1, horizon + 1) if death_on[n]}
+    wipe_on = {0: 1.0}
+    for _ in range(size):
+        wipe_on = _convolve(wipe_on, lifetime, horizon)
+
+    win = wipe = expected_turns = expected_damage = expected_deaths = 0.0
+    wiped_by = 0.0   # P(W <= turn - 1)
+    dead_by = 0.0    # expected players fallen after turn - 1 turns
+    enemy_up = 1.0   # P(T > turn - 1)
+    for turn in range(1, horizon + 1):
+        falls = enemy_falls[turn]
+        win += falls * (1.0 - wiped_by)
+        expected_deaths += falls * (dead_by - size * wiped_by)
+        enemy_up -= falls
+        wiped = wipe_on.get(turn, 0.0)
+        wipe += wiped * enemy_up
+        expected_deaths += wiped * enemy_up * size
+        expected_turns += turn * (falls * (1.0 - wiped_by) + wiped * enemy_up)
+        expected_damage += enemy_up * turn_damage[turn]
+        wiped_by += wiped
+        dead_by += deaths_on_turn[turn]
+
+    # Fights still undecided: stalemates at the turn limit, otherwise pruned
+    undecided = max(0.0, enemy_standing * (1.0 - wiped_by))
+    if horizon == MAX_TURNS and enemy_standing >= prune:
+        stalemate, pruned = undecided, 0.0
+        expected_deaths += enemy_standing * (dead_by - size * wiped_by)
+    else:
+        stalemate, pruned = 0.0, undecided
+    pruned += deviation
+    return CombatOdds(win, wipe, stalemate, pruned, expected_turns, expected_damage,
+                      expected_deaths, len(wipe_on))
+
+
+def _convolve(a: Dict[int, float], b: Dict[int, float], limit: int) -> Dict[int, float]:
+    """Distribution of the sum of two independent variables, up to limit."""
+    result: Dict[int, float] = {}
+    for x, p in a.items():
+        for y, q in b.items():
+            if x + y <= limit:
+                result[x + y] = result.get(x + y, 0.0) + p * q
+    return result
+
+
+def _solve_joint(enemy: Enemy, party: Party, policy: Policy,
+                 strikes: Dict[int, float], prune: float) -> CombatOdds:
+    """
+    Solve a fight over the joint (enemy, party) state space.
+
+    Healing makes a player's move depend on their health, which ties the
+    enemy's fate to the party's, so the chain cannot be split up.
+    """
+    size, max_hp, attack, defense = party
+    action, heal_below = policy
+
+    enemy_hits = {guard: list(_enemy_hits(enemy, guard).items())
+                  for guard in (defense, defense + DEFEND_BONUS)}
+    strike_moves = list(strikes.items())
+
+    moves_cache: Dict[int, List[Tuple[float, int, int, list]]] = {}
+
+    def moves(hp: int) -> List[Tuple[float, int, int, list]]:
+        """(probability, damage to enemy, acting HP, enemy hits) for each move at this HP."""
+        cached = moves_cache.get(hp)
+        if cached is None:
+            if action == 'heal' or hp < heal_below:
+                cached = [(1.0, 0, min(max_hp, hp + HEAL_AMOUNT), enemy_hits[defense])]
+            elif action == 'defend':
+                cached = [(1.0, 0, hp, enemy_hits[defense + DEFEND_BONUS])]
+            else:
+                cached = [(p, damage, hp, enemy_hits[defense]) for damage, p in strike_moves]
+            moves_cache[hp] = cached
+        return cached
+
+    states: Dict[Tuple[int, Tuple[int, ...]], float] = {(enemy.health, (max_hp,) * size): 1.0}
+    win = wipe = pruned = 0.0
+    expected_turns = expected_damage = expected_deaths = 0.0
+    most_states = 1
+
+    for turn in range(1, MAX_TURNS + 1):
+        if not states:
+            break
+        following: Dict[Tuple[int, Tuple[int, ...]], float] = {}
+        for (enemy_hp, party_hp), p in states.items():
+            acting, rest = party_hp[0], party_hp[1:]
+            for p_move, dealt, hp, hits in moves(acting):
+                q = p * p_move
+                left = enemy_hp - dealt
+                if left <= 0:
+                    win += q
+                    expected_turns += q * turn
+                    expected_deaths += q * (size - len(party_hp))
+                    continue
+                for taken, p_hit in hits:
+                    r = q * p_hit
+                    if taken >= hp:
+                        expected_damage += r * hp
+                        if not rest:
+                            wipe += r
+                            expected_turns += r * turn
+                            expected_deaths += r * size
+                            continue
+                        key = (left, rest)
+                    else:
+                        expected_damage += r * taken
+                        key = (left, rest + (hp - taken,))
+                    following[key] = following.get(key, 0.0) + r
+
+        states = {}
+        for key, p in following.items():
+            if p < prune:
+                pruned += p
+            else:
+                states[key] = p
+        most_states = max(most_states, len(states))
+
+    stalemate = sum(states.values())
+    # Fights that never end still count their fallen players
+    expected_deaths += sum(p * (size - len(party_hp)) for (_, party_hp), p in states.items())
+    return CombatOdds(win, wipe, stalemate, pruned, expected_turns, expected_damage,
+                      expected_deaths, most_states)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute exact combat odds for a Json2RPGDesu story.")
+    parser.add_argument('--story', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'story.json'),
+                        help="story file to analyse")
+    parser.add_argument('--encounter', help="only solve the fights in this scene")
+    parser.add_argument('--policy', type=Policy.parse, default=Policy(),
+                        help="ACTION[:HEAL_BELOW], e.g. 'special:40' (default: attack)")
+    defaults = Party()
+    parser.add_argument('--players', type=int, default=defaults.size, help="party size (default: 4)")
+    parser.add_argument('--health', type=int, default=defaults.health, help="health of each player")
+    parser.add_argument('--attack', type=int, default=defaults.attack, help="attack of each player")
+    parser.add_argument('--defense', type=int, default=defaults.defense, help="defense of each player")
+    parser.add_argument('--prune', type=float, default=PRUNE, help="drop states less likely than this")
+    args = parser.parse_args()
+
+    story = load_story_file(args.story)
+    party = Party(args.players, args.health, args.attack, args.defense)
+    print(f"Policy {args.policy}, {party.size} players ({party.health} HP, ATK {party.attack}, "
+          f"DEF {party.defense})\n")
+    print(f"{'Encounter':<50} {'Win%':>9} {'Wipe%':>9} {'Turns':>7} {'Damage':>8} {'Deaths':>7} {'ms':>7}")
+
+    for scene_id, index, enemy in encounters(story):
+        if args.encounter and scene_id != args.encounter:
+            continue
+        started = time.perf_counter()
+        odds = solve(enemy, party, args.policy, args.prune)
+        elapsed = (time.perf_counter() - started) * 1000
+        label = f"{scene_id}#{index + 1} {enemy.name}"
+        decided = odds.win + odds.wipe
+        turns = f"{odds.expected_turns / decided:.2f}" if decided else '-'
+        print(f"{label:<50} {odds.win:>9.4%} {odds.wipe:>9.4%} {turns:>7} "
+              f"{odds.expected_damage:>8.2f} {odds.expected_deaths:>7.3f} {elapsed:>7.1f}")
+        if odds.stalemate or odds.pruned > args.prune:
+            print(f"{'':<50} stalemate {odds.stalemate:.4%}, pruned {odds.pruned:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Json2RPGDesu - Timed Status Effects
+
+This module keeps track of status effects that last for a number of turns:
+poison and regeneration that tick every turn, and stat modifiers such as the
+defense bonus of the 'defend' combat action. A turn passes whenever a player
+makes a plain choice or takes a combat action.
+
+Every active status sits in a priority queue keyed on the turn it next needs
+attention: its next tick for poison and regeneration, its expiry for a stat
+modifier. At the end of a turn only the statuses due that turn are popped,
+so a long-running buff costs nothing until the turn it runs out, however
+many statuses the party carries. A stat modifier added without a turn
+count, like the defense bonus, is never queued and lasts until remove()
+lifts it. Stat modifiers change the roster's stat columns when applied and
+undo the change on expiry, so combat rolls read plain columns and never
+look at statuses.
+
+Status types are registered once with their stacking rule:
+- refresh: a player has at most one; reapplying keeps the larger amount and
+  the later expiry
+- stack: every application is a separate status with its own expiry
+
+Nothing here prints; the board returns (kind, data) pairs that the engine
+turns into Events.
+
+Key Features:
+- Turn-keyed priority queue with lazy removal of replaced entries
+- Poison and regeneration ticks, temporary stat modifiers
+- Refresh and stack rules per status type
+- Snapshots relative to the current turn, for saves and state keys
+
+Classes:
+    StatusType: A registered status
+    Status: One status on one player
+    StatusBoard: Active statuses of a party and their schedule
+
+Functions:
+    register_status: Add a status type to the registry
+
+Dependencies:
+    - heapq: For the turn-keyed priority queue
+    - typing: For type hints
+"""
+
+import heapq
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+STACK_REFRESH = 'refresh'
+STACK_ADD = 'stack'
+
+# Status messages name at most this many players, then just count them
+NAMES_SHOWN = 3
+
+
+class StatusType(NamedTuple):
+    """
+    A registered status.
+
+    stat is the roster column raised by the amount while the status lasts,
+    tick is 'damage' or 'heal' for statuses that act every turn. Statuses
+    with no tick_message or expire_message are not announced.
+    """
+    name: str
+    label: str
+    stacking: str
+    stat: Optional[str] = None
+    tick: Optional[str] = None
+    tick_message: str = ''
+    expire_message: str = ''
+
+    def describe(self, data: Dict) -> str:
+        """Message for a 'status_tick' or 'status_expired' event of this type."""
+        players = data['players']
+        names = ', '.join(players) if len(players) <= NAMES_SHOWN else f"{len(players)} heroes"
+        message = self.tick_message if 'amount' in data else self.expire_message
+        return message.format(**dict(data, players=names))
+
+
+STATUS_TYPES: Dict[str, StatusType] = {}
+
+
+def register_status(status_type: StatusType):
+    """
+    Add a status type to the registry.
+
+    Args:
+        status_type: The status type, keyed by its name
+    """
+    STATUS_TYPES[status_type.name] = status_type
+
+
+class Status:
+    """
+    One status on one player.
+
+    Attributes:
+        kind (str): Registered status name
+        player (int): Index of the affected player
+        amount (int): Stat bonus, or damage/healing per tick
+        expires (Optional[int]): Last turn the status is active, or None until removed
+        due (Optional[int]): Turn its queue entry is for; other entries for it are stale
+        active (bool): False once the status has expired
+    """
+
+    __slots__ = ('kind', 'player', 'amount', 'expires', 'due', 'active')
+
+    def __init__(self, kind: str, player: int, amount: int, expires: Optional[int]):
+        self.kind = kind
+        self.player = player
+        self.amount = amount
+        self.expires = expires
+        self.due = expires
+        self.active = True
+
+    def __str__(self):
+        return f"{STATUS_TYPES[self.kind].label} {self.amount}"
+
+    def __repr__(self):
+        return f"Status({self.kind!r}, {self.player}, {self.amount}, expires={self.expires})"
+
+
+class StatusBoard:
+    """
+    Active statuses of a party and their schedule.
+
+    The statuses themselves are listed per player in the roster's
+    status_effects column; the board holds the queue deciding when each
+    of them next needs attention.
+
+    Attributes:
+        turn (int): Number of the current turn
+    """
+
+    __slots__ = ('turn', '_queue', '_seq')
+
+    def __init__(self):
+        self.turn = 0
+        self._queue: List[Tuple[int, int, Status]] = []
+        self._seq = 0
+
+    def __len__(self) -> int:
+        """Number of queue entries, stale ones included."""
+        return len(self._queue)
+
+    def _schedule(self, status: Status, due: int):
+        status.due = due
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, status))
+
+    def _expiry(self, turns: Optional[int]) -> Optional[int]:
+        return None if turns is None else self.turn + max(1, turns) - 1
+
+    def add(self, roster, players: Sequence[int], kind: str, amount: int, turns: Optional[int]):
+        """
+        Put a status on players, starting this turn.
+
+        Args:
+            roster: The party (engine.Roster)
+            players: Indices of the affected players
+            kind: Registered status name
+            amount: Stat bonus, or damage/healing per tick
+            turns: Number of turns the status lasts, at least 1; None keeps
+                it until remove() lifts it
+        """
+        status_type = STATUS_TYPES[kind]
+        expires = self._expiry(turns)
+        column = getattr(roster, status_type.stat) if status_type.stat else None
+        for player in players:
+            effects = roster.status_effects[player]
+            if status_type.stacking == STACK_REFRESH:
+                current = next((s for s in effects if s.kind == kind), None)
+                if current is not None:
+                    if column is not None and amount > current.amount:
+                        column[player] += amount - current.amount
+                    current.amount = max(current.amount, amount)
+                    if current.expires is not None and (expires is None or expires > current.expires):
+                        current.expires = expires
+                        if status_type.tick is None:
+                            if expires is None:
+                                current.due = None  # Its queued expiry goes stale
+                            else:
+                                self._schedule(current, expires)
+                    continue
+            status = Status(kind, player, amount, expires)
+            effects.append(status)
+            if column is not None:
+                column[player] += amount
+            if status_type.tick or expires is not None:
+                self._schedule(status, self.turn if status_type.tick else expires)
+
+    def remove(self, roster, player: int, kind: str) -> bool:
+        """
+        End a status of a player before it expires, without an expiry message.
+
+        Args:
+            roster: The party (engine.Roster)
+            player: Index of the player
+            kind: Registered status name
+
+        Returns:
+            bool: Whether the player had the status
+        """
+        effects = roster.status_effects[player]
+        status = next((s for s in effects if s.kind == kind), None)
+        if status is None:
+            return False
+        # Its queue entry goes stale and is skipped when it comes up
+        status.active = False
+        effects.remove(status)
+        stat = STATUS_TYPES[kind].stat
+        if stat:
+            getattr(roster, stat)[player] -= status.amount
+        return True
+
+    def end_turn(self, roster) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Tick and expire the statuses due this turn, then start the next turn.
+
+        Ticks and expiries are reported once per status type, listing the
+        players affected, so a large party does not flood the front ends.
+
+        Args:
+            roster: The party (engine.Roster)
+
+        Returns:
+            List[Tuple[str, Dict]]: 'status_tick', 'fallen' and 'status_expired'
+            event kinds and payloads
+        """
+        queue = self._queue
+        turn = self.turn
+        ticks: Dict[str, List[Tuple[int, int]]] = {}
+        expired: Dict[str, List[int]] = {}
+        fallen: List[int] = []
+        while queue and queue[0][0] <= turn:
+            due, _, status = heapq.heappop(queue)
+            if not status.active or status.due != due:
+                continue  # Replaced by a later entry
+            status_type = STATUS_TYPES[status.kind]
+            player = status.player
+            if status_type.tick and roster.alive[player]:
+                if status_type.tick == 'damage':
+                    health = max(0, roster.health[player] - status.amount)
+                    dealt = roster.health[player] - health
+                    roster.health[player] = health
+                    if health == 0:
+                        roster.alive[player] = 0
+                        fallen.append(player)
+                else:
+                    health = min(roster.max_health[player], roster.health[player] + status.amount)
+                    dealt = health - roster.health[player]
+                    roster.health[player] = health
+                if dealt:
+                    ticks.setdefault(status.kind, []).append((player, dealt))
+            if status.expires is None or due < status.expires:
+                self._schedule(status, due + 1)
+                continue
+            status.active = False
+            roster.status_effects[player].remove(status)
+            if status_type.stat:
+                getattr(roster, status_type.stat)[player] -= status.amount
+            expired.setdefault(status.kind, []).append(player)
+        self.turn = turn + 1
+
+        results = []
+        for kind, hits in ticks.items():
+            if STATUS_TYPES[kind].tick_message:
+                results.append(('status_tick', {
+                    'status': kind,
+                    'players': tuple(roster.names[p] for p, _ in hits),
+                    'amount': max(amount for _, amount in hits),
+                }))
+        results.extend(('fallen', {'player': roster.names[p]}) for p in fallen)
+        for kind, players in expired.items():
+            if STATUS_TYPES[kind].expire_message:
+                results.append(('status_expired', {
+                    'status': kind,
+                    'players': tuple(roster.names[p] for p in players),
+                }))
+        return results
+
+    def snapshot(self, roster) -> List[List[List]]:
+        """
+        Active statuses per player, with turns left counted from the current turn.
+
+        Args:
+            roster: The party (engine.Roster)
+
+        Returns:
+            List[List[List]]: [kind, amount, turns left] for each status of each player,
+                with None as turns left for a status that lasts until removed
+        """
+        return [[[s.kind, s.amount, None if s.expires is None else s.expires - self.turn + 1]
+                 for s in effects]
+                for effects in roster.status_effects]
+
+    def restore(self, roster, statuses: Sequence[Sequence[Sequence]]):
+        """
+        Re-add statuses from snapshot(), as if they were applied this turn.
+
+        The stat columns are expected to include the bonuses already, as
+        they do in a snapshot, so restoring does not apply them again.
+
+        Args:
+            roster: The party (engine.Roster)
+            statuses: [kind, amount, turns left] for each status of each player
+        """
+        for player, entries in enumerate(statuses):
+            for kind, amount, turns in entries:
+                status_type = STATUS_TYPES[kind]
+                status = Status(kind, player, amount, self._expiry(turns))
+                roster.status_effects[player].append(status)
+                if status_type.tick or status.expires is not None:
+                    self._schedule(status, self.turn if status_type.tick else status.expires)
+
+
+register_status(StatusType('defending', 'Defending', STACK_REFRESH, stat='defense'))
+register_status(StatusType('fortified', 'Fortified', STACK_REFRESH, stat='defense',
+                           expire_message="{players}'s extra defense wore off."))
+register_status(StatusType('enraged', 'Enraged', STACK_REFRESH, stat='attack',
+                           expire_message="{players} calmed down."))
+register_status(StatusType('poison', 'Poisoned', STACK_ADD, tick='damage',
+                           tick_message="{players} took {amount} poison damage! (×﹏×)",
+                           expire_message="The poison wore off for {players}. (´ω｀)"))
+register_status(StatusType('regen', 'Regenerating', STACK_ADD, tick='heal',
+                           tick_message="{players} regenerated {amount} HP! (✿◠‿◠)",
+                           expire_message="{players} stopped regenerating."))
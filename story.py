@@ -0,0 +1,935 @@
+"""
+Json2RPGDesu - Story Compiler
+
+This module turns a story loaded from JSON into an immutable, integer-indexed
+scene table. Scene references (next_scene, success, failure, vote option
+scenes, success_scene and failure_scene) are resolved to scene indices once at
+load time, so the engine never hashes scene IDs or probes raw dicts during
+play, and links to missing scenes are reported before the game starts.
+
+Story text is compiled into Templates at the same time, and a per-session
+TextCache renders each scene once per (scene, current player) pair.
+
+Very large stories can be opened lazily with open_story_file instead. The
+file is memory-mapped and a sidecar index records the byte range of every
+scene, along with the links, placeholders and path lengths that need the
+whole story. Scenes are then decoded only when play reaches them, and an
+LRU cache holds the recently used ones, so startup time and memory stay
+flat however big the story grows. The index is a binary file keyed by the
+story's content hash and modification time, so it is rebuilt exactly when
+the story changes.
+
+Key Features:
+- Compact, typed records for scenes, choices, enemies and voting blocks
+- Scene references resolved to indices at load time
+- Choice effects compiled to opcodes at load time
+- Choice requirements compiled to predicates, story flags numbered as bits
+- Item catalog compiled to an indexed table, item references resolved to indices
+- Dangling scene links collected (or rejected in strict mode)
+- Precompiled {placeholder} templates with a per-session render cache
+- Longest remaining path from every scene, for O(1) progress lookups
+- Lazy loading through a scene offset index and an LRU scene cache
+
+Classes:
+    Template: Story text split into literal and placeholder segments
+    Enemy: Stats of one enemy in a combat encounter
+    VoteOption: One option of a group vote
+    VotingSystem: A group vote between several options
+    RequiresVote: A yes/no agreement vote
+    Choice: One choice offered in a scene
+    Scene: One compiled scene
+    CompiledStory: The compiled scene table
+    LazyScenes: Scene table decoded from a story file on demand
+    RenderedScene: Scene text with placeholders filled in
+    TextCache: Per-session cache of rendered scene text
+
+Dependencies:
+    - effects: For compiling choice effects to opcodes
+    - conditions: For compiling choice requirements and flag changes
+    - items: For compiling the item catalog and item references
+    - json: For reading story files
+    - hashlib: For keying sidecar indexes on the story's content (imported on use)
+    - marshal: For the binary sidecar index format
+    - mmap: For mapping large story files without reading them
+    - os: For checking whether a sidecar index is stale
+    - re: For finding placeholders and scanning story files
+    - collections: For the LRU scene cache
+    - typing: For type hints
+"""
+
+import json
+import marshal
+import mmap
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+from conditions import Condition, FlagTable, compile_condition, compile_flag_changes
+from effects import EffectOp, compile_effect
+from items import ItemCatalog, compile_item_counts, compile_items
+
+# Scene index used for the reserved 'end' scene
+END = -1
+END_SCENE_ID = "end"
+
+# Top-level keys of a story file that are not scenes
+SECTIONS = frozenset(('config', 'items', END_SCENE_ID))
+
+# Choice kinds, in the order of precedence used when a choice has several keys
+CHOICE_NEXT = 0
+CHOICE_COMBAT = 1
+CHOICE_VOTE = 2
+CHOICE_AGREE = 3
+
+_PLACEHOLDER = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+_PLAYER_PLACEHOLDER = re.compile(r'player([0-9]+)')
+
+# JSON strings and brackets, enough to find where each top-level value starts and ends
+_JSON_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]', re.DOTALL)
+
+# Decoded scenes kept in memory by a lazily opened story
+SCENE_CACHE_SIZE = 512
+INDEX_VERSION = 4
+
+
+class Template:
+    """
+    Story text split into literal and placeholder segments.
+
+    Segments alternate between literal text (even positions) and placeholder
+    names (odd positions), so rendering is a single join.
+
+    Attributes:
+        source (str): The original text
+        segments (Tuple[str]): Literal and placeholder segments
+        names (FrozenSet[str]): Placeholder names used in the text
+    """
+
+    __slots__ = ('source', 'segments', 'names')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.segments = tuple(_PLACEHOLDER.split(source))
+        self.names: FrozenSet[str] = frozenset(self.segments[1::2])
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        Fill in the placeholders.
+
+        Args:
+            values: Placeholder name to replacement text
+
+        Returns:
+            str: The rendered text; unknown placeholders are left untouched
+        """
+        if not self.names:
+            return self.source
+        parts = list(self.segments)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = values[name] if name in values else f'{{{name}}}'
+        return ''.join(parts)
+
+    def __repr__(self):
+        return f'Template({self.source!r})'
+
+
+class Enemy(NamedTuple):
+    """
+    Stats of one enemy in a combat encounter.
+
+    An enemy with a speed takes its own turns on the initiative queue; an
+    enemy without one strikes back at every player who acts.
+    """
+    name: str
+    health: int
+    attack: int
+    defense: int
+    color: str
+    speed: Optional[int] = None
+
+
+class VoteOption(NamedTuple):
+    """
+    One option of a group vote. effect is compiled, empty for none; sets
+    and clears are the flag bits the option turns on and off if it wins.
+    """
+    text: Template
+    scene: int
+    effect: Tuple[EffectOp, ...]
+    sets: int = 0
+    clears: int = 0
+
+
+class VotingSystem(NamedTuple):
+    """
+    A group vote between several options.
+
+    timeout is in minutes, None to wait for every ballot. default is the
+    option index counted for players who do not vote in time, None to
+    count them as abstaining.
+    """
+    type: str
+    options: Tuple[VoteOption, ...]
+    tie_breaker: str
+    timeout: Optional[float] = None
+    default: Optional[int] = None
+
+
+class RequiresVote(NamedTuple):
+    """
+    A yes/no agreement vote. min_players is None when the whole party must agree.
+
+    timeout is in minutes, None to wait for every ballot; default is the
+    answer counted for players who do not answer in time.
+    """
+    min_players: Optional[int]
+    timeout: Optional[float]
+    success_scene: int
+    failure_scene: int
+    default: bool = False
+
+
+class Choice(NamedTuple):
+    """
+    One choice offered in a scene.
+
+    Only the fields matching the choice kind are set: next_scene for plain
+    choices, combat/success/failure for fights, voting for group votes and
+    requires_vote for agreement votes. combat lists every enemy of the
+    fight. effect holds compiled effect opcodes, empty when the choice has
+    no effect. requires is the compiled condition for offering the choice,
+    None if it is always offered; sets and clears are the flag bits taking
+    the choice turns on and off. gives and takes are (catalog index,
+    count) pairs moved into and out of the chooser's inventory, and uses
+    is the catalog index of an item the chooser uses, None for none;
+    requires also checks the chooser carries whatever the choice takes
+    or uses.
+    """
+    text: Template
+    kind: int
+    next_scene: int
+    combat: Optional[Tuple[Enemy, ...]]
+    success: int
+    failure: int
+    voting: Optional[VotingSystem]
+    requires_vote: Optional[RequiresVote]
+    effect: Tuple[EffectOp, ...]
+    requires: Optional[Condition] = None
+    sets: int = 0
+    clears: int = 0
+    gives: Tuple[Tuple[int, int], ...] = ()
+    takes: Tuple[Tuple[int, int], ...] = ()
+    uses: Optional[int] = None
+
+
+class Scene(NamedTuple):
+    """One compiled scene."""
+    id: str
+    title: str
+    text: Template
+    color: str
+    choices: Tuple[Choice, ...]
+
+
+class CompiledStory:
+    """
+    The compiled scene table of a story.
+
+    Attributes:
+        scenes (Tuple[Scene]): Scenes by index; scenes missing from the source come last
+        index (Dict[str, int]): Scene ID to scene index
+        scene_count (int): Number of scenes defined in the source
+        dangling (Tuple[Tuple[str, str]]): (scene ID, missing target) for every broken link
+        config (Dict): The story's config section
+        placeholders (FrozenSet[str]): Every placeholder name used in the story
+        remaining (Tuple[int]): Most scenes still to enter from each scene before the story ends
+        ids (Tuple[str]): Scene ID of each scene index
+        flags (FlagTable): Bit number of every flag the story uses
+        items (ItemCatalog): Every item of the story, by catalog index
+    """
+
+    __slots__ = ('scenes', 'index', 'scene_count', 'dangling', 'config', 'placeholders', 'remaining', 'ids',
+                 'flags', 'items')
+
+    def __init__(self, scenes: Sequence[Scene], index: Dict[str, int], scene_count: int,
+                 dangling: Tuple[Tuple[str, str], ...], config: Dict,
+                 placeholders: Optional[FrozenSet[str]] = None, remaining: Optional[Tuple[int, ...]] = None,
+                 flags: Optional[FlagTable] = None, items: Optional[ItemCatalog] = None):
+        """
+        Initialize a compiled story.
+
+        Args:
+            scenes: Scenes by index, a tuple or a LazyScenes table
+            index: Scene ID to scene index
+            scene_count: Number of scenes defined in the source
+            dangling: (scene ID, missing target) for every broken link
+            config: The story's config section
+            placeholders: Placeholder names, worked out from the scenes if not given
+            remaining: Remaining path lengths, worked out from the scenes if not given
+            flags: Flags numbered while compiling the scenes, none if not given
+            items: The story's item catalog, none if not given
+        """
+        self.scenes = scenes
+        self.index = index
+        self.scene_count = scene_count
+        self.dangling = dangling
+        self.config = config
+        ids = [''] * len(index)
+        for scene_id, scene_index in index.items():
+            ids[scene_index] = scene_id
+        self.ids = tuple(ids)
+        if placeholders is None:
+            placeholders = frozenset().union(*(_placeholders(scene) for scene in scenes))
+        self.placeholders = placeholders
+        if remaining is None:
+            remaining = _remaining_scenes([_successors(scene) for scene in scenes])
+        self.remaining = remaining
+        self.flags = FlagTable() if flags is None else flags
+        self.items = ItemCatalog() if items is None else items
+
+    def scene_index(self, scene_id: str) -> int:
+        """
+        Look up the index of a scene.
+
+        Args:
+            scene_id: ID of the scene
+
+        Returns:
+            int: Scene index, END for the 'end' scene
+
+        Raises:
+            KeyError: If the story has no such scene
+        """
+        if scene_id == END_SCENE_ID:
+            return END
+        return self.index[scene_id]
+
+    def progress(self, scene_index: int, visited: int) -> float:
+        """
+        How far through the story a session is.
+
+        Branches a session did not take are ignored: progress compares the
+        scenes visited so far with the longest way the story could still
+        go from the current scene, counting the choice that ends the story
+        as one more step, so only the end itself shows as complete.
+
+        Args:
+            scene_index: Index of the current scene, END once the story is over
+            visited: Number of scenes visited so far
+
+        Returns:
+            float: Progress between 0 and 1, below 1 until scene_index is END
+        """
+        if scene_index == END:
+            return 1.0
+        return visited / (visited + self.remaining[scene_index] + 1)
+
+    def scene_id(self, scene_index: int) -> str:
+        """
+        Look up the ID of a scene.
+
+        Args:
+            scene_index: Index of the scene
+
+        Returns:
+            str: Scene ID
+        """
+        if scene_index == END:
+            return END_SCENE_ID
+        return self.ids[scene_index]
+
+
+def _placeholders(scene: Scene) -> FrozenSet[str]:
+    """Placeholder names used anywhere in a scene."""
+    names = set(scene.text.names)
+    for choice in scene.choices:
+        names |= choice.text.names
+        if choice.voting:
+            for option in choice.voting.options:
+                names |= option.text.names
+    return frozenset(names)
+
+
+def _successors(scene: Scene) -> List[int]:
+    """Scenes a scene can lead to, END included."""
+    targets = []
+    for choice in scene.choices:
+        if choice.kind == CHOICE_COMBAT:
+            # Losing a fight means the whole party fell, so the failure
+            # scene is never entered
+            targets.append(choice.success)
+        elif choice.kind == CHOICE_VOTE:
+            targets.extend(option.scene for option in choice.voting.options)
+        elif choice.kind == CHOICE_AGREE:
+            targets.append(choice.requires_vote.success_scene)
+            targets.append(choice.requires_vote.failure_scene)
+        else:
+            targets.append(choice.next_scene)
+    return targets
+
+
+def _remaining_scenes(successors: Sequence[List[int]]) -> Tuple[int, ...]:
+    """
+    Longest path, in scenes entered, from every scene to the end of the story.
+
+    Args:
+        successors: Scenes each scene can lead to, by scene index
+
+    Links that loop back to a scene still being explored are ignored, so a
+    cyclic story gets the longest path that does not repeat a scene along
+    the way the search happened to take.
+    """
+    remaining = [-1] * len(successors)  # -1: not reached yet, -2: being explored
+    for root in range(len(successors)):
+        if remaining[root] != -1:
+            continue
+        # Iterative depth-first search, so long stories cannot hit the recursion limit
+        remaining[root] = -2
+        stack = [(root, iter(successors[root]), 0)]
+        while stack:
+            index, targets, longest = stack[-1]
+            for target in targets:
+                if target == END or remaining[target] == -2:
+                    continue
+                if remaining[target] == -1:
+                    remaining[target] = -2
+                    stack[-1] = (index, targets, longest)
+                    stack.append((target, iter(successors[target]), 0))
+                    break
+                longest = max(longest, remaining[target] + 1)
+            else:
+                stack.pop()
+                remaining[index] = longest
+                if stack:
+                    parent, parent_targets, parent_longest = stack[-1]
+                    stack[-1] = (parent, parent_targets, max(parent_longest, longest + 1))
+    return tuple(remaining)
+
+
+def compile_story(story_data: Dict, strict: bool = False) -> CompiledStory:
+    """
+    Compile raw story data into an indexed scene table.
+
+    Links to scenes that do not exist are recorded in CompiledStory.dangling
+    and resolved to empty placeholder scenes that end the game, which is how
+    the engine has always treated them.
+
+    Args:
+        story_data: Story data loaded from JSON
+        strict: Raise instead of recording dangling links
+
+    Returns:
+        CompiledStory: The compiled story
+
+    Raises:
+        ValueError: If a choice has a malformed requirement or item reference,
+            the item catalog is malformed, or in strict mode, if any scene link
+            points to a missing scene
+    """
+    items = compile_items(story_data.get('items'))
+    scene_ids = [key for key in story_data if key not in SECTIONS]
+    index = {scene_id: i for i, scene_id in enumerate(scene_ids)}
+    missing: List[str] = []
+    dangling: List[Tuple[str, str]] = []
+
+    def resolve(source: str, target: Any) -> int:
+        target = END_SCENE_ID if target is None else target
+        if target == END_SCENE_ID:
+            return END
+        if target not in index:
+            dangling.append((source, target))
+            index[target] = len(scene_ids) + len(missing)
+            missing.append(target)
+        return index[target]
+
+    flags = FlagTable()
+    scenes = [_compile_scene(scene_id, story_data[scene_id], resolve, flags.bit, items) for scene_id in scene_ids]
+
+    if strict and dangling:
+        links = ', '.join(f"{source} -> {target}" for source, target in dangling)
+        raise ValueError(f"Story links to missing scenes: {links}")
+
+    scenes.extend(_missing_scene(scene_id) for scene_id in missing)
+    return CompiledStory(tuple(scenes), index, len(scene_ids), tuple(dangling), story_data.get('config', {}),
+                         flags=flags, items=items)
+
+
+def load_story_file(path: str, strict: bool = False) -> CompiledStory:
+    """
+    Read and compile a story JSON file.
+
+    Args:
+        path: Path to the story JSON file
+        strict: Raise instead of recording dangling links
+
+    Returns:
+        CompiledStory: The compiled story
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        json.JSONDecodeError: If the file is not valid JSON
+        ValueError: In strict mode, if any scene link points to a missing scene
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return compile_story(json.load(file), strict)
+
+
+class LazyScenes:
+    """
+    Scene table decoded from a story file on demand.
+
+    Each scene is parsed from its byte range of the memory-mapped file the
+    first time it is looked up. The most recently used scenes are kept in
+    an LRU cache, so memory use does not grow with the size of the story.
+
+    Attributes:
+        cache_size (int): Decoded scenes kept in memory
+    """
+
+    __slots__ = ('cache_size', '_data', '_ids', '_spans', '_index', '_flags', '_items', '_cache')
+
+    def __init__(self, data: mmap.mmap, ids: Sequence[str], spans: Sequence[Tuple[int, int]],
+                 index: Dict[str, int], flags: FlagTable, items: ItemCatalog,
+                 cache_size: int = SCENE_CACHE_SIZE):
+        """
+        Initialize the scene table.
+
+        Args:
+            data: Memory-mapped story file
+            ids: Scene ID of each scene index, missing scenes included
+            spans: (start, end) byte range of each scene defined in the file
+            index: Scene ID to scene index, missing scenes included
+            flags: Every flag of the story, numbered when it was indexed
+            items: The story's item catalog
+            cache_size: Decoded scenes kept in memory
+        """
+        self.cache_size = cache_size
+        self._data = data
+        self._ids = ids
+        self._spans = spans
+        self._index = index
+        self._flags = flags
+        self._items = items
+        self._cache: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        for scene_index in range(len(self._ids)):
+            yield self[scene_index]
+
+    def __getitem__(self, scene_index):
+        if isinstance(scene_index, slice):
+            return tuple(self[i] for i in range(*scene_index.indices(len(self._ids))))
+        if scene_index < 0:
+            scene_index += len(self._ids)
+        cache = self._cache
+        scene = cache.get(scene_index)
+        if scene is not None:
+            cache.move_to_end(scene_index)
+            return scene
+
+        scene_id = self._ids[scene_index]
+        if scene_index < len(self._spans):
+            start, end = self._spans[scene_index]
+            scene = _compile_scene(scene_id, json.loads(self._data[start:end]), self._resolve,
+                                   self._flags.bits.__getitem__, self._items)
+        else:
+            scene = _missing_scene(scene_id)
+        cache[scene_index] = scene
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return scene
+
+    def _resolve(self, source: str, target: Any) -> int:
+        target = END_SCENE_ID if target is None else target
+        if target == END_SCENE_ID:
+            return END
+        return self._index[target]
+
+
+def open_story_file(path: str, strict: bool = False, cache_size: int = SCENE_CACHE_SIZE) -> CompiledStory:
+    """
+    Open a story JSON file for lazy, indexed access.
+
+    The first time a story is opened, every scene is decoded once, one at a
+    time, to check it and work out the data that depends on the whole story.
+    That data and the byte range of each scene are cached in a binary
+    sidecar index (path + '.idx') keyed by the file's content hash and
+    modification time. Later launches read only that index, and opening the
+    same unchanged file again in one process reuses the story already open.
+
+    Args:
+        path: Path to the story JSON file
+        strict: Raise instead of recording dangling links
+        cache_size: Decoded scenes kept in memory
+
+    Returns:
+        CompiledStory: The story, with scenes decoded on demand
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        json.JSONDecodeError: If the file is not valid JSON
+        ValueError: If the file is not a JSON object, or in strict mode, if any
+            scene link points to a missing scene
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    opened = _opened_stories.get((path, cache_size))
+    if opened is not None and opened[0] == stamp:
+        story = opened[1]
+    else:
+        story = _open_indexed(path, stamp, cache_size)
+        _opened_stories[(path, cache_size)] = (stamp, story)
+
+    if strict and story.dangling:
+        links = ', '.join(f"{source} -> {target}" for source, target in story.dangling)
+        raise ValueError(f"Story links to missing scenes: {links}")
+    return story
+
+
+# Stories already opened in this process: (path, cache size) -> (size and mtime, story)
+_opened_stories: Dict[Tuple[str, int], Tuple[Tuple[int, int], CompiledStory]] = {}
+
+
+def _open_indexed(path: str, stamp: Tuple[int, int], cache_size: int) -> CompiledStory:
+    """Map a story file and load or build its sidecar index."""
+    with open(path, 'rb') as file:
+        if not stamp[0]:
+            raise json.JSONDecodeError("Expecting value", "", 0)
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    index_path = f"{path}.idx"
+    story_index = None
+    try:
+        with open(index_path, 'rb') as file:
+            story_index = marshal.load(file)
+        if story_index["version"] != INDEX_VERSION:
+            story_index = None
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        story_index = None
+
+    rewrite = story_index is None or story_index["stamp"] != stamp
+    if story_index is not None and story_index["stamp"] != stamp:
+        # Touched, copied or checked out again: only rebuild if the content changed.
+        # hashlib loads OpenSSL, so it is only imported when a hash is needed
+        import hashlib
+        if story_index["hash"] != hashlib.blake2b(data).hexdigest():
+            story_index = None
+    if story_index is None:
+        story_index = _index_story(data)
+        story_index["version"] = INDEX_VERSION
+    story_index["stamp"] = stamp
+    if rewrite:
+        try:
+            temp_path = f"{index_path}.tmp"
+            with open(temp_path, 'wb') as file:
+                marshal.dump(story_index, file)
+            os.replace(temp_path, index_path)
+        except OSError:
+            pass  # Read-only location: the index is simply rebuilt next time
+
+    ids = story_index["ids"]
+    index = {scene_id: i for i, scene_id in enumerate(ids)}
+    flags = FlagTable(story_index["flags"])
+    items = compile_items(story_index["items"])
+    scenes = LazyScenes(data, ids, story_index["spans"], index, flags, items, cache_size)
+    return CompiledStory(scenes, index, len(story_index["spans"]), story_index["dangling"],
+                         story_index["config"], story_index["placeholders"], story_index["remaining"], flags,
+                         items)
+
+
+def _scan_top_level(data) -> Dict[str, Tuple[int, int]]:
+    """
+    Find the byte range of every top-level value of a JSON object.
+
+    Only strings and brackets are tokenized, so nothing is decoded except
+    the keys themselves.
+    """
+    spans: Dict[str, Tuple[int, int]] = {}
+    depth = 0
+    key = None
+    key_end = start = 0
+    for match in _JSON_TOKEN.finditer(data):
+        first = match.group()[0]
+        if depth == 0 and first != 0x7b:  # anything but the opening brace
+            raise ValueError("Story file is not a JSON object of scenes")
+        if depth == 1 and key is not None and data[key_end:match.start()].strip() != b':':
+            raise ValueError(f"Story entry {key!r} is not a JSON object")
+        if first == 0x22:  # a string
+            if depth != 1:
+                continue
+            if key is None:
+                key = json.loads(match.group())
+                key_end = match.end()
+                continue
+            spans[key] = (match.start(), match.end())
+            key = None
+        elif first in b'{[':
+            depth += 1
+            if depth == 2:
+                start = match.start()
+        else:
+            depth -= 1
+            if depth == 1:
+                spans[key] = (start, match.end())
+                key = None
+    if depth != 0 or key is not None:
+        raise ValueError("Story file is not a JSON object of scenes")
+    return spans
+
+
+def _index_story(data) -> Dict:
+    """Work out the sidecar index of a story file, decoding one scene at a time."""
+    import hashlib
+    spans = _scan_top_level(data)
+    scene_ids = [key for key in spans if key not in SECTIONS]
+    index = {scene_id: i for i, scene_id in enumerate(scene_ids)}
+    missing: List[str] = []
+    dangling: List[Tuple[str, str]] = []
+
+    def resolve(source: str, target: Any) -> int:
+        target = END_SCENE_ID if target is None else target
+        if target == END_SCENE_ID:
+            return END
+        if target not in index:
+            dangling.append((source, target))
+            index[target] = len(scene_ids) + len(missing)
+            missing.append(target)
+        return index[target]
+
+    raw_items = None
+    if 'items' in spans:
+        start, end = spans['items']
+        raw_items = json.loads(data[start:end])
+    items = compile_items(raw_items)
+
+    names = set()
+    successors = []
+    flags = FlagTable()
+    for scene_id in scene_ids:
+        start, end = spans[scene_id]
+        scene = _compile_scene(scene_id, json.loads(data[start:end]), resolve, flags.bit, items)
+        names |= _placeholders(scene)
+        successors.append(_successors(scene))
+    successors.extend([] for _ in missing)
+
+    config = {}
+    if 'config' in spans:
+        start, end = spans['config']
+        config = json.loads(data[start:end])
+    return {
+        "ids": tuple(scene_ids + missing),
+        "spans": tuple(spans[scene_id] for scene_id in scene_ids),
+        "dangling": tuple(dangling),
+        "config": config,
+        "placeholders": frozenset(names),
+        "remaining": _remaining_scenes(successors),
+        "flags": tuple(flags.names),
+        "items": raw_items,
+        "hash": hashlib.blake2b(data).hexdigest(),
+    }
+
+
+def _compile_scene(scene_id: str, raw: Dict, resolve, bit, items: ItemCatalog) -> Scene:
+    description = raw.get("description", {})
+    if isinstance(description, dict):
+        text = description.get("text", "")
+        color = description.get("color", "")
+    else:
+        text, color = str(description), ""
+    choices = tuple(_compile_choice(scene_id, choice, resolve, bit, items) for choice in raw.get("choices", []))
+    return Scene(scene_id, raw.get("title", "Current Scene"), Template(text), color, choices)
+
+
+def _missing_scene(scene_id: str) -> Scene:
+    """Empty scene standing in for a link target the story never defines."""
+    return Scene(scene_id, "Current Scene", Template(""), "", ())
+
+
+def _compile_choice(scene_id: str, choice: Dict, resolve, bit, items: ItemCatalog) -> Choice:
+    text = Template(choice.get("text", ""))
+    effect = compile_effect(choice.get("effect"))
+    try:
+        gives = compile_item_counts(choice.get("gives"), items)
+        takes = compile_item_counts(choice.get("takes"), items)
+        uses = None if choice.get("uses") is None else items.resolve(choice["uses"])
+        if uses is not None and not items[uses].usable:
+            raise ValueError(f"Item {choice['uses']!r} has no effect to use")
+        # A choice taking or using items is only offered to players carrying them
+        needs = [{"item": items[item].id, "min": count} for item, count in takes]
+        if uses is not None:
+            needs.append({"item": choice["uses"]})
+        if choice.get("requires") is not None:
+            needs.insert(0, choice["requires"])
+        requires = compile_condition(needs[0] if len(needs) == 1 else needs or None, bit, items.resolve)
+        sets, clears = compile_flag_changes(choice.get("sets"), bit)
+    except ValueError as e:
+        raise ValueError(f"Scene {scene_id!r}: {e}") from None
+    gate = {'requires': requires, 'sets': sets, 'clears': clears, 'gives': gives, 'takes': takes, 'uses': uses}
+
+    if "combat" in choice:
+        stats = choice["combat"]
+        enemies = tuple(enemy for entry in stats.get("enemies", [stats]) for enemy in _compile_enemies(entry))
+        return Choice(text, CHOICE_COMBAT, END, enemies,
+                      resolve(scene_id, choice.get("success")), resolve(scene_id, choice.get("failure")),
+                      None, None, effect, **gate)
+
+    if "voting_system" in choice:
+        voting_system = choice["voting_system"]
+        options = tuple(
+            VoteOption(Template(option.get("text", "")), resolve(scene_id, option.get("scene")),
+                       compile_effect(option.get("effect")), *_flag_changes(scene_id, option, bit))
+            for option in voting_system.get("options", [])
+        )
+        default = voting_system.get("default")
+        if not (isinstance(default, int) and 1 <= default <= len(options)):
+            default = None
+        voting = VotingSystem(voting_system.get("type", "majority"), options,
+                              voting_system.get("tie_breaker", "random"),
+                              voting_system.get("timeout"),
+                              None if default is None else default - 1)
+        return Choice(text, CHOICE_VOTE, END, None, END, END, voting, None, effect, **gate)
+
+    if "requires_vote" in choice:
+        requires_vote = choice["requires_vote"]
+        agree = RequiresVote(
+            requires_vote.get("min_players"),
+            requires_vote.get("timeout"),
+            resolve(scene_id, requires_vote.get("success_scene")),
+            resolve(scene_id, requires_vote.get("failure_scene")),
+            bool(requires_vote.get("default", False)),
+        )
+        return Choice(text, CHOICE_AGREE, END, None, END, END, None, agree, effect, **gate)
+
+    return Choice(text, CHOICE_NEXT, resolve(scene_id, choice.get("next_scene")), None, END, END, None, None, effect,
+                  **gate)
+
+
+def _flag_changes(scene_id: str, raw: Dict, bit) -> Tuple[int, int]:
+    try:
+        return compile_flag_changes(raw.get("sets"), bit)
+    except ValueError as e:
+        raise ValueError(f"Scene {scene_id!r}: {e}") from None
+
+
+def _compile_enemies(stats: Dict) -> List[Enemy]:
+    """Enemies of one combat block entry; "count" adds numbered copies of it."""
+    speed = stats.get("speed")
+    if not (isinstance(speed, int) and not isinstance(speed, bool) and speed > 0):
+        speed = None
+    enemy = Enemy(
+        stats.get("name", "Enemy"),
+        stats.get("health", 50),
+        stats.get("attack", 8),
+        stats.get("defense", 5),
+        stats.get("color", ""),
+        speed,
+    )
+    count = stats.get("count", 1)
+    if not isinstance(count, int) or count <= 1:
+        return [enemy]
+    return [enemy._replace(name=f"{enemy.name} {number}") for number in range(1, count + 1)]
+
+
+class RenderedScene(NamedTuple):
+    """
+    Scene text with placeholders filled in.
+
+    Attributes:
+        text (str): Scene description
+        choices (Tuple[str]): Text of each choice
+        options (Tuple[Tuple[str]]): Vote option texts of each choice, empty for non-vote choices
+    """
+    text: str
+    choices: Tuple[str, ...]
+    options: Tuple[Tuple[str, ...], ...]
+
+
+class TextCache:
+    """
+    Per-session cache of rendered scene text.
+
+    Rendered scenes are keyed on (scene index, current player index), so
+    redrawing a scene costs a dict lookup. The cache is only dropped when the
+    roster changes.
+
+    Attributes:
+        story (CompiledStory): Story whose text is rendered
+        roster (Tuple[str]): Player names the cache was rendered for
+    """
+
+    __slots__ = ('story', 'roster', '_values', '_scenes')
+
+    def __init__(self, story: CompiledStory):
+        self.story = story
+        self.roster: Optional[Tuple[str, ...]] = None
+        self._values: Dict[str, str] = {}
+        self._scenes: Dict[Tuple[int, int], RenderedScene] = {}
+        self.set_roster(())
+
+    def set_roster(self, names: Sequence[str]):
+        """
+        Update the player names, dropping cached text if they changed.
+
+        Args:
+            names: Player names in turn order
+        """
+        names = tuple(names)
+        if names == self.roster:
+            return
+        self.roster = names
+        self._scenes.clear()
+        # Every playerN used by the story gets a value, blank past the party size
+        values = {}
+        for name in self.story.placeholders:
+            match = _PLAYER_PLACEHOLDER.fullmatch(name)
+            if match:
+                number = int(match.group(1))
+                values[name] = names[number - 1] if 0 < number <= len(names) else ''
+        self._values = values
+
+    def values(self, current_player: int) -> Dict[str, str]:
+        """
+        Placeholder values for a given current player.
+
+        Args:
+            current_player: Index of the current player
+
+        Returns:
+            Dict[str, str]: Placeholder name to replacement text
+        """
+        values = dict(self._values)
+        values['current_player'] = self.roster[current_player] if self.roster else ''
+        return values
+
+    def scene(self, scene_index: int, current_player: int) -> RenderedScene:
+        """
+        Render a scene's text, reusing earlier renders.
+
+        Args:
+            scene_index: Index of the scene
+            current_player: Index of the current player
+
+        Returns:
+            RenderedScene: The scene's description, choice and vote option texts
+        """
+        key = (scene_index, current_player)
+        rendered = self._scenes.get(key)
+        if rendered is None:
+            values = self.values(current_player)
+            scene = self.story.scenes[scene_index]
+            rendered = RenderedScene(
+                scene.text.render(values),
+                tuple(choice.text.render(values) for choice in scene.choices),
+                tuple(
+                    tuple(option.text.render(values) for option in choice.voting.options) if choice.voting else ()
+                    for choice in scene.choices
+                ),
+            )
+            self._scenes[key] = rendered
+        return rendered
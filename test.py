@@ -1,8 +1,10 @@
 """
 Json2RPGDesu - A Kawaii Text-Based RPG Engine
 
-This module implements a text-based RPG engine with a kawaii (cute) Japanese aesthetic.
-It supports multiple players, combat, voting systems, and branching storylines loaded from JSON files.
+This module implements the kawaii terminal front end of Json2RPGDesu.
+The game rules live in the headless engine (engine.py); this module reads
+player input, feeds it to the engine as actions and presents the resulting
+events with a kawaii (cute) Japanese aesthetic.
 
 Key Features:
 - Colorful text-based UI with kawaii emoticons and styling
@@ -10,40 +12,105 @@ Key Features:
 - Multi-player support with voting mechanics
 - Story branching based on player choices
 - Progress tracking and status displays
-- Save/load functionality (planned)
+- Autosave after every action and resume from the main menu
+- Every game recorded to last_game.jsonl for replay.py
 
 Classes:
-    Player: Represents a player character with stats and abilities
-    Game: Main game engine that handles story progression and game mechanics
+    Game: Terminal front end that drives an engine session
 
 Dependencies:
-    - colorama: For colored terminal output
-    - json: For loading story files
-    - random: For dice rolls and random selections
+    - engine: Headless game rules (Roster, Player, GameState, advance)
+    - clock: Pacing of animations and pauses (Clock)
+    - effects: Effect messages (EFFECTS)
+    - status: Status effect messages (STATUS_TYPES)
+    - story: Story compiler (open_story_file) and text templates
+    - render: Frame-buffered terminal output (Screen)
+    - savegame: Snapshot + journal save files (SaveFile)
+    - colorama: For colored terminal output (imported on first use)
+    - json: For story file errors
     - typing: For type hints
-    - os: For screen clearing
-    - time: For animations and delays
+    - os: For file paths
     - shutil: For terminal size detection
     - sys: For system operations
+    - time: For vote deadlines
 """
 
 import json
-import random
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import os
-import time
-from colorama import Fore, Style, init
 import shutil
-from time import sleep
 import sys
+import time
+
+from clock import Clock, INSTANT, REAL_TIME
+from effects import EFFECTS
+from engine import (
+    Action, Event, GameState, Player, Roster, new_game, advance, available_choices, default_ballots, usable_items,
+    ITEM_ACTION, PHASE_AGREE, PHASE_CHOOSE, PHASE_COMBAT, PHASE_OVER, PHASE_VOTE,
+)
+from render import Screen, wrap_text
+from savegame import SaveFile
+from status import STATUS_TYPES
+from story import CompiledStory, Template, TextCache, open_story_file
+
+
+class _Palette:
+    """colorama's Fore or Style, imported the first time a color is used."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, color: str) -> str:
+        import colorama
+        value = getattr(getattr(colorama, self._name), color)
+        setattr(self, color, value)
+        return value
+
+
+Fore = _Palette('Fore')
+Style = _Palette('Style')
+
+
+def _init_terminal():
+    """Initialize colorama right before the first output."""
+    from colorama import init
+    init(autoreset=True)
+
+
+# All terminal output goes through one frame buffer; the terminal is only
+# set up once something is actually shown
+screen = Screen(setup=_init_terminal)
 
-# Initialize colorama
-init(autoreset=True)
+SAVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'savegame.jsonl')
+RECORDING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_game.jsonl')
+
+PARTY_SIZE = 4
+
+# Color of each effect's message; effects not listed are shown uncolored
+EFFECT_COLORS = {
+    'heal': 'GREEN',
+    'buff_attack': 'YELLOW',
+    'buff_defense': 'BLUE',
+    'damage': 'RED',
+    'buff_max_health': 'MAGENTA',
+    'poison': 'RED',
+    'regen': 'GREEN',
+    'fortify': 'BLUE',
+    'rage': 'YELLOW',
+}
+# Larger parties are shown as one summary instead of a status box per player
+PARTY_BOX_LIMIT = 6
+# Enemies shown one by one in the combat screen; the rest are summed up
+ENEMY_LIST_LIMIT = 6
+# Items listed when picking one in combat; the rest can still be picked by number
+ITEM_LIST_LIMIT = 9
+# Links to missing scenes listed when a story loads; explorer.py --links lists them all
+DANGLING_LIST_LIMIT = 3
 
 
 def clear_screen():
     """Clear the terminal screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    screen.clear()
 
 
 def create_health_bar(current: int, maximum: int, width: int = 20) -> str:
@@ -79,7 +146,7 @@ def create_status_box(player: 'Player') -> str:
     box_width = min(terminal_width - 4, 50)
 
     health_bar = create_health_bar(player.health, player.max_health)
-    status_effects = ', '.join(player.status_effects) if player.status_effects else 'None'
+    status_effects = ', '.join(map(str, player.status_effects)) if player.status_effects else 'None'
     
     # Add some kawaii borders and spacing
     box = [
@@ -93,22 +160,56 @@ def create_status_box(player: 'Player') -> str:
     return '\n'.join(box)
 
 
-def display_combat_log(messages: List[str], max_lines: int = 5):
+def create_party_summary(roster: 'Roster') -> str:
     """
-    Display a scrolling combat log with the most recent messages.
+    Create a status box for a whole party too large to show player by player.
+    
+    Args:
+        roster: The party
+        
+    Returns:
+        str: Party size, players standing, pooled health and average stats in a box
+    """
+    terminal_width = shutil.get_terminal_size().columns
+    box_width = min(terminal_width - 4, 50)
+
+    size = len(roster)
+    standing = roster.alive.count(1)
+    health_bar = create_health_bar(sum(roster.health), sum(roster.max_health))
+    attack = sum(roster.attack) / size
+    defense = sum(roster.defense) / size
+    heading = f"{size} heroes, {standing} standing"
+
+    box = [
+        f"┏{'━' * box_width}┓",
+        f"┃ {Fore.CYAN}{heading:<{box_width-2}}{Style.RESET_ALL} ┃",
+        f"┃ {health_bar:<{box_width-2}} ┃",
+        f"┃ {Fore.YELLOW}Avg attack:{Style.RESET_ALL} {attack:.1f} | {Fore.GREEN}Avg defense:{Style.RESET_ALL} {defense:<{box_width-34}.1f} ┃",
+        f"┗{'━' * box_width}┛"
+    ]
+    return '\n'.join(box)
+
+
+def create_combat_log(messages: List[str], max_lines: int = 5) -> str:
+    """
+    Create a scrolling combat log with the most recent messages.
     
     Args:
         messages: List of combat messages to display
         max_lines: Maximum number of lines to show at once
+        
+    Returns:
+        str: The formatted combat log
     """
     # Use a more kawaii title and subtle pastel color
-    print(f"\n{Fore.MAGENTA}✿~ Combat Log ~✿{Style.RESET_ALL}")
-    for msg in messages[-max_lines:]:
-        print(msg)
-    print(f"{Fore.MAGENTA}{'~' * 20}{Style.RESET_ALL}\n")
+    log = ["", f"{Fore.MAGENTA}✿~ Combat Log ~✿{Style.RESET_ALL}"]
+    log.extend(messages[-max_lines:])
+    log.extend([f"{Fore.MAGENTA}{'~' * 20}{Style.RESET_ALL}", ""])
+    return '\n'.join(log)
 
 
-def animate_attack(attacker: str, defender: str, damage: int):
+def animate_attack(attacker: str, defender: str, damage: int, backdrop: List[str] = (),
+                   clock: Clock = REAL_TIME):
     """
     Create a kawaii animation for attack sequences.
     
@@ -116,6 +217,8 @@ def animate_attack(attacker: str, defender: str, damage: int):
         attacker: Name of the attacking character
         defender: Name of the defending character
         damage: Amount of damage dealt
+        backdrop: Frame lines to keep on screen above the animation
+        clock: Clock pacing the animation; an instant clock skips the frames
     """
     # Replace the swords with more anime style emoticons
     # Let's make a small transition animation: (ﾉ*ФωФ)ﾉ✧ => ~(>_<~)
@@ -125,188 +228,155 @@ def animate_attack(attacker: str, defender: str, damage: int):
         f"{Fore.CYAN}{attacker}{Style.RESET_ALL}   ≧◉ᴥ◉≦ {Fore.YELLOW}{defender}{Style.RESET_ALL}",
     ]
 
-    for frame in frames:
-        clear_screen()
-        print(frame)
-        time.sleep(0.15)
+    if not clock.instant:
+        backdrop = list(backdrop)
+        for frame in frames:
+            screen.present(backdrop + [frame])
+            clock.sleep(0.15)
 
     if damage > 0:
-        print(f"{Fore.RED}Nyah! -{damage} HP!{Style.RESET_ALL}")
+        screen.write(f"{Fore.RED}Nyah! -{damage} HP!{Style.RESET_ALL}")
     else:
-        print(f"{Fore.CYAN}UwU... Miss!{Style.RESET_ALL}")
-    time.sleep(0.5)
+        screen.write(f"{Fore.CYAN}UwU... Miss!{Style.RESET_ALL}")
+    clock.sleep(0.5)
 
 
-def loading_animation(text="Loading", duration=2):
+def loading_animation(text="Loading", duration=2, clock: Clock = REAL_TIME):
     """
     Display a cute loading animation with customizable text and duration.
     
     Args:
         text: Text to display during loading
         duration: Duration of the animation in seconds
+        clock: Clock pacing the animation; an instant clock skips it
     """
+    if clock.instant:
+        return
     chars = ["(o˘◡˘o)", "(✿◠‿◠)", "(｡･ω･｡)", "(uwu)", "(^•ω•^)", "(⌒‿⌒)"]
     delay = 0.2
     steps = int(duration / delay)
 
     for i in range(steps):
         char = chars[i % len(chars)]
-        sys.stdout.write(f'\r{char} {Fore.MAGENTA}{text}...{Style.RESET_ALL} ')
-        sys.stdout.flush()
-        sleep(delay)
-    sys.stdout.write('\r' + ' ' * (len(text) + 40) + '\r')
-    sys.stdout.flush()
+        screen.write(f'\r{char} {Fore.MAGENTA}{text}...{Style.RESET_ALL} ', end='')
+        clock.sleep(delay)
+    screen.write('\r' + ' ' * (len(text) + 40) + '\r', end='')
 
 
-def display_title_screen():
-    """Display the game's title screen with decorative ASCII art."""
-    clear_screen()
-    # Adding a pastel gradient-like feel is tricky in terminal,
-    # but we can rely on ASCII art and pastel colors.
-    title_art = f"""
-{Fore.MAGENTA}╔══════════════════════════════════════════════════════════╗
-║                                                          ║
-║         (ﾉ◕ヮ◕)ﾉ*:･ﾟ✧  {Fore.CYAN}Json2RPGDesu{Fore.MAGENTA}   ✧ﾟ･: *ヽ(◕ヮ◕ヽ)    ║
-║                                                          ║
-║     {Fore.YELLOW}A Kawaii Interactive Anime-Inspired Adventure!{Fore.MAGENTA}    ║
-║                                                          ║
-╚══════════════════════════════════════════════════════════╝
-{Style.RESET_ALL}"""
-    print(title_art)
-
-
-class Player:
+def display_title_screen(footer: List[str] = ()):
     """
-    Represents a player character in the game.
+    Display the game's title screen with decorative ASCII art.
     
-    Attributes:
-        name (str): Player's name
-        health (int): Current health points
-        max_health (int): Maximum health points
-        attack (int): Attack power
-        defense (int): Defense power
-        is_alive (bool): Whether the player is alive
-        status_effects (List[str]): Active status effects
+    Args:
+        footer: Extra frame lines shown below the title art
     """
-
-    def __init__(self, name: str):
-        """
-        Initialize a new player.
-        
-        Args:
-            name: The player's name
-        """
-        self.name = name
-        self.health = 100
-        self.max_health = 100
-        self.attack = 10
-        self.defense = 10
-        self.is_alive = True
-        self.status_effects = []
-
-    def roll_dice(self, sides: int = 20) -> int:
-        """
-        Roll a dice with specified number of sides.
-        
-        Args:
-            sides: Number of sides on the dice
-            
-        Returns:
-            int: Random number between 1 and sides
-        """
-        return random.randint(1, sides)
-
-    def take_damage(self, damage: int):
-        """
-        Apply damage to the player, accounting for defense.
-        
-        Args:
-            damage: Amount of damage to apply
-            
-        Returns:
-            int: Actual damage dealt after defense
-        """
-        actual_damage = max(0, damage - self.defense)
-        self.health = max(0, self.health - actual_damage)
-        self.is_alive = self.health > 0
-        return actual_damage
-
-    def heal(self, amount: int):
-        """
-        Heal the player for a specified amount.
-        
-        Args:
-            amount: Amount of health to restore
-        """
-        self.health = min(self.max_health, self.health + amount)
-        print(f"{Fore.GREEN}{self.name} drinks a magical potion and heals for {amount} HP! (✿◠‿◠){Style.RESET_ALL}")
-
-    def apply_effect(self, effect: Dict):
-        """
-        Apply various effects to the player.
-        
-        Args:
-            effect: Dictionary containing effect types and values
-        """
-        if "heal" in effect:
-            self.heal(effect["heal"])
-        if "buff_attack" in effect:
-            self.attack += effect["buff_attack"]
-            print(f"{Fore.YELLOW}{self.name}'s attack increased by {effect['buff_attack']}! (•̀ᴗ•́)و✧{Style.RESET_ALL}")
-        if "buff_defense" in effect:
-            self.defense += effect["buff_defense"]
-            print(f"{Fore.BLUE}{self.name}'s defense increased by {effect['buff_defense']}! ᕙ(⇀‸↼‶)ᕗ{Style.RESET_ALL}")
-        if "damage" in effect:
-            damage = self.take_damage(effect["damage"])
-            print(f"{Fore.RED}{self.name} took {damage} damage! ( >﹏< ){Style.RESET_ALL}")
+    # Adding a pastel gradient-like feel is tricky in terminal,
+    # but we can rely on ASCII art and pastel colors.
+    title_art = [
+        "",
+        f"{Fore.MAGENTA}╔══════════════════════════════════════════════════════════╗",
+        f"{Fore.MAGENTA}║                                                          ║",
+        f"{Fore.MAGENTA}║         (ﾉ◕ヮ◕)ﾉ*:･ﾟ✧  {Fore.CYAN}Json2RPGDesu{Fore.MAGENTA}   ✧ﾟ･: *ヽ(◕ヮ◕ヽ)    ║",
+        f"{Fore.MAGENTA}║                                                          ║",
+        f"{Fore.MAGENTA}║     {Fore.YELLOW}A Kawaii Interactive Anime-Inspired Adventure!{Fore.MAGENTA}    ║",
+        f"{Fore.MAGENTA}║                                                          ║",
+        f"{Fore.MAGENTA}╚══════════════════════════════════════════════════════════╝",
+        "",
+    ]
+    screen.present(title_art + list(footer))
 
 
 class Game:
     """
-    Main game engine class that handles game mechanics and story progression.
+    Terminal front end that drives a headless engine session.
+    
+    The game state itself lives in an engine GameState; players, current_scene,
+    current_player_index and scenes_visited are read straight from it.
     
     Attributes:
-        players (List[Player]): List of active players
+        state (GameState): Engine session being played, None between games
+        players (Roster): Party of the current game
         current_scene (str): ID of the current scene
-        story_data (Dict): Loaded story data from JSON
+        story (CompiledStory): Compiled story loaded from JSON
         current_player_index (int): Index of the current player
         colors (Dict): Color mapping for text display
+        text_cache (TextCache): Rendered scene text for the current roster
+        vote_options (Tuple[str]): Rendered options of the vote in progress
+        wrap_cache (Dict): Wrapped description lines by (scene, width, text)
         combat_log (List[str]): List of combat messages
-        terminal_width (int): Width of the terminal
-        total_scenes (int): Total number of scenes in the story
+        terminal_width (int): Width of the terminal, measured whenever text is wrapped
         scenes_visited (set): Set of visited scene IDs
         hotkeys (Dict): Mapping of hotkeys to actions
+        savefile (SaveFile): Save slot written after every choice
+        unsaved (List[Action]): Actions played since the last save
+        recording (SaveFile): Full recording of the current game for replay.py
+        clock (Clock): Paces animations and pauses
+        party_size (int): Number of players in a new game
     """
 
-    def __init__(self):
-        """Initialize a new game instance."""
-        self.players: List[Player] = []
-        self.current_scene = "start"
-        self.story_data = {}
-        self.current_player_index = 0
+    def __init__(self, clock: Clock = None, party_size: int = PARTY_SIZE):
+        """
+        Initialize a new game instance.
+        
+        Args:
+            clock: Clock pacing animations and pauses; real time on a
+                terminal and instant otherwise if not given
+            party_size: Number of players in a new game
+        """
+        if clock is None:
+            clock = REAL_TIME if screen.interactive else INSTANT
+        self.clock = clock
+        self.party_size = party_size
+        self.state: GameState = None
+        self.story: CompiledStory = None
         self.colors = {}
+        self.text_cache: TextCache = None
+        self.vote_options = ()
+        self.vote_deadline = None
+        self.wrap_cache = {}
         self.combat_log = []
-        self.terminal_width = shutil.get_terminal_size().columns
-        self.total_scenes = 0
-        self.scenes_visited = set()
+        self.terminal_width = 0
         self.hotkeys = {
             'a': 'attack',
             'd': 'defend',
             'h': 'heal',
-            's': 'special'
+            's': 'special',
+            'i': ITEM_ACTION
         }
+        self.savefile = SaveFile(SAVE_PATH)
+        self.unsaved: List[Action] = []
+        self.recording = SaveFile(RECORDING_PATH, journal_limit=None)
+
+    @property
+    def players(self) -> Roster:
+        return self.state.players if self.state else []
+
+    @property
+    def current_scene(self) -> str:
+        return self.state.current_scene if self.state else "start"
+
+    @property
+    def current_player_index(self) -> int:
+        return self.state.current_player_index if self.state else 0
+
+    @property
+    def scenes_visited(self) -> set:
+        return self.state.scenes_visited if self.state else set()
 
     def calculate_progress(self):
         """
         Calculate the player's progress through the game.
         
+        Progress is measured along the party's own route: the scenes visited
+        so far against the longest path left from the current scene, which
+        the story precomputes when it is loaded.
+        
         Returns:
-            float: Percentage of scenes visited
+            float: Percentage of the route completed
         """
-        if not self.total_scenes:
-            self.total_scenes = len([k for k in self.story_data.keys() if k != 'config'])
-        progress = (len(self.scenes_visited) / self.total_scenes) * 100
-        return min(100, progress)
+        if self.state is None:
+            return 0.0
+        return self.story.progress(self.state.scene_index, len(self.scenes_visited)) * 100
 
     def display_progress_bar(self):
         """Display a kawaii-styled progress bar showing game completion."""
@@ -315,7 +385,7 @@ class Game:
         filled = int((progress / 100) * width)
         # Use pastel flowers for progress filling
         bar = f"[{Fore.GREEN}{'✿' * filled}{Fore.WHITE}{'·' * (width - filled)}{Style.RESET_ALL}]"
-        print(f"\nProgress: {bar} {progress:.1f}%")
+        screen.write(f"\nProgress: {bar} {progress:.1f}%")
 
     def display_main_menu(self):
         """
@@ -325,63 +395,65 @@ class Game:
             bool: True if a new game should start, False otherwise
         """
         while True:
-            display_title_screen()
-            print(f"\n{Fore.CYAN}(⁀ᗢ⁀) {Style.RESET_ALL}Main Menu{Fore.CYAN} (⁀ᗢ⁀){Style.RESET_ALL}\n")
+            menu = ["", f"{Fore.CYAN}(⁀ᗢ⁀) {Style.RESET_ALL}Main Menu{Fore.CYAN} (⁀ᗢ⁀){Style.RESET_ALL}", ""]
             menu_options = [
                 (1, "New Game", "Start a new kawaii adventure!"),
-                (2, "Load Game", "Load your previous journey (Coming Soon)"),
+                (2, "Load Game", "Continue your previous journey!"),
                 (3, "Settings", "Tweak those kawaii settings (Coming Soon)"),
                 (4, "Credits", "See who made this adorable adventure!"),
                 (5, "Exit", "Goodbye! (｡•́︿•̀｡)")
             ]
 
             for num, title, desc in menu_options:
-                print(f"\n{Fore.YELLOW}{num}.{Style.RESET_ALL} {Fore.MAGENTA}{title}{Style.RESET_ALL}")
-                print(f"   {Fore.CYAN}{desc}{Style.RESET_ALL}")
+                menu.append("")
+                menu.append(f"{Fore.YELLOW}{num}.{Style.RESET_ALL} {Fore.MAGENTA}{title}{Style.RESET_ALL}")
+                menu.append(f"   {Fore.CYAN}{desc}{Style.RESET_ALL}")
+            display_title_screen(menu)
 
             try:
-                choice = input(f"\n{Fore.YELLOW}Enter your choice (1-5):{Style.RESET_ALL} ")
+                choice = screen.input(f"\n{Fore.YELLOW}Enter your choice (1-5):{Style.RESET_ALL} ")
                 if choice == "1":
-                    loading_animation("Starting kawaii new game")
+                    loading_animation("Starting kawaii new game", clock=self.clock)
                     return self.start_new_game()
                 elif choice == "2":
-                    print("\n(；・∀・) Save/Load feature coming soon!")
-                    input("Press Enter to continue...")
+                    if self.load_game():
+                        return True
+                    screen.input("Press Enter to continue...")
                 elif choice == "3":
-                    print("\n(｡╯︵╰｡) Settings feature coming soon!")
-                    input("Press Enter to continue...")
+                    screen.write("\n(｡╯︵╰｡) Settings feature coming soon!")
+                    screen.input("Press Enter to continue...")
                 elif choice == "4":
                     self.display_credits()
                 elif choice == "5":
-                    print("\n(｡•́︿•̀｡) Thanks for playing!")
+                    screen.write("\n(｡•́︿•̀｡) Thanks for playing!")
                     sys.exit()
             except ValueError:
-                print(f"{Fore.RED}Please enter a valid number!{Style.RESET_ALL}")
-                sleep(1)
+                screen.write(f"{Fore.RED}Please enter a valid number!{Style.RESET_ALL}")
+                self.clock.sleep(1)
 
     def display_credits(self):
         """Display game credits with a cute style."""
-        clear_screen()
-        credits = f"""
-{Fore.MAGENTA}╔══════════════════════════════════╗
-║          {Fore.YELLOW}(✿◠‿◠) CREDITS (◠‿◠✿){Fore.MAGENTA}       ║
-╠══════════════════════════════════╣
-║                                  ║
-║  {Fore.WHITE}Game Design & Development{Fore.MAGENTA}      ║
-║    {Fore.YELLOW}Your Name Here{Fore.MAGENTA}                ║
-║                                  ║
-║  {Fore.WHITE}Story & Writing{Fore.MAGENTA}                ║
-║    {Fore.YELLOW}Your Name Here{Fore.MAGENTA}                ║
-║                                  ║
-║  {Fore.WHITE}Special Thanks{Fore.MAGENTA}                 ║
-║   {Fore.YELLOW}The Python Community{Fore.MAGENTA}          ║
-║                                  ║
-╚══════════════════════════════════╝{Style.RESET_ALL}
-
-(｡◕‿◕｡) Arigatou Gozaimasu for playing!
-"""
-        print(credits)
-        input("\nPress Enter to return to the main menu...")
+        credits = [
+            "",
+            f"{Fore.MAGENTA}╔══════════════════════════════════╗",
+            f"{Fore.MAGENTA}║          {Fore.YELLOW}(✿◠‿◠) CREDITS (◠‿◠✿){Fore.MAGENTA}       ║",
+            f"{Fore.MAGENTA}╠══════════════════════════════════╣",
+            f"{Fore.MAGENTA}║                                  ║",
+            f"{Fore.MAGENTA}║  {Fore.WHITE}Game Design & Development{Fore.MAGENTA}      ║",
+            f"{Fore.MAGENTA}║    {Fore.YELLOW}Your Name Here{Fore.MAGENTA}                ║",
+            f"{Fore.MAGENTA}║                                  ║",
+            f"{Fore.MAGENTA}║  {Fore.WHITE}Story & Writing{Fore.MAGENTA}                ║",
+            f"{Fore.MAGENTA}║    {Fore.YELLOW}Your Name Here{Fore.MAGENTA}                ║",
+            f"{Fore.MAGENTA}║                                  ║",
+            f"{Fore.MAGENTA}║  {Fore.WHITE}Special Thanks{Fore.MAGENTA}                 ║",
+            f"{Fore.MAGENTA}║   {Fore.YELLOW}The Python Community{Fore.MAGENTA}          ║",
+            f"{Fore.MAGENTA}║                                  ║",
+            f"{Fore.MAGENTA}╚══════════════════════════════════╝{Style.RESET_ALL}",
+            "",
+            "(｡◕‿◕｡) Arigatou Gozaimasu for playing!",
+        ]
+        screen.present(credits)
+        screen.input("\nPress Enter to return to the main menu...")
 
     def start_new_game(self):
         """
@@ -391,8 +463,8 @@ class Game:
             bool: True if game started successfully, False otherwise
         """
         if not self.load_story('story.json'):
-            print(f"{Fore.RED}(>_<) Failed to load story file!{Style.RESET_ALL}")
-            input("Press Enter to return to main menu...")
+            screen.write(f"{Fore.RED}(>_<) Failed to load story file!{Style.RESET_ALL}")
+            screen.input("Press Enter to return to main menu...")
             return False
         self.initialize_players()
         return True
@@ -413,28 +485,42 @@ class Game:
             # Construct absolute path to story.json
             story_path = os.path.join(script_dir, filename)
             
-            print(f"{Fore.CYAN}Attempting to load story from: {story_path}{Style.RESET_ALL}")
+            screen.write(f"{Fore.CYAN}Attempting to load story from: {story_path}{Style.RESET_ALL}")
             
-            with open(story_path, 'r', encoding='utf-8') as file:
-                self.story_data = json.load(file)
-                colors_config = self.story_data.get('config', {}).get('colors', {})
+            story = open_story_file(story_path)
+            # An unchanged story comes back as the same object, so its colors
+            # and wrapped text from the previous game are still good
+            if story is not self.story:
+                self.story = story
+                self.wrap_cache = {}
+                colors_config = self.story.config.get('colors', {})
                 self.colors = {}
                 for key, value in colors_config.items():
                     self.colors[key] = self.get_color_code(value)
-                print(f"{Fore.GREEN}Successfully loaded story file! (｡♥‿♥｡){Style.RESET_ALL}")
-                return True
+            self.text_cache = TextCache(self.story)
+            dangling = self.story.dangling
+            if dangling:
+                screen.write(f"{Fore.YELLOW}(・_・;) {len(dangling)} scene links point to missing scenes "
+                             f"and will end the adventure:{Style.RESET_ALL}")
+                for source, target in dangling[:DANGLING_LIST_LIMIT]:
+                    screen.write(f"  - {source} -> {target}")
+                if len(dangling) > DANGLING_LIST_LIMIT:
+                    screen.write(f"  ...and {len(dangling) - DANGLING_LIST_LIMIT} more "
+                                 f"(python explorer.py --links lists them all)")
+            screen.write(f"{Fore.GREEN}Successfully loaded story file! (｡♥‿♥｡){Style.RESET_ALL}")
+            return True
         except FileNotFoundError:
-            print(f"{Fore.RED}(；′⌒`) Story file not found at: {story_path}{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}Current working directory: {os.getcwd()}{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}Files in directory:{Style.RESET_ALL}")
+            screen.write(f"{Fore.RED}(；′⌒`) Story file not found at: {story_path}{Style.RESET_ALL}")
+            screen.write(f"{Fore.YELLOW}Current working directory: {os.getcwd()}{Style.RESET_ALL}")
+            screen.write(f"{Fore.YELLOW}Files in directory:{Style.RESET_ALL}")
             for f in os.listdir(script_dir):
-                print(f"  - {f}")
+                screen.write(f"  - {f}")
             return False
         except json.JSONDecodeError as e:
-            print(f"{Fore.RED}(>﹏<) Error parsing JSON file: {e}{Style.RESET_ALL}")
+            screen.write(f"{Fore.RED}(>﹏<) Error parsing JSON file: {e}{Style.RESET_ALL}")
             return False
         except Exception as e:
-            print(f"{Fore.RED}(╥﹏╥) Unexpected error loading story: {str(e)}{Style.RESET_ALL}")
+            screen.write(f"{Fore.RED}(╥﹏╥) Unexpected error loading story: {str(e)}{Style.RESET_ALL}")
             return False
 
     def get_color_code(self, color_name: str) -> str:
@@ -462,75 +548,101 @@ class Game:
 
     def initialize_players(self):
         """Initialize player characters for a new game."""
-        num_players = 4  # Adjust the number of players as needed
-        print("\n(◕‿◕) Let's name our brave heroes!")
+        num_players = self.party_size
+        # Nobody wants to type a hundred names, so large parties can stop early
+        name_the_rest = num_players > PARTY_BOX_LIMIT
+        names = []
+        screen.write("\n(◕‿◕) Let's name our brave heroes!")
+        if name_the_rest:
+            screen.write(f"(｡•̀ᴗ-)✧ {num_players} heroes! Leave a name empty to call everyone else 'Player N'.")
         for i in range(num_players):
             while True:
-                name = input(f"Enter name for Player {i+1}: ").strip()
-                if name and not any(p.name == name for p in self.players):
-                    self.players.append(Player(name))
-                    print(f"{Fore.GREEN}Yay! {name} is ready for adventure! (★^O^★){Style.RESET_ALL}")
+                name = screen.input(f"Enter name for Player {i+1}: ").strip()
+                if not name and name_the_rest:
+                    break
+                if name and name not in names:
+                    names.append(name)
+                    screen.write(f"{Fore.GREEN}Yay! {name} is ready for adventure! (★^O^★){Style.RESET_ALL}")
                     break
-                print("(¬_¬) Please enter a unique, non-empty name...")
+                screen.write("(¬_¬) Please enter a unique, non-empty name...")
+            if len(names) == i:
+                break
+        taken = set(names)
+        for i in range(len(names), num_players):
+            name = f"Player {i+1}"
+            while name in taken:
+                name += "'"
+            names.append(name)
+
+        self.text_cache.set_roster(names)
+        self.state, events = new_game(self.story, names)
+        self.unsaved = []
+        try:
+            self.savefile.write_snapshot(self.state)
+            self.recording.write_snapshot(self.state)
+        except OSError as e:
+            screen.write(f"{Fore.RED}(╥﹏╥) Could not create save file: {e}{Style.RESET_ALL}")
+        self.render_events(events)
 
-    def display_scene(self):
-        """Display the current scene with description and available choices."""
-        clear_screen()
-        scene = self.story_data.get(self.current_scene, {})
+    def display_scene(self, scene_index: int = None):
+        """
+        Display a scene with description and available choices.
+        
+        Args:
+            scene_index: Index of the scene to show, defaults to the current scene
+        """
+        if scene_index is None:
+            scene_index = self.state.scene_index
+        scene = self.story.scenes[scene_index]
+        rendered = self.text_cache.scene(scene_index, self.current_player_index)
 
         # Display title with a fancy border
-        title = scene.get("title", "Current Scene")
-        print(f"\n{Fore.CYAN}{'=' * 15} {title} {'=' * 15}{Style.RESET_ALL}\n")
+        frame = ["", f"{Fore.CYAN}{'=' * 15} {scene.title} {'=' * 15}{Style.RESET_ALL}", ""]
 
         # Display description with text wrapping and preserving line breaks
-        description = scene.get("description", {})
-        if isinstance(description, dict):
-            text = description.get("text", "")
-            color_name = description.get("color", "")
-            color_code = self.colors.get(color_name, Fore.RESET)
-            text = self.replace_placeholders(text)
-
-            paragraphs = text.split('\n')
-            for paragraph in paragraphs:
-                if paragraph.strip() == '':
-                    print('')
-                    continue
-
-                words = paragraph.split()
-                lines = []
-                current_line = []
-                current_length = 0
-
-                for word in words:
-                    word_length = len(word.encode('utf-8'))
-                    if current_length + word_length + 1 <= self.terminal_width:
-                        current_line.append(word)
-                        current_length += word_length + 1
-                    else:
-                        lines.append(' '.join(current_line))
-                        current_line = [word]
-                        current_length = word_length
-
-                if current_line:
-                    lines.append(' '.join(current_line))
-
-                for line in lines:
-                    print(f"{color_code}{line}{Style.RESET_ALL}")
-        else:
-            print(description)
+        if rendered.text:
+            frame.extend(self.wrap_description(scene_index, rendered.text))
 
         # Display player status
         if self.players:
-            print("\n(✿ ♥‿♥) === Party Status === (♥‿♥ ✿)")
-            for player in self.players:
-                print(create_status_box(player))
+            frame.extend(["", "(✿ ♥‿♥) === Party Status === (♥‿♥ ✿)"])
+            frame.extend(self.party_status())
+
+        # Display the choices the current player is offered
+        available = available_choices(self.state, scene_index)
+        if available:
+            frame.extend(["", f"{Fore.GREEN}Available Choices:{Style.RESET_ALL}"])
+            for i, choice_index in enumerate(available, 1):
+                frame.append(f"{Fore.YELLOW}{i}.{Style.RESET_ALL} {rendered.choices[choice_index]}")
 
-        # Display choices
-        if "choices" in scene and scene["choices"]:
-            print(f"\n{Fore.GREEN}Available Choices:{Style.RESET_ALL}")
-            for i, choice in enumerate(scene["choices"], 1):
-                choice_text = self.replace_placeholders(choice['text'])
-                print(f"{Fore.YELLOW}{i}.{Style.RESET_ALL} {choice_text}")
+        screen.present(frame)
+
+    def wrap_description(self, scene_index: int, text: str) -> Tuple[str, ...]:
+        """
+        Wrap and color a scene description for the current terminal width.
+        
+        Wrapped lines are cached per (scene, terminal width, text), so redrawing
+        a scene after a failed input or a vote costs a dict lookup.
+        
+        Args:
+            scene_index: Index of the scene being described
+            text: Rendered description text
+            
+        Returns:
+            Tuple[str]: Colored description lines
+        """
+        self.terminal_width = shutil.get_terminal_size().columns
+        key = (scene_index, self.terminal_width, text)
+        lines = self.wrap_cache.get(key)
+        if lines is None:
+            color_code = self.colors.get(self.story.scenes[scene_index].color, Fore.RESET)
+            # Stay one cell short of the edge so the cursor never wraps on its own
+            lines = tuple(
+                f"{color_code}{line}{Style.RESET_ALL}" if line else ''
+                for line in wrap_text(text, self.terminal_width - 1)
+            )
+            self.wrap_cache[key] = lines
+        return lines
 
     def replace_placeholders(self, text: str) -> str:
         """
@@ -542,113 +654,187 @@ class Game:
         Returns:
             str: Text with placeholders replaced
         """
-        placeholder_dict = {
-            'current_player': self.players[self.current_player_index].name if self.players else '',
-            'player1': self.players[0].name if len(self.players) > 0 else '',
-            'player2': self.players[1].name if len(self.players) > 1 else '',
-            'player3': self.players[2].name if len(self.players) > 2 else '',
-            'player4': self.players[3].name if len(self.players) > 3 else '',
-        }
-        for placeholder, value in placeholder_dict.items():
-            text = text.replace(f'{{{placeholder}}}', value)
-        return text
+        return Template(text).render(self.text_cache.values(self.current_player_index))
 
-    def handle_combat(self, enemy_stats: Dict):
+    def send(self, action: Action) -> bool:
         """
-        Handle combat encounters between players and enemies.
+        Feed an action to the engine and present what happened.
         
         Args:
-            enemy_stats: Dictionary containing enemy statistics
+            action: Action to advance the session with
             
         Returns:
-            bool: True if players won, False if they lost
+            bool: False if the engine rejected the action, True otherwise
         """
-        clear_screen()
-        enemy_health = enemy_stats.get("health", 50)
-        enemy_max_health = enemy_health
-        enemy_attack = enemy_stats.get("attack", 8)
-        enemy_defense = enemy_stats.get("defense", 5)
-        enemy_name = enemy_stats.get("name", "Enemy")
-        enemy_color = self.colors.get(enemy_stats.get("color", ""), Fore.RESET)
-
-        print(f"\n{Fore.RED}(ง •̀ω•́)ง⚔ Combat Started! (ง •̀ω•́)ง{Style.RESET_ALL}")
-        self.combat_log = []
-
-        while enemy_health > 0 and any(p.is_alive for p in self.players):
-            clear_screen()
-
-            # Display enemy status
-            print(f"\n{enemy_color}{enemy_name}{Style.RESET_ALL}")
-            print(create_health_bar(enemy_health, enemy_max_health))
-
-            # Display all players' status
-            print("\n(✿｡✿) === Party Status === (✿｡✿)")
-            for player in self.players:
-                print(f"{create_status_box(player)}")
-
-            # Display combat log
-            if self.combat_log:
-                display_combat_log(self.combat_log)
+        self.state, events = advance(self.state, action)
+        if events and events[0].kind == 'invalid':
+            return False
+        # Every accepted action is journaled before it is shown, ballots and
+        # combat actions included, so quitting mid-vote or mid-fight loses nothing
+        self.unsaved.append(action)
+        self.save_game()
+        try:
+            self.recording.append(self.state, [action])
+        except OSError:
+            pass  # A missing recording never interrupts the game
+        self.render_events(events)
+        return True
 
-            current_player = self.players[self.current_player_index]
-            if current_player.is_alive:
-                print(f"\n{Fore.CYAN}(｡>﹏<｡){current_player.name}'s turn!{Style.RESET_ALL}")
-                action = self.get_player_action(current_player)
-
-                if action == 'attack':
-                    roll = current_player.roll_dice(20)
-                    if roll >= 10:
-                        damage = max(0, current_player.attack + current_player.roll_dice(6) - enemy_defense)
-                        enemy_health = max(0, enemy_health - damage)
-                        animate_attack(current_player.name, enemy_name, damage)
-                        self.combat_log.append(f"{Fore.GREEN}{current_player.name} hits for {damage} damage!{Style.RESET_ALL}")
-                    else:
-                        animate_attack(current_player.name, enemy_name, 0)
-                        self.combat_log.append(f"{Fore.YELLOW}{current_player.name} missed!{Style.RESET_ALL}")
-
-                elif action == 'defend':
-                    current_player.defense += 5  # Temporary defense buff
-                    print(f"{Fore.BLUE}{current_player.name} is defending and gains +5 defense for this turn! (｀・ω・´){Style.RESET_ALL}")
-                    self.combat_log.append(f"{current_player.name} is defending.")
-                elif action == 'heal':
-                    current_player.heal(15)
-                    self.combat_log.append(f"{current_player.name} heals for 15 HP!")
-                elif action == 'special':
-                    print(f"{Fore.MAGENTA}{current_player.name} uses a special ability! ✨(=^･ω･^=)✨{Style.RESET_ALL}")
-                    damage = max(0, current_player.attack + 10 - enemy_defense)
-                    enemy_health = max(0, enemy_health - damage)
-                    self.combat_log.append(f"{current_player.name} unleashes a special attack for {damage} damage!")
-                    time.sleep(1)
-
-                time.sleep(1)  # Pause for effect
-
-                if enemy_health <= 0:
-                    print(f"{enemy_color}{enemy_name} defeated! (❁´◡`❁){Style.RESET_ALL}")
-                    return True
-
-                # Enemy's turn to attack the current player
-                enemy_roll = random.randint(1, 20)
-                if enemy_roll >= 10:
-                    damage = max(0, enemy_attack + random.randint(1, 6) - current_player.defense)
-                    current_player.take_damage(damage)
-                    animate_attack(enemy_name, current_player.name, damage)
-                    self.combat_log.append(f"{enemy_name} hits {current_player.name} for {damage} damage!")
-                    if not current_player.is_alive:
-                        print(f"{Fore.RED}(╥﹏╥) {current_player.name} has fallen!{Style.RESET_ALL}")
-                        self.combat_log.append(f"{current_player.name} has fallen!")
+    def render_events(self, events: List[Event]):
+        """
+        Present engine events in kawaii style.
+        
+        Args:
+            events: Events returned by the engine
+        """
+        for event in events:
+            kind, data = event.kind, event.data
+            if kind == 'scene':
+                self.display_scene(data['index'])
+                self.display_progress_bar()
+            elif kind in ('effect', 'party_effect'):
+                self.display_effect(data)
+            elif kind in ('status_tick', 'status_expired'):
+                message = STATUS_TYPES[data['status']].describe(data)
+                screen.write(f"{Fore.CYAN}{message}{Style.RESET_ALL}")
+                if self.state.phase == PHASE_COMBAT:
+                    self.combat_log.append(message)
+            elif kind == 'vote_started':
+                screen.write("\n(„• ᴗ •„) A vote is required among players.")
+                rendered = self.text_cache.scene(self.state.scene_index, self.current_player_index)
+                self.vote_options = rendered.options[data['choice']]
+                for idx, option_text in enumerate(self.vote_options, 1):
+                    screen.write(f"{Fore.YELLOW}{idx}.{Style.RESET_ALL} {option_text}")
+                self.start_vote_timer(data['timeout'])
+            elif kind == 'vote_result':
+                winning_text = self.vote_options[data['option']]
+                screen.write(f"\n(✿◕‿◕) The group has decided to: {winning_text}")
+            elif kind == 'agree_started':
+                screen.write(f"\n(｡•̀ᴗ-)✧ A group decision is needed. At least {data['min_players']} players must agree.")
+                self.start_vote_timer(data['timeout'])
+            elif kind == 'agree_result':
+                if data['success']:
+                    screen.write(f"\n(｡•̀ᴗ-)✧ Decision successful! Moving on!")
                 else:
-                    print(f"{enemy_name} missed! (✧ω✧)")
-                    self.combat_log.append(f"{enemy_name} missed!")
-
-                # Reset temporary defense buff if player was defending
-                if action == 'defend':
-                    current_player.defense -= 5
+                    screen.write(f"\n(╯︵╰,) Not enough agreement. Alternate path chosen.")
+            elif kind == 'combat_started':
+                screen.present(["", f"{Fore.RED}(ง •̀ω•́)ง⚔ Combat Started! (ง •̀ω•́)ง{Style.RESET_ALL}"])
+                self.combat_log = []
+            elif kind == 'player_attack':
+                animate_attack(data['player'], data['enemy'], data['damage'], self.combat_frame(), self.clock)
+                if data['hit']:
+                    self.combat_log.append(f"{Fore.GREEN}{data['player']} hits for {data['damage']} damage!{Style.RESET_ALL}")
+                else:
+                    self.combat_log.append(f"{Fore.YELLOW}{data['player']} missed!{Style.RESET_ALL}")
+                self.clock.sleep(1)  # Pause for effect
+            elif kind == 'defend':
+                screen.write(f"{Fore.BLUE}{data['player']} is defending and gains +{data['amount']} defense until their next turn! (｀・ω・´){Style.RESET_ALL}")
+                self.combat_log.append(f"{data['player']} is defending.")
+                self.clock.sleep(1)
+            elif kind == 'heal':
+                self.display_effect({'player': data['player'], 'effect': 'heal', 'amount': data['amount']})
+                self.combat_log.append(f"{data['player']} heals for {data['amount']} HP!")
+                self.clock.sleep(1)
+            elif kind == 'special':
+                screen.write(f"{Fore.MAGENTA}{data['player']} uses a special ability! ✨(=^･ω･^=)✨{Style.RESET_ALL}")
+                self.combat_log.append(f"{data['player']} unleashes a special attack for {data['damage']} damage!")
+                self.clock.sleep(2)
+            elif kind == 'enemy_attack':
+                if data['hit']:
+                    animate_attack(data['enemy'], data['player'], data['damage'], self.combat_frame(), self.clock)
+                    self.combat_log.append(f"{data['enemy']} hits {data['player']} for {data['damage']} damage!")
+                else:
+                    screen.write(f"{data['enemy']} missed! (✧ω✧)")
+                    self.combat_log.append(f"{data['enemy']} missed!")
+            elif kind == 'item_used':
+                screen.write(f"{Fore.GREEN}{data['player']} uses {data['item']}! (ﾉ◕ヮ◕)ﾉ*:･ﾟ✧{Style.RESET_ALL}")
+                if self.state.phase == PHASE_COMBAT:
+                    self.combat_log.append(f"{data['player']} uses {data['item']}!")
+            elif kind == 'item_gained':
+                count = f" x{data['count']}" if data['count'] > 1 else ""
+                screen.write(f"{Fore.YELLOW}(☆▽☆) {data['player']} got {data['item']}{count}!{Style.RESET_ALL}")
+            elif kind == 'item_lost':
+                count = f" x{data['count']}" if data['count'] > 1 else ""
+                screen.write(f"{Fore.MAGENTA}{data['player']} handed over {data['item']}{count}.{Style.RESET_ALL}")
+            elif kind == 'fallen':
+                screen.write(f"{Fore.RED}(╥﹏╥) {data['player']} has fallen!{Style.RESET_ALL}")
+                self.combat_log.append(f"{data['player']} has fallen!")
+            elif kind == 'enemy_defeated':
+                enemy_color = self.colors.get(data['color'], Fore.RESET)
+                screen.write(f"{enemy_color}{data['enemy']} defeated! (❁´◡`❁){Style.RESET_ALL}")
+            elif kind == 'game_over':
+                if data['victory']:
+                    screen.write(f"\n{Fore.GREEN}(*^ω^*) Congratulations - You've completed the adventure!{Style.RESET_ALL}")
+                else:
+                    screen.write(f"\n{Fore.RED}(╥﹏╥) Game Over - All players have fallen!{Style.RESET_ALL}")
 
-                time.sleep(1)  # Pause for effect
+    def display_effect(self, data: Dict):
+        """
+        Display the message for an effect applied to a player or the whole party.
+        
+        Args:
+            data: Payload of an 'effect' or 'party_effect' event
+        """
+        color = getattr(Fore, EFFECT_COLORS.get(data['effect'], 'RESET'))
+        screen.write(f"{color}{EFFECTS[data['effect']].describe(data)}{Style.RESET_ALL}")
 
-            self.current_player_index = (self.current_player_index + 1) % len(self.players)
+    def party_status(self) -> List[str]:
+        """
+        Status lines for the party: a box per player, or one summary for large parties.
+        
+        Returns:
+            List[str]: Frame lines
+        """
+        if len(self.players) > PARTY_BOX_LIMIT:
+            lines = create_party_summary(self.players).split('\n')
+            if self.state.phase == PHASE_COMBAT:
+                lines.extend(create_status_box(self.players[self.current_player_index]).split('\n'))
+            return lines
+        lines = []
+        for player in self.players:
+            lines.extend(create_status_box(player).split('\n'))
+        return lines
 
-        return any(p.is_alive for p in self.players)
+    def combat_frame(self) -> List[str]:
+        """
+        Build the combat screen: enemy, party status and combat log.
+        
+        Returns:
+            List[str]: Frame lines
+        """
+        combat = self.state.combat
+        frame = []
+
+        # Display enemy status, numbered for picking a target
+        if combat:
+            standing = [(i, enemy) for i, enemy in enumerate(combat.enemies) if enemy.health > 0]
+            for i, enemy in standing[:ENEMY_LIST_LIMIT]:
+                enemy_color = self.colors.get(enemy.color, Fore.RESET)
+                label = f"{i + 1}. {enemy.name}" if len(combat.enemies) > 1 else enemy.name
+                frame.extend(["", f"{enemy_color}{label}{Style.RESET_ALL}"])
+                frame.append(create_health_bar(enemy.health, enemy.max_health))
+            rest = standing[ENEMY_LIST_LIMIT:]
+            if rest:
+                frame.append(f"...and {len(rest)} more enemies with {sum(e.health for _, e in rest)} HP left")
+
+        # Display all players' status
+        frame.extend(["", "(✿｡✿) === Party Status === (✿｡✿)"])
+        frame.extend(self.party_status())
+
+        # Display combat log
+        if self.combat_log:
+            frame.extend(create_combat_log(self.combat_log).split('\n'))
+        return frame
+
+    def handle_combat(self):
+        """Run the combat phase until the fight is won or the party falls."""
+        while self.state.phase == PHASE_COMBAT:
+            current_player = self.players[self.current_player_index]
+            frame = self.combat_frame()
+            frame.extend(["", f"{Fore.CYAN}(｡>﹏<｡){current_player.name}'s turn!{Style.RESET_ALL}"])
+            screen.present(frame)
+            self.send(Action(PHASE_COMBAT, self.get_player_action(current_player)))
+            self.clock.sleep(1)  # Pause for effect
 
     def get_player_action(self, player: Player):
         """
@@ -667,129 +853,161 @@ class Game:
             ('Special (S)', '✨ Unleash your hidden power!')
         ]
 
-        print(f"\n{Fore.CYAN}Choose your action, {player.name}:{Style.RESET_ALL}")
+        items = usable_items(self.state)
+        if items:
+            actions.append(('Item (I)', '🎒 Use something from your bag!'))
+
+        screen.write(f"\n{Fore.CYAN}Choose your action, {player.name}:{Style.RESET_ALL}")
         for action, description in actions:
-            print(f"{Fore.YELLOW}{action}{Style.RESET_ALL} - {description}")
+            screen.write(f"{Fore.YELLOW}{action}{Style.RESET_ALL} - {description}")
 
         while True:
-            choice = input(f"\n{player.name}, what will you do? (Enter letter or full command): ").lower().strip()
-            if choice in self.hotkeys:
-                return self.hotkeys[choice]
+            choice = screen.input(f"\n{player.name}, what will you do? (Enter letter or full command): ").lower().strip()
+            choice = self.hotkeys.get(choice, choice)
             valid_actions = ['attack', 'defend', 'heal', 'special']
             if choice in valid_actions:
+                if choice in ('attack', 'special') and self.state.combat.remaining > 1:
+                    return self.get_target(choice)
                 return choice
-            print(f"{Fore.RED}(｡•́︿•̀｡) Invalid choice! Use hotkeys (A/D/H/S) or type full command.{Style.RESET_ALL}")
+            if choice == ITEM_ACTION and items:
+                item = self.get_item(items)
+                if item is not None:
+                    return [ITEM_ACTION, item]
+                continue
+            screen.write(f"{Fore.RED}(｡•́︿•̀｡) Invalid choice! Use hotkeys (A/D/H/S) or type full command.{Style.RESET_ALL}")
 
-    def handle_voting(self, voting_system: Dict):
+    def get_item(self, items: List[int]):
         """
-        Handle group voting sequences.
+        Ask which item to use.
         
         Args:
-            voting_system: Dictionary containing voting options and rules
+            items: Catalog indices of the usable items the player carries
+            
+        Returns:
+            int: Catalog index of the chosen item, None to pick another action
         """
-        print("\n(„• ᴗ •„) A vote is required among players.")
-        options = voting_system.get("options", [])
-        tie_breaker = voting_system.get("tie_breaker", "random")
-        votes = {}
-
-        for idx, option in enumerate(options, 1):
-            option_text = self.replace_placeholders(option['text'])
-            print(f"{Fore.YELLOW}{idx}.{Style.RESET_ALL} {option_text}")
-
-        for player in self.players:
-            while True:
-                try:
-                    choice = int(input(f"{player.name}, please vote (enter number): ")) - 1
-                    if 0 <= choice < len(options):
-                        votes[player.name] = choice
-                        break
-                    else:
-                        print(f"{Fore.RED}(>_<) Invalid choice! Try again.{Style.RESET_ALL}")
-                except ValueError:
-                    print(f"{Fore.RED}(>_<) Please enter a valid number!{Style.RESET_ALL}")
-
-        vote_counts = {}
-        for vote in votes.values():
-            vote_counts[vote] = vote_counts.get(vote, 0) + 1
-
-        max_votes = max(vote_counts.values())
-        winners = [idx for idx, count in vote_counts.items() if count == max_votes]
-
-        if len(winners) == 1:
-            winning_option_index = winners[0]
-        else:
-            if tie_breaker == "random":
-                winning_option_index = random.choice(winners)
+        catalog = self.story.items
+        inventory = self.players.inventory
+        for number, item in enumerate(items[:ITEM_LIST_LIMIT], 1):
+            count = inventory.count(self.current_player_index, item)
+            description = f" - {catalog[item].description}" if catalog[item].description else ""
+            screen.write(f"{Fore.YELLOW}{number}.{Style.RESET_ALL} {catalog[item].name} x{count}{description}")
+        if len(items) > ITEM_LIST_LIMIT:
+            screen.write(f"...and {len(items) - ITEM_LIST_LIMIT} more items")
+        while True:
+            answer = screen.input("Which item? (number, Enter to go back): ").strip()
+            if not answer:
+                return None
+            if answer.isdigit() and 1 <= int(answer) <= len(items):
+                return items[int(answer) - 1]
+            screen.write(f"{Fore.RED}(｡•́︿•̀｡) No item with that number!{Style.RESET_ALL}")
+
+    def get_target(self, action: str):
+        """
+        Ask which enemy to strike when several are still standing.
+        
+        Args:
+            action: The chosen attack
+            
+        Returns:
+            str | List: The action alone for the first enemy standing, else [action, enemy index]
+        """
+        enemies = self.state.combat.enemies
+        while True:
+            answer = screen.input("Which enemy? (number, Enter for the first one): ").strip()
+            if not answer:
+                return action
+            if answer.isdigit() and 1 <= int(answer) <= len(enemies) and enemies[int(answer) - 1].health > 0:
+                return [action, int(answer) - 1]
+            screen.write(f"{Fore.RED}(｡•́︿•̀｡) No enemy standing with that number!{Style.RESET_ALL}")
+
+    def start_vote_timer(self, timeout: float):
+        """
+        Start the clock on a vote that just opened.
+        
+        Args:
+            timeout: Minutes the vote stays open, None to wait for every player
+        """
+        if timeout is None:
+            self.vote_deadline = None
+            return
+        self.vote_deadline = time.monotonic() + timeout * 60
+        screen.write(f"(⌛) Voting closes in {timeout:g} minute{'' if timeout == 1 else 's'}.")
+
+    def vote_time_left(self) -> float:
+        """Seconds left to vote, None if the vote has no deadline."""
+        if self.vote_deadline is None:
+            return None
+        return max(0.0, self.vote_deadline - time.monotonic())
+
+    def close_vote(self):
+        """Settle the open vote with default ballots for everyone who has not voted."""
+        screen.write(f"{Fore.YELLOW}(⌛ ˘ ᵕ ˘) Time's up! Missing ballots get the default.{Style.RESET_ALL}")
+        for action in default_ballots(self.state):
+            self.send(action)
+
+    def handle_voting(self):
+        """Collect votes until the result is settled or time runs out."""
+        while self.state.phase == PHASE_VOTE:
+            voter = self.state.actor
+            answer = screen.input(f"{self.players[voter].name}, please vote (enter number): ",
+                                  self.vote_time_left())
+            if answer is None:
+                self.close_vote()
+                continue
+            try:
+                choice = int(answer) - 1
+                if not self.send(Action(PHASE_VOTE, (voter, choice))):
+                    screen.write(f"{Fore.RED}(>_<) Invalid choice! Try again.{Style.RESET_ALL}")
+            except ValueError:
+                screen.write(f"{Fore.RED}(>_<) Please enter a valid number!{Style.RESET_ALL}")
+
+    def handle_requires_vote(self):
+        """Ask players whether they agree until the decision is settled or time runs out."""
+        while self.state.phase == PHASE_AGREE:
+            voter = self.state.actor
+            answer = screen.input(f"{self.players[voter].name}, do you agree? (yes/no): ",
+                                  self.vote_time_left())
+            if answer is None:
+                self.close_vote()
+                continue
+            choice = answer.strip().lower()
+            if choice in ['yes', 'no']:
+                self.send(Action(PHASE_AGREE, (voter, choice == 'yes')))
             else:
-                winning_option_index = winners[0]
-
-        winning_option = options[winning_option_index]
-        winning_text = self.replace_placeholders(winning_option['text'])
-        print(f"\n(✿◕‿◕) The group has decided to: {winning_text}")
-
-        if 'effect' in winning_option:
-            effect = winning_option['effect']
-            for player in self.players:
-                player.apply_effect(effect)
-
-        self.current_scene = winning_option.get('scene', 'end')
-
-    def handle_requires_vote(self, requires_vote: Dict):
-        min_players = requires_vote.get('min_players', len(self.players))
-        timeout = requires_vote.get('timeout', None)
-        success_scene = requires_vote.get('success_scene', 'end')
-        failure_scene = requires_vote.get('failure_scene', 'end')
-
-        print(f"\n(｡•̀ᴗ-)✧ A group decision is needed. At least {min_players} players must agree.")
-
-        votes = {}
-        for player in self.players:
-            while True:
-                choice = input(f"{player.name}, do you agree? (yes/no): ").strip().lower()
-                if choice in ['yes', 'no']:
-                    votes[player.name] = choice == 'yes'
-                    break
-                else:
-                    print("(；￣Д￣) Please enter 'yes' or 'no'.")
-
-        agree_count = sum(votes.values())
-
-        if agree_count >= min_players:
-            print(f"\n(｡•̀ᴗ-)✧ Decision successful! Moving on!")
-            self.current_scene = success_scene
-        else:
-            print(f"\n(╯︵╰,) Not enough agreement. Alternate path chosen.")
-            self.current_scene = failure_scene
+                screen.write("(；￣Д￣) Please enter 'yes' or 'no'.")
 
     def make_choice(self, choice_index: int) -> bool:
-        scene = self.story_data.get(self.current_scene, {})
-        choices = scene.get("choices", [])
-
-        if not (0 <= choice_index < len(choices)):
-            return False
+        """
+        Pick one of the current scene's choices for the current player.
+        
+        Args:
+            choice_index: Zero-based index of the choice
+            
+        Returns:
+            bool: True if the choice was valid and applied, False otherwise
+        """
+        return self.send(Action(PHASE_CHOOSE, choice_index))
 
-        choice = choices[choice_index]
+    def prompt_choice(self):
+        """Let the current player pick a choice in the current scene."""
         current_player = self.players[self.current_player_index]
-
-        # Handle different choice types
-        if "combat" in choice:
-            success = self.handle_combat(choice["combat"])
-            self.current_scene = choice["success"] if success else choice["failure"]
-        elif "voting_system" in choice:
-            self.handle_voting(choice["voting_system"])
-            return True
-        elif "requires_vote" in choice:
-            self.handle_requires_vote(choice["requires_vote"])
-            return True
-        else:
-            self.current_scene = choice.get("next_scene", "end")
-
-        if "effect" in choice:
-            effect = choice["effect"]
-            current_player.apply_effect(effect)
-
-        self.current_player_index = (self.current_player_index + 1) % len(self.players)
-        return True
+        screen.write(f"\n(◕‿◕) {current_player.name}'s turn to decide!")
+        rendered = self.text_cache.scene(self.state.scene_index, self.current_player_index)
+        # Choices are numbered among the ones on offer, so locked ones leave no gaps
+        available = available_choices(self.state)
+        for i, choice_index in enumerate(available, 1):
+            screen.write(f"{Fore.YELLOW}{i}.{Style.RESET_ALL} {rendered.choices[choice_index]}")
+
+        valid_choice = False
+        while not valid_choice:
+            try:
+                number = int(screen.input(f"{current_player.name}, make your choice (enter number): "))
+                valid_choice = 1 <= number <= len(available) and self.make_choice(available[number - 1])
+                if not valid_choice:
+                    screen.write(f"{Fore.RED}(>_<) Invalid choice! Try again.{Style.RESET_ALL}")
+            except ValueError:
+                screen.write(f"{Fore.RED}(>_<) Please enter a valid number!{Style.RESET_ALL}")
 
     def run(self):
         """Main game loop."""
@@ -797,81 +1015,80 @@ class Game:
             if not self.display_main_menu():
                 continue
 
-            while self.current_scene != "end" and any(p.is_alive for p in self.players):
-                self.display_scene()
-                self.display_progress_bar()
-                scene = self.story_data.get(self.current_scene, {})
-                self.scenes_visited.add(self.current_scene)
-                choices = scene.get("choices", [])
-
-                if not choices:
-                    self.current_scene = 'end'
-                    continue
-
-                choice = choices[0]
-                if "voting_system" in choice:
-                    self.handle_voting(choice["voting_system"])
-                elif "requires_vote" in choice:
-                    self.handle_requires_vote(choice["requires_vote"])
+            while self.state.phase != PHASE_OVER:
+                if self.state.phase == PHASE_VOTE:
+                    self.handle_voting()
+                elif self.state.phase == PHASE_AGREE:
+                    self.handle_requires_vote()
+                elif self.state.phase == PHASE_COMBAT:
+                    self.handle_combat()
                 else:
-                    current_player = self.players[self.current_player_index]
-                    print(f"\n(◕‿◕) {current_player.name}'s turn to decide!")
-                    for i, choice in enumerate(choices, 1):
-                        choice_text = self.replace_placeholders(choice['text'])
-                        print(f"{Fore.YELLOW}{i}.{Style.RESET_ALL} {choice_text}")
-                    
-                    valid_choice = False
-                    while not valid_choice:
-                        try:
-                            choice_index = int(input(f"{current_player.name}, make your choice (enter number): ")) - 1
-                            valid_choice = self.make_choice(choice_index)
-                            if not valid_choice:
-                                print(f"{Fore.RED}(>_<) Invalid choice! Try again.{Style.RESET_ALL}")
-                        except ValueError:
-                            print(f"{Fore.RED}(>_<) Please enter a valid number!{Style.RESET_ALL}")
-
-            if not any(p.is_alive for p in self.players):
-                print(f"\n{Fore.RED}(╥﹏╥) Game Over - All players have fallen!{Style.RESET_ALL}")
-            else:
-                print(f"\n{Fore.GREEN}(*^ω^*) Congratulations - You've completed the adventure!{Style.RESET_ALL}")
-            
-            input("\nPress Enter to return to the main menu...")
+                    self.prompt_choice()
+
+            self.savefile.delete()
+            screen.input("\nPress Enter to return to the main menu...")
             self.reset_game_state()
 
     def reset_game_state(self):
         """Reset the game state for a new game."""
-        self.players = []
-        self.current_scene = "start"
-        self.current_player_index = 0
+        self.state = None
         self.combat_log = []
-        self.scenes_visited.clear()
+        self.unsaved = []
+        self.vote_deadline = None
 
     def save_game(self):
-        """Save the current game state to a file (Coming Soon)."""
-        # Placeholder for save functionality
-        # This could serialize the self.players, self.current_scene, and other state
-        # to a JSON file so that the player can resume their adventure.
-        # For now, just a placeholder message.
-        print("\n(☆▽☆) Save feature coming soon! You’ll be able to save your journey and return later!")
+        """Append the actions played since the last save, kept if saving fails, to the save file."""
+        try:
+            self.savefile.append(self.state, self.unsaved)
+            self.unsaved = []
+        except (OSError, ValueError) as e:
+            screen.write(f"{Fore.RED}(╥﹏╥) Autosave failed: {e}{Style.RESET_ALL}")
 
     def load_game(self):
-        """Load the game state from a file (Coming Soon)."""
-        # Placeholder for load functionality
-        # This would load the JSON data and restore the game state.
-        # For now, just a placeholder message.
-        print("\n(´｡• ᵕ •｡`) ♡ Load feature coming soon! Soon you can pick up where you left off!")
+        """
+        Resume the saved game, if there is one.
+        
+        Returns:
+            bool: True if a game was resumed, False otherwise
+        """
+        if not self.savefile.exists():
+            screen.write("\n(´｡• ᵕ •｡`) No saved journey yet! Start a new game first~")
+            return False
+        if not self.load_story('story.json'):
+            screen.write(f"{Fore.RED}(>_<) Failed to load story file!{Style.RESET_ALL}")
+            return False
+        try:
+            self.state, events = self.savefile.load(self.story)
+        except (OSError, ValueError) as e:
+            screen.write(f"{Fore.RED}(╥﹏╥) Could not load your save: {e}{Style.RESET_ALL}")
+            return False
+        if self.state.phase == PHASE_OVER:
+            self.state = None
+            self.savefile.delete()
+            screen.write("\n(´｡• ᵕ •｡`) That journey is already over! Start a new game~")
+            return False
+
+        self.unsaved = []
+        try:
+            # The save is a valid recording of the game so far; keep recording from it
+            shutil.copyfile(self.savefile.path, self.recording.path)
+        except OSError:
+            pass
+        self.text_cache.set_roster([player.name for player in self.players])
+        screen.write(f"{Fore.GREEN}Welcome back! (ﾉ◕ヮ◕)ﾉ*:･ﾟ✧{Style.RESET_ALL}")
+        if not events or self.state.phase in (PHASE_VOTE, PHASE_AGREE):
+            self.display_scene()
+        self.render_events(events)
+        return True
 
     def view_settings(self):
         """Adjust game settings (Coming Soon)."""
         # Here you might add volume settings, difficulty adjustments, or color schemes.
         # For now, just a placeholder.
-        print("\n(ฅ•ω•ฅ) Settings feature is on its way! Soon you can customize your kawaii adventure!")
+        screen.write("\n(ฅ•ω•ฅ) Settings feature is on its way! Soon you can customize your kawaii adventure!")
 
     def exit_game(self):
         """Exit the game gracefully."""
         # Display a farewell message and exit
-        print("\n(｡•́︿•̀｡) So sad to see you go! Arigatou for playing! Mata ne!")
+        screen.write("\n(｡•́︿•̀｡) So sad to see you go! Arigatou for playing! Mata ne!")
         sys.exit()
-
-
-
@@ -0,0 +1,45 @@
+"""Shared fixtures for the Json2RPGDesu tests; the game modules live in the repo root."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from story import compile_story  # noqa: E402
+
+# A small story reaching every phase: a flag-gated choice, a group vote,
+# an agreement vote and a fight with a speed enemy and one striking back
+STORY = {
+    "start": {"description": {"text": "A quiet camp."}, "choices": [
+        {"text": "Pick up the key", "next_scene": "hall", "sets": "has_key"},
+        {"text": "Open the vault", "next_scene": "vault", "requires": "has_key"},
+        {"text": "Walk on", "next_scene": "hall"},
+    ]},
+    "hall": {"description": {"text": "A long hall."}, "choices": [
+        {"text": "Go back", "next_scene": "start"},
+        {"text": "Decide together", "voting_system": {
+            "options": [{"text": "Into the den", "scene": "den"},
+                        {"text": "Back to camp", "scene": "start"}],
+            "timeout": 2, "default": 2}},
+        {"text": "Call for help", "requires_vote": {
+            "min_players": 2, "success_scene": "den", "failure_scene": "start"}},
+    ]},
+    "den": {"description": {"text": "Goblins!"}, "choices": [
+        {"text": "Fight", "combat": {"enemies": [
+            {"name": "Goblin", "health": 20, "attack": 6, "defense": 1, "speed": 15},
+            {"name": "Slime", "health": 10, "attack": 5, "defense": 0}]},
+         "success": "vault", "failure": "lost"},
+    ]},
+    "vault": {"description": {"text": "Treasure!"}, "choices": []},
+    "lost": {"description": {"text": "The party fell."}, "choices": []},
+}
+
+PARTY = ["Ai", "Bo", "Cy"]
+
+
+@pytest.fixture
+def story():
+    """The test story, compiled in memory."""
+    return compile_story(STORY)
@@ -0,0 +1,189 @@
+"""Tests for the headless engine (engine.py)."""
+
+import pytest
+
+import engine
+from conftest import PARTY
+from engine import (
+    Action, advance, available_choices, default_ballots, new_game,
+    PHASE_AGREE, PHASE_CHOOSE, PHASE_COMBAT, PHASE_OVER, PHASE_VOTE,
+)
+from story import compile_story
+
+
+def kinds(events):
+    return [event.kind for event in events]
+
+
+def scenes(events):
+    return [event.data['scene'] for event in events if event.kind == 'scene']
+
+
+def fight(state, action='attack'):
+    """Play a fight to its end with the same action for every hero."""
+    events = []
+    while state.phase == PHASE_COMBAT:
+        state, step = advance(state, Action(PHASE_COMBAT, action))
+        events.extend(step)
+    return state, events
+
+
+def test_choice_moves_on_and_passes_the_turn(story):
+    state, events = new_game(story, PARTY, seed=1)
+    assert kinds(events) == ['scene']
+    assert state.phase == PHASE_CHOOSE
+    assert available_choices(state) == [0, 2]
+    state, events = advance(state, Action(PHASE_CHOOSE, 0))
+    assert kinds(events) == ['choice', 'scene']
+    assert state.current_scene == 'hall'
+    assert state.current_player_index == 1
+
+
+def test_flag_unlocks_a_choice(story):
+    state, _ = new_game(story, PARTY, seed=1)
+    state, events = advance(state, Action(PHASE_CHOOSE, 1))
+    assert kinds(events) == ['invalid']
+    state, _ = advance(state, Action(PHASE_CHOOSE, 0))
+    state, _ = advance(state, Action(PHASE_CHOOSE, 0))
+    assert state.current_scene == 'start'
+    assert available_choices(state) == [0, 1, 2]
+    state, events = advance(state, Action(PHASE_CHOOSE, 1))
+    # The vault has no choices, so the story ends there
+    assert scenes(events) == ['vault']
+    assert kinds(events)[-1] == 'game_over'
+    assert state.phase == PHASE_OVER
+
+
+@pytest.mark.parametrize('action', [Action(PHASE_VOTE, 0), Action(PHASE_CHOOSE, 7), Action(PHASE_CHOOSE, 'x')])
+def test_invalid_action_leaves_the_state_alone(story, action):
+    state, _ = new_game(story, PARTY, seed=1)
+    state, events = advance(state, action)
+    assert kinds(events) == ['invalid']
+    assert state.phase == PHASE_CHOOSE
+    assert state.current_scene == 'start'
+    assert state.current_player_index == 0
+
+
+def test_vote_closes_once_the_lead_is_settled(story):
+    state, _ = new_game(story, PARTY, seed=1)
+    state, _ = advance(state, Action(PHASE_CHOOSE, 2))
+    state, events = advance(state, Action(PHASE_CHOOSE, 1))
+    assert state.phase == PHASE_VOTE
+    assert kinds(events) == ['choice', 'vote_started']
+    state, events = advance(state, Action(PHASE_VOTE, (2, 0)))
+    assert kinds(events) == ['ballot']
+    state, events = advance(state, Action(PHASE_VOTE, (2, 1)))
+    assert kinds(events) == ['invalid']
+    state, events = advance(state, Action(PHASE_VOTE, (0, 0)))
+    # Two of three ballots for the den cannot be overturned
+    assert kinds(events)[:3] == ['ballot', 'vote_result', 'scene']
+    assert events[1].data == {'option': 0, 'counts': {0: 2}, 'uncast': 1}
+    assert state.current_scene == 'den'
+
+
+def test_vote_timeout_counts_the_default(story):
+    state, _ = new_game(story, PARTY, seed=1)
+    state, _ = advance(state, Action(PHASE_CHOOSE, 2))
+    state, _ = advance(state, Action(PHASE_CHOOSE, 1))
+    state, _ = advance(state, Action(PHASE_VOTE, (1, 0)))
+    ballots = default_ballots(state)
+    assert ballots == [Action(PHASE_VOTE, (0, 1)), Action(PHASE_VOTE, (2, 1))]
+    for ballot in ballots:
+        state, events = advance(state, ballot)
+    assert state.current_scene == 'start'
+
+
+@pytest.mark.parametrize('answers, scene', [((True, True), 'den'), ((False, False), 'start')])
+def test_agreement_needs_enough_players(story, answers, scene):
+    state, _ = new_game(story, PARTY, seed=1)
+    state, _ = advance(state, Action(PHASE_CHOOSE, 2))
+    state, _ = advance(state, Action(PHASE_CHOOSE, 2))
+    assert state.phase == PHASE_AGREE
+    for player, answer in enumerate(answers):
+        state, events = advance(state, Action(PHASE_AGREE, (player, answer)))
+    assert events[0].kind == 'ballot'
+    assert events[1].kind == 'agree_result'
+    assert state.current_scene == scene
+
+
+def test_fight_ends_in_the_outcome_scene(story):
+    state, _ = new_game(story, PARTY, seed=3)
+    state, _ = advance(state, Action(PHASE_CHOOSE, 2))
+    state, _ = advance(state, Action(PHASE_CHOOSE, 2))
+    state, _ = advance(state, Action(PHASE_AGREE, (0, True)))
+    state, _ = advance(state, Action(PHASE_AGREE, (1, True)))
+    state, events = advance(state, Action(PHASE_CHOOSE, 0))
+    assert state.phase == PHASE_COMBAT
+    assert 'combat_started' in kinds(events)
+    state, events = fight(state)
+    ended = [event for event in events if event.kind == 'combat_ended']
+    assert len(ended) == 1
+    assert state.phase == PHASE_OVER
+    assert scenes(events) == ['vault' if ended[0].data['victory'] else 'lost']
+
+
+def test_fight_rejects_actions_of_other_phases(story):
+    state, _ = new_game(story, PARTY, seed=3)
+    for action in (Action(PHASE_CHOOSE, 2), Action(PHASE_CHOOSE, 1), Action(PHASE_VOTE, (0, 0)),
+                   Action(PHASE_VOTE, (1, 0)), Action(PHASE_CHOOSE, 0)):
+        state, _ = advance(state, action)
+    assert state.phase == PHASE_COMBAT
+    state, events = advance(state, Action(PHASE_CHOOSE, 0))
+    assert kinds(events) == ['invalid']
+    state, events = advance(state, Action(PHASE_COMBAT, 'dance'))
+    assert kinds(events) == ['invalid']
+
+
+def test_seed_and_actions_reproduce_a_session(story):
+    actions = [Action(PHASE_CHOOSE, 2), Action(PHASE_CHOOSE, 1), Action(PHASE_VOTE, (0, 0)),
+               Action(PHASE_VOTE, (1, 0)), Action(PHASE_CHOOSE, 0)]
+    runs = []
+    for _ in range(2):
+        state, events = new_game(story, PARTY, seed=11)
+        for action in actions:
+            state, step = advance(state, action)
+            events.extend(step)
+        state, step = fight(state, 'special')
+        runs.append(events + step)
+    assert runs[0] == runs[1]
+
+
+def wolf_story(speed=10):
+    return compile_story({
+        "start": {"description": {"text": "A wolf."}, "choices": [
+            {"text": "Fight", "combat": {"enemies": [
+                {"name": "Wolf", "health": 500, "attack": 16, "defense": 1, "speed": speed}]},
+             "success": "won", "failure": "lost"}]},
+        "won": {"description": {"text": "Won!"}, "choices": []},
+        "lost": {"description": {"text": "Lost."}, "choices": []},
+    })
+
+
+@pytest.mark.parametrize('size', [1, 2, 3])
+def test_defend_holds_against_a_speed_enemy(size, monkeypatch):
+    """A defender keeps +5 defense for every hit until their own next turn."""
+    hits = []
+    attack = engine._enemy_attack
+
+    def spy(state, enemy, target, events):
+        hits.append((target, state.players.defense[target],
+                     [s.kind for s in state.players.status_effects[target]]))
+        attack(state, enemy, target, events)
+
+    monkeypatch.setattr(engine, '_enemy_attack', spy)
+    state, _ = new_game(wolf_story(), [f"P{i}" for i in range(size)], seed=1)
+    state, _ = advance(state, Action('choose', 0))
+    assert state.phase == PHASE_COMBAT
+    defender = state.current_player_index
+    base = state.players.defense[defender]
+    del hits[:]
+    state, _ = advance(state, Action('combat', 'defend'))
+    while state.phase == PHASE_COMBAT and state.current_player_index != defender:
+        state, _ = advance(state, Action('combat', 'heal'))
+    on_defender = [hit for hit in hits if hit[0] == defender]
+    assert on_defender
+    assert all(defense == base + 5 and 'defending' in kinds for _, defense, kinds in on_defender)
+    if state.phase == PHASE_COMBAT:
+        # Lifted as soon as the defender's turn comes up again
+        assert state.players.defense[defender] == base
+        assert not state.players.status_effects[defender]
@@ -0,0 +1,79 @@
+"""Tests for snapshots and the save journal (savegame.py)."""
+
+import pytest
+
+from conftest import PARTY
+from engine import Action, advance, new_game, PHASE_CHOOSE, PHASE_COMBAT, PHASE_OVER, PHASE_VOTE
+from savegame import SaveFile, restore, snapshot
+
+# Into the den by vote, then a fight
+TO_FIGHT = [Action(PHASE_CHOOSE, 0), Action(PHASE_CHOOSE, 1), Action(PHASE_VOTE, (0, 0)),
+            Action(PHASE_VOTE, (1, 0)), Action(PHASE_CHOOSE, 0)]
+FIGHT = [Action(PHASE_COMBAT, action) for action in ('defend', 'attack', 'special', 'heal') * 10]
+
+
+def play(state, actions):
+    """Play Actions until the story ends; returns the state, the events and the Actions played."""
+    events, played = [], []
+    for action in actions:
+        if state.phase == PHASE_OVER:
+            break
+        state, step = advance(state, action)
+        events.extend(step)
+        played.append(action)
+    return state, events, played
+
+
+def test_snapshot_round_trip(story):
+    state, _ = new_game(story, PARTY, seed=5)
+    state, _, _ = play(state, TO_FIGHT[:1])
+    state.players.statuses.add(state.players, (1,), 'poison', 3, 4)
+    data = snapshot(state)
+    copy = restore(story, data)
+    assert snapshot(copy) == data
+    # The restored session plays on exactly like the original, random stream included
+    _, expected, _ = play(state, TO_FIGHT[1:] + FIGHT)
+    _, events, _ = play(copy, TO_FIGHT[1:] + FIGHT)
+    assert events == expected
+
+
+def test_snapshot_refuses_an_open_vote(story):
+    state, _ = new_game(story, PARTY, seed=5)
+    state, _, _ = play(state, TO_FIGHT[:2])
+    assert state.phase == PHASE_VOTE
+    with pytest.raises(ValueError):
+        snapshot(state)
+
+
+@pytest.mark.parametrize('journal_limit', [None, 3])
+def test_journal_replay_matches_the_live_session(story, tmp_path, journal_limit):
+    save = SaveFile(str(tmp_path / 'save.jsonl'), journal_limit)
+    state, _ = new_game(story, PARTY, seed=9)
+    save.write_snapshot(state)
+    for action in TO_FIGHT + FIGHT:
+        if state.phase == PHASE_OVER:
+            break
+        state, events = advance(state, action)
+        save.append(state, [action])
+    assert state.phase == PHASE_OVER
+    loaded, last = SaveFile(save.path).load(story)
+    assert snapshot(loaded) == snapshot(state)
+    if journal_limit is None:
+        # With a limit the last save may have rewritten the snapshot instead
+        assert last == events
+
+
+def test_torn_journal_entry_is_cut(story, tmp_path):
+    save = SaveFile(str(tmp_path / 'save.jsonl'))
+    state, _ = new_game(story, PARTY, seed=9)
+    save.write_snapshot(state)
+    state, _ = advance(state, TO_FIGHT[0])
+    save.append(state, TO_FIGHT[:1])
+    with open(save.path, 'a', encoding='utf-8') as f:
+        f.write('["choo')
+    loaded, _ = save.load(story)
+    assert snapshot(loaded) == snapshot(state)
+    _, journal = save.read(story)
+    assert journal == TO_FIGHT[:1]
+    with open(save.path, encoding='utf-8') as f:
+        assert f.read().endswith('\n')
@@ -0,0 +1,98 @@
+"""Tests for the room logic of the multiplayer server (server.py)."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from clock import INSTANT
+from engine import PHASE_CHOOSE, PHASE_VOTE
+from server import GameServer
+from sessions import SessionStore
+
+
+class FakeWriter:
+    """Collects what a room sends to one player."""
+
+    def __init__(self):
+        self.text = ''
+
+    def write(self, data: bytes):
+        self.text += data.decode('utf-8')
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The wall clock rooms read vote deadlines from, set by hand."""
+    now = [time.time()]
+    monkeypatch.setattr(server, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+async def open_vote(host):
+    """Start a room of two and walk it into the hall's two-minute vote."""
+    room = host.open_room('x')
+    ai = await room.join('Ai', FakeWriter())
+    bo = await room.join('Bo', FakeWriter())
+    await room.handle_line(ai, '1')
+    await room.handle_line(bo, '2')
+    assert room.state.phase == PHASE_VOTE
+    return room, ai, bo
+
+
+def hosts(story, directory):
+    return [GameServer(story, 2, 0, INSTANT, sessions=SessionStore(story, directory)) for _ in range(2)]
+
+
+@pytest.mark.parametrize('migrate', [False, True])
+def test_reopened_vote_keeps_its_deadline(story, tmp_path, clock, migrate):
+    async def run():
+        host, other = hosts(story, str(tmp_path))
+        room, ai, bo = await open_vote(host)
+        deadline = host.sessions.deadline('x')
+        assert deadline == pytest.approx(clock[0] + 120)
+        if migrate:
+            # What a worker does when the room moves: close it and spill its session
+            host.rooms.pop('x').close()
+            host.sessions.spill('x')
+            host = other
+        else:
+            await host.leave_room(room, ai)
+            await host.leave_room(room, bo)
+            assert 'x' not in host.rooms
+        # Nearly all of the vote's time has gone by while the room was closed
+        clock[0] = deadline - 0.05
+        room = host.open_room('x')
+        await room.join('Ai', FakeWriter())
+        assert host.sessions.deadline('x') == deadline
+        await asyncio.sleep(0.3)
+        assert room.state.phase == PHASE_CHOOSE
+        assert room.state.current_scene == 'start'
+        room.close()
+
+    asyncio.run(run())
+
+
+def test_ballot_does_not_restart_the_deadline(story, tmp_path, clock):
+    async def run():
+        host, _ = hosts(story, str(tmp_path))
+        room, ai, bo = await open_vote(host)
+        deadline = host.sessions.deadline('x')
+        clock[0] += 30
+        await room.handle_line(ai, '2')
+        assert room.state.phase == PHASE_VOTE
+        assert host.sessions.deadline('x') == deadline
+        await room.handle_line(bo, '2')
+        assert room.state.phase == PHASE_CHOOSE
+        assert host.sessions.deadline('x') is None
+        room.close()
+
+    asyncio.run(run())
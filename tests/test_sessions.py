@@ -0,0 +1,74 @@
+"""Tests for the bounded session store (sessions.py)."""
+
+import os
+
+import pytest
+
+from conftest import PARTY
+from engine import Action, PHASE_AGREE, PHASE_CHOOSE, PHASE_COMBAT, PHASE_OVER, PHASE_VOTE
+from savegame import snapshot
+from sessions import SessionStore
+
+TO_VOTE = [Action(PHASE_CHOOSE, 0), Action(PHASE_CHOOSE, 1), Action(PHASE_VOTE, (2, 0))]
+TO_FIGHT = TO_VOTE + [Action(PHASE_VOTE, (0, 0)), Action(PHASE_CHOOSE, 0),
+                      Action(PHASE_COMBAT, 'defend'), Action(PHASE_COMBAT, 'attack')]
+TO_AGREE = [Action(PHASE_CHOOSE, 0), Action(PHASE_CHOOSE, 2), Action(PHASE_AGREE, (1, True))]
+FIGHT = [Action(PHASE_COMBAT, action) for action in ('attack', 'defend', 'special', 'heal') * 10]
+
+
+def finish(store, session_id, actions):
+    events = []
+    for action in actions:
+        if store.get(session_id).phase == PHASE_OVER:
+            break
+        events.extend(store.advance(session_id, action))
+    return events
+
+
+@pytest.mark.parametrize('opening, rest, phase', [
+    (TO_VOTE, [Action(PHASE_VOTE, (1, 0)), Action(PHASE_CHOOSE, 0)] + FIGHT, PHASE_VOTE),
+    (TO_AGREE, [Action(PHASE_AGREE, (2, True)), Action(PHASE_CHOOSE, 0)] + FIGHT, PHASE_AGREE),
+    (TO_FIGHT, FIGHT, PHASE_COMBAT),
+])
+def test_spill_and_read_back_mid_decision(story, tmp_path, opening, rest, phase):
+    live = SessionStore(story)
+    spilled = SessionStore(story, str(tmp_path))
+    for store in (live, spilled):
+        store.create('s', PARTY, seed=4)
+        for action in opening:
+            store.advance('s', action)
+    assert spilled.get('s').phase == phase
+    spilled.spill('s')
+    assert len(spilled) == 0
+    assert 's' in spilled
+    assert spilled.get('s').phase == phase
+    assert spilled.reloads == 1
+    assert not os.listdir(str(tmp_path))
+    assert finish(spilled, 's', rest) == finish(live, 's', rest)
+    assert spilled.get('s').phase == PHASE_OVER
+    assert snapshot(spilled.get('s')) == snapshot(live.get('s'))
+
+
+def test_capacity_spills_the_least_recently_used(story, tmp_path):
+    store = SessionStore(story, str(tmp_path), capacity=2)
+    for number, session_id in enumerate('abc'):
+        store.create(session_id, PARTY, seed=number)
+    assert store.spills == 1
+    assert os.listdir(str(tmp_path)) == ['a.json']
+    # Reading a back spills b, the least recently used now
+    for action in TO_VOTE:
+        store.advance('a', action)
+    assert store.reloads == 1
+    assert os.listdir(str(tmp_path)) == ['b.json']
+    store.flush()
+    assert len(store) == 0
+    assert store.get('a').phase == PHASE_VOTE
+
+
+def test_unknown_session(story, tmp_path):
+    store = SessionStore(story, str(tmp_path))
+    with pytest.raises(KeyError):
+        store.get('nobody')
+    store.create('s', PARTY, seed=1)
+    store.discard('s')
+    assert 's' not in store
@@ -0,0 +1,164 @@
+"""Tests for compiled stories and the sidecar index (story.py)."""
+
+import json
+import os
+
+import pytest
+
+import story as story_module
+from conftest import PARTY, STORY
+from engine import Action, advance, available_choices, new_game, PHASE_COMBAT, PHASE_OVER
+from story import Template, compile_story, load_story_file, open_story_file
+
+# The test story plus a {player} placeholder, a config section, an item and a dangling link
+INDEXED = dict(STORY, config={"party_size": 3}, items={"potion": {"name": "Potion", "effect": {"heal": 10}}})
+INDEXED["start"] = dict(STORY["start"], description={"text": "{player} wakes up."},
+                        choices=STORY["start"]["choices"] + [
+                            {"text": "Take a potion", "next_scene": "hall", "gives": "potion"},
+                            {"text": "Wander off", "next_scene": "nowhere"}])
+
+
+def plain(value):
+    """A compiled record or event with templates as their source and conditions as True, for comparing."""
+    if isinstance(value, Template):
+        return value.source
+    if isinstance(value, (tuple, list)):
+        return tuple(plain(item) for item in value)
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if callable(value):
+        return True
+    return value
+
+
+@pytest.fixture
+def story_path(tmp_path):
+    path = tmp_path / 'story.json'
+    path.write_text(json.dumps(INDEXED, indent=1), encoding='utf-8')
+    # Each test opens its own file, but drop stories kept open by earlier tests all the same
+    story_module._opened_stories.clear()
+    yield str(path)
+    story_module._opened_stories.clear()
+
+
+def assert_same_story(indexed, compiled):
+    assert indexed.ids == compiled.ids
+    assert indexed.index == compiled.index
+    assert indexed.scene_count == compiled.scene_count
+    assert indexed.dangling == compiled.dangling == (('start', 'nowhere'),)
+    assert indexed.config == compiled.config
+    assert indexed.placeholders == compiled.placeholders == frozenset({'player'})
+    assert indexed.remaining == compiled.remaining
+    assert indexed.flags.names == compiled.flags.names
+    assert [item.id for item in indexed.items] == [item.id for item in compiled.items]
+    assert len(indexed.scenes) == len(compiled.scenes)
+    for scene_index in range(len(compiled.scenes)):
+        assert plain(indexed.scenes[scene_index]) == plain(compiled.scenes[scene_index])
+
+
+def test_index_round_trip(story_path):
+    compiled = load_story_file(story_path)
+    first = open_story_file(story_path)
+    assert os.path.exists(story_path + '.idx')
+    assert_same_story(first, compiled)
+    # A fresh process reads the sidecar index instead of decoding every scene
+    story_module._opened_stories.clear()
+    again = open_story_file(story_path)
+    assert again is not first
+    assert_same_story(again, compiled)
+
+
+def test_indexed_story_plays_like_the_compiled_one(story_path):
+    runs = []
+    for story in (load_story_file(story_path), open_story_file(story_path)):
+        state, events = new_game(story, PARTY, seed=2)
+        offered = [available_choices(state)]
+        for action in [Action('choose', 3), Action('choose', 1), Action('vote', (0, 0)),
+                       Action('vote', (1, 0)), Action('choose', 0)]:
+            state, step = advance(state, action)
+            events.extend(step)
+            offered.append(available_choices(state))
+        while state.phase == PHASE_COMBAT:
+            state, step = advance(state, Action(PHASE_COMBAT, 'attack'))
+            events.extend(step)
+        assert state.phase == PHASE_OVER
+        runs.append((plain(events), offered, list(state.players.inventory.held(0))))
+    assert runs[0] == runs[1]
+
+
+def test_touched_file_keeps_its_index(story_path, monkeypatch):
+    open_story_file(story_path)
+    stat = os.stat(story_path)
+    os.utime(story_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    story_module._opened_stories.clear()
+
+    def rebuild(data):
+        raise AssertionError("index rebuilt for unchanged content")
+
+    # Same content under a new modification time: only the stamp is rewritten
+    monkeypatch.setattr(story_module, '_index_story', rebuild)
+    assert_same_story(open_story_file(story_path), load_story_file(story_path))
+
+
+def test_changed_file_rebuilds_its_index(story_path):
+    open_story_file(story_path)
+    changed = dict(INDEXED, vault={"description": {"text": "Gold!"}, "choices": []})
+    with open(story_path, 'w', encoding='utf-8') as f:
+        json.dump(changed, f)
+    story_module._opened_stories.clear()
+    story = open_story_file(story_path)
+    assert story.scenes[story.index['vault']].text.source == 'Gold!'
+    assert_same_story(story, compile_story(changed))
+
+
+def test_strict_mode_names_dangling_links(story_path):
+    with pytest.raises(ValueError, match='start -> nowhere'):
+        open_story_file(story_path, strict=True)
+    with pytest.raises(ValueError):
+        load_story_file(story_path, strict=True)
+
+
+@pytest.mark.parametrize('requires', [
+    {"stat": "attack", "min": None},
+    {"stat": "attack", "max": True},
+    {"stat": "health", "min": 1.5},
+    {"item": "potion", "min": None},
+    {"item": "potion", "max": False},
+    {"item": "potion", "min": "2"},
+])
+def test_condition_bounds_must_be_whole_numbers(requires):
+    data = dict(INDEXED, hall=dict(INDEXED["hall"], choices=[
+        {"text": "Try", "next_scene": "start", "requires": requires}]))
+    with pytest.raises(ValueError, match="Scene 'hall'"):
+        compile_story(data)
+
+
+def test_condition_bounds_are_checked():
+    data = dict(INDEXED, start=dict(INDEXED["start"], choices=[
+        {"text": "Strong", "next_scene": "hall", "requires": {"stat": "attack", "min": 12}},
+        {"text": "Weak", "next_scene": "hall", "requires": {"stat": "attack", "max": 11}},
+        {"text": "Two potions", "next_scene": "hall", "requires": {"item": "potion", "min": 2, "party": True}},
+        {"text": "One potion", "next_scene": "hall", "requires": {"item": "potion", "min": 0, "max": 1}}]))
+    state, _ = new_game(compile_story(data), PARTY, seed=1)
+    attack = state.players.attack[0]
+    expected = [0 if attack >= 12 else 1, 3]
+    assert available_choices(state) == sorted(expected)
+
+
+def test_progress_is_complete_only_at_the_end():
+    story = compile_story({
+        "start": {"description": {"text": "Almost there."}, "choices": [{"text": "On", "next_scene": "last"}]},
+        "last": {"description": {"text": "One more step."}, "choices": [
+            {"text": "Finish", "next_scene": "end"},
+            {"text": "Wait", "next_scene": "last"}]},
+    })
+    state, _ = new_game(story, PARTY, seed=1)
+    seen = [story.progress(state.scene_index, len(state.scenes_visited))]
+    for choice in (0, 1, 0):
+        state, _ = advance(state, Action('choose', choice))
+        seen.append(story.progress(state.scene_index, len(state.scenes_visited)))
+    # The last scene leads straight to the end and back to itself, yet is not complete
+    assert seen[:3] == sorted(seen[:3])
+    assert all(0 < progress < 1 for progress in seen[:3])
+    assert state.phase == PHASE_OVER
+    assert seen[3] == 1.0